@@ -4,7 +4,7 @@ Created on 25/12/2010
 @author:  rmrodri
 '''
 from django.contrib import admin
-from models import FileBackupTask, FileNamePattern, FileBackupProduct, BackupFile
+from models import FileBackupTask, FileNamePattern, FileBackupProduct, BackupFile, BackupStorageDaily
 from models import BackupTask, R1BackupTask, TSMBackupTask
 
 
@@ -26,11 +26,19 @@ class FileBackupTaskAdmin(admin.ModelAdmin):
 
 
 class BackupFileAdmin(admin.ModelAdmin):
-    list_display = ('original_file_name', 'original_date', 'original_file_size_display', 'machine', 'checker', 'deletion_date')
+    list_display = ('original_file_name', 'original_date', 'original_file_size_display', 'machine', 'checker', 'deletion_date', 'size_status')
     search_fields = ['original_file_name', 'compressed_file_name', 'file_backup_product__file_backup_task__machine__fqdn']
     raw_id_fields = ('file_backup_product', 'task_check')
     date_hierarchy = 'original_date'
-    list_filter = ('file_backup_product__file_backup_task__checker_fqdn',)
+    list_filter = ('file_backup_product__file_backup_task__checker_fqdn', 'size_status')
+
+
+class BackupStorageDailyAdmin(admin.ModelAdmin):
+    list_display = ('day', 'checker_fqdn', 'file_backup_product', 'added_bytes', 'compressed_bytes', 'deleted_bytes')
+    list_filter = ('checker_fqdn',)
+    date_hierarchy = 'day'
+    raw_id_fields = ('file_backup_task', 'file_backup_product')
+    readonly_fields = BackupStorageDaily.COUNTERS
 
 
 class FileNamePatternAdmin(admin.ModelAdmin):
@@ -49,3 +57,4 @@ admin.site.register(TSMBackupTask, TSMBackupTaskAdmin)
 admin.site.register(FileNamePattern, FileNamePatternAdmin)
 admin.site.register(R1BackupTask)
 admin.site.register(BackupFile, BackupFileAdmin)
+admin.site.register(BackupStorageDaily, BackupStorageDailyAdmin)
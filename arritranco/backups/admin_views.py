@@ -4,6 +4,8 @@ from django.views.generic import TemplateView
 from models import FileBackupTask
 from models import TSMBackupTask
 from models import R1BackupTask
+from scheduler.models import Task
+from concurrency import backup_concurrency, parse_window
 from inventory.models import Machine
 from django.contrib.admin.views.decorators import staff_member_required
 from django.conf import settings
@@ -63,7 +65,7 @@ class BackupGrid(TemplateView):
         list_of_tasks = {}
         f = {}
         if 'checker' in self.request.GET:
-            f = {'checker_':self.request.GET['checker']}
+            f = {'checker_fqdn':self.request.GET['checker']}
         if 'date' in self.request.GET:
             try:
                 today = datetime.datetime.strptime(self.request.GET['date'], '%Y/%m/%d').date()
@@ -73,9 +75,12 @@ class BackupGrid(TemplateView):
             today = datetime.date.today()
         yesterday = today - datetime.timedelta(1)
         id = 0
-        for fbt in FileBackupTask.objects.filter(active = True, machine__up = True, **f):
-            last_run = fbt.next_run(datetime.datetime.combine(yesterday, midnight))
-            while (last_run.date() == today):
+        tasks = FileBackupTask.objects.filter(active = True, machine__up = True, **f).select_related('machine')
+        runs = Task.runs_between(tasks,
+            datetime.datetime.combine(yesterday, midnight),
+            datetime.datetime.combine(today + datetime.timedelta(1), datetime.time(0)))
+        for fbt in tasks:
+            for last_run in runs[fbt.pk]:
                 if fbt.machine.fqdn not in list_of_tasks:
                     list_of_tasks[fbt.machine.fqdn] = []
                 list_of_tasks[fbt.machine.fqdn].append({
@@ -86,7 +91,6 @@ class BackupGrid(TemplateView):
                     'offset': 230 + self.get_offset(last_run),
                     'id':id,
                 })
-                last_run = fbt.next_run(last_run + datetime.timedelta(minutes = 1))
                 id += 1
         return {
             'minute_width': self.minute_width,
@@ -94,3 +98,33 @@ class BackupGrid(TemplateView):
             'checker_list':[checker[0] for checker in settings.FILE_BACKUP_CHECKERS]
             }
 
+
+
+class BackupConcurrency(TemplateView):
+    """
+        Running backups per hour on every checker and TSM server, and their
+        peak windows.
+    """
+    template_name = "admin/backups/filebackuptask/concurrency.html"
+    bar_height = 100.0
+
+    def get_context_data(self):
+        try:
+            start, end = parse_window(self.request.GET)
+        except ValueError, e:
+            raise Http404('Invalid date or days: %s' % e)
+        profiles = backup_concurrency(start, end, self.request.GET.get('kind'), self.request.GET.get('name'), step = 60)
+        for profile in profiles:
+            scale = profile['peak'] and self.bar_height / profile['peak']
+            profile['bars'] = [{
+                    'time': start + datetime.timedelta(hours = hour),
+                    'running': running,
+                    'height': int(running * scale),
+                } for hour, running in enumerate(profile['curve'])]
+        return {
+            'start': start,
+            'end': end,
+            'days': (end - start).days,
+            'bar_height': int(self.bar_height),
+            'profiles': profiles,
+            }
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+'''
+    How many backups run at the same time on every checker and TSM server.
+
+    Every run of a task lasts its duration (BackupTask.duration_delta), the
+    runs are swept in start/end order to get the number of running backups
+    of each minute.
+'''
+from models import FileBackupTask, TSMBackupTask
+from scheduler.models import Task
+
+import datetime
+
+ONE_MINUTE = datetime.timedelta(minutes = 1)
+MAX_DAYS = 31
+
+
+def parse_window(params):
+    '''
+        (start, end) from the "date" (%Y/%m/%d, today by default) and
+        "days" (1 by default, 7 for a week) request parameters. Raises
+        ValueError when they are invalid.
+    '''
+    if 'date' in params:
+        day = datetime.datetime.strptime(params['date'], '%Y/%m/%d').date()
+    else:
+        day = datetime.date.today()
+    days = int(params.get('days', 1))
+    if not 0 < days <= MAX_DAYS:
+        raise ValueError('days must be between 1 and %d' % MAX_DAYS)
+    start = datetime.datetime.combine(day, datetime.time(0))
+    return start, start + datetime.timedelta(days = days)
+
+
+def _minutes(delta):
+    return delta.days * 24 * 60 + delta.seconds // 60
+
+def _minutes_ceil(delta):
+    minutes = _minutes(delta)
+    if delta.seconds % 60 or delta.microseconds:
+        minutes += 1
+    return minutes
+
+def concurrency_curve(intervals, start, end):
+    '''
+        Number of (begin, finish) intervals running during each minute
+        between start and end, as a list with one value per minute.
+    '''
+    events = []
+    for begin, finish in intervals:
+        begin, finish = max(begin, start), min(finish, end)
+        if begin < finish:
+            events.append((_minutes(begin - start), 1))
+            events.append((_minutes_ceil(finish - start), -1))
+    events.sort()
+    curve = []
+    running = 0
+    i = 0
+    for minute in xrange(_minutes(end - start)):
+        while i < len(events) and events[i][0] <= minute:
+            running += events[i][1]
+            i += 1
+        curve.append(running)
+    return curve
+
+def peak_windows(curve, start, threshold = None, limit = 10):
+    '''
+        [start, end) windows where the curve reaches threshold (its maximum
+        by default), as (start, end, max concurrency) tuples, busiest and
+        then longest first.
+    '''
+    if threshold is None:
+        threshold = max(curve or [0])
+    if threshold <= 0:
+        return []
+    windows = []
+    first = None
+    for minute, running in enumerate(curve + [0]):
+        if running >= threshold and first is None:
+            first = minute
+        elif running < threshold and first is not None:
+            windows.append((start + first * ONE_MINUTE, start + minute * ONE_MINUTE, max(curve[first:minute])))
+            first = None
+    windows.sort(key = lambda w: (-w[2], -(w[1] - w[0]), w[0]))
+    return windows[:limit]
+
+def downsample(curve, step):
+    '''
+        Maximum of every step minutes of the curve.
+    '''
+    if step <= 1:
+        return curve
+    return [max(curve[i:i + step]) for i in xrange(0, len(curve), step)]
+
+
+def backup_runs(tasks, start, end):
+    '''
+        (task, run start, run end) of every run of tasks overlapping the
+        start-end window.
+    '''
+    tasks = list(tasks)
+    if not tasks:
+        return []
+    longest = max(task.duration_delta() for task in tasks)
+    runs = Task.runs_between(tasks, start - longest, end)
+    result = []
+    for task in tasks:
+        duration = task.duration_delta()
+        for run_time in runs[task.pk]:
+            if run_time + duration > start:
+                result.append((task, run_time, run_time + duration))
+    return result
+
+def backup_concurrency(start, end, kind = None, name = None, threshold = None, step = 1, limit = 10):
+    '''
+        Concurrency profile of every checker (kind "checker", file backups
+        grouped by checker_fqdn) and TSM server (kind "tsm") between start
+        and end. Returns a list of dicts, one per group.
+    '''
+    groups = {}
+    if kind in (None, 'checker'):
+        qs = FileBackupTask.objects.filter(active = True, machine__up = True).select_related('machine')
+        if name:
+            qs = qs.filter(checker_fqdn = name)
+        for task in qs:
+            groups.setdefault(('checker', task.checker_fqdn), []).append(task)
+    if kind in (None, 'tsm'):
+        qs = TSMBackupTask.objects.filter(active = True, machine__up = True).select_related('machine')
+        if name:
+            qs = qs.filter(tsm_server = name)
+        for task in qs:
+            groups.setdefault(('tsm', task.tsm_server), []).append(task)
+
+    profiles = []
+    for (group_kind, group_name), tasks in sorted(groups.items()):
+        runs = backup_runs(tasks, start, end)
+        curve = concurrency_curve([(begin, finish) for task, begin, finish in runs], start, end)
+        windows = []
+        for window_start, window_end, running in peak_windows(curve, start, threshold, limit):
+            windows.append({
+                'start': window_start,
+                'end': window_end,
+                'concurrency': running,
+                'tasks': [{'fqdn': task.machine.fqdn, 'description': task.description, 'start': begin, 'end': finish}
+                            for task, begin, finish in runs if begin < window_end and finish > window_start],
+            })
+        profiles.append({
+            'kind': group_kind,
+            'name': group_name,
+            'tasks': len(tasks),
+            'runs': len(runs),
+            'peak': max(curve or [0]),
+            'step': step,
+            'curve': downsample(curve, step),
+            'peak_windows': windows,
+        })
+    return profiles
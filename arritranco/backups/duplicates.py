@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+'''
+    Backup files with the same content (MD5 hash).
+
+    Files are grouped by hash in one query: a hash with files of a single
+    product means its source has not changed between runs (frozen), with
+    files of several products the same data is copied by more than one task
+    (duplicate). Either way all the copies but one waste checker disk.
+'''
+from django.db.models import Count, Max, Min, Sum
+from models import BackupFile
+from scheduler.models import in_batches
+
+import os
+
+HASH_FIELDS = ('original_md5', 'compressed_md5')
+FROZEN = 'frozen'
+DUPLICATE = 'duplicate'
+MAX_GROUPS = 1000
+
+
+def duplicate_groups(hash_field = 'original_md5', checker = None, on_disk = True, limit = 100):
+    '''
+        Hashes shared by more than one file, biggest first, as dicts with
+        the number of files and products, their bytes and dates.
+    '''
+    if hash_field not in HASH_FIELDS:
+        raise ValueError('hash must be one of %s' % ', '.join(HASH_FIELDS))
+    size_field = hash_field == 'original_md5' and 'original_file_size' or 'compressed_file_size'
+    files = BackupFile.objects.exclude(**{hash_field: ''})
+    if checker is not None:
+        files = files.filter(checker_fqdn = checker)
+    if on_disk:
+        files = files.filter(deletion_date__isnull = True)
+    # No ordering by default, BackupFile's one would be grouped by too
+    groups = files.values(hash_field).order_by().annotate(
+        files = Count('id'), products = Count('file_backup_product', distinct = True),
+        product = Min('file_backup_product'), bytes = Sum(size_field), biggest = Max(size_field),
+        first_date = Min('original_date'), last_date = Max('original_date'),
+    ).filter(files__gt = 1).order_by('-bytes', hash_field)[:limit]
+    result = []
+    for group in groups:
+        result.append({
+            'md5': group[hash_field],
+            'kind': group['products'] == 1 and FROZEN or DUPLICATE,
+            'files': group['files'],
+            'products': group['products'],
+            'product': group['products'] == 1 and group['product'] or None,
+            'bytes': group['bytes'] or 0,
+            'wasted_bytes': (group['bytes'] or 0) - (group['biggest'] or 0),
+            'first_date': group['first_date'],
+            'last_date': group['last_date'],
+        })
+    return result
+
+def duplicate_backups(hash_field = 'original_md5', checker = None, on_disk = True, limit = 100):
+    '''
+        duplicate_groups with the files of every group (id, path, checker,
+        machine, date and size), loaded with one query per batch of hashes.
+    '''
+    groups = duplicate_groups(hash_field, checker, on_disk, limit)
+    by_hash = dict((group['md5'], group) for group in groups)
+    for group in groups:
+        group['file_list'] = []
+    files = BackupFile.objects.all()
+    if checker is not None:
+        files = files.filter(checker_fqdn = checker)
+    if on_disk:
+        files = files.filter(deletion_date__isnull = True)
+    for hashes in in_batches(by_hash.keys()):
+        for row in files.filter(**{hash_field + '__in': hashes}).order_by('original_date', 'id').values_list(
+                hash_field, 'id', 'checker_fqdn', 'task_directory', 'original_file_name',
+                'file_backup_product__file_backup_task__machine__fqdn', 'original_date', 'original_file_size'):
+            by_hash[row[0]]['file_list'].append({
+                'id': row[1],
+                'checker': row[2],
+                'path': os.path.join(row[3], row[4]),
+                'machine': row[5],
+                'original_date': row[6],
+                'original_file_size': row[7],
+            })
+    return groups
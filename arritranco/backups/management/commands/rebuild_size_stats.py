@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from backups.models import BackupFile, BackupSizeStats
+from scheduler.models import bulk_create
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the BackupSizeStats of every file backup product from its files, oldest first.'
+
+    @transaction.commit_on_success
+    def handle(self, *args, **options):
+        BackupSizeStats.objects.all().delete()
+        stats = {}
+        for product, size, date in BackupFile.objects.order_by('original_date', 'id')\
+                .values_list('file_backup_product', 'original_file_size', 'original_date').iterator():
+            if product not in stats:
+                stats[product] = BackupSizeStats(file_backup_product_id = product)
+            stats[product].add(float(size or 0), date)
+        bulk_create(BackupSizeStats, stats.values())
+        logger.debug('Size statistics of %d products rebuilt', len(stats))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from backups.models import BackupFile, BackupStorageDaily
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('file_backup_product', 'original_date', 'compressed_date', 'deletion_date',
+    'original_file_size', 'compressed_file_size', 'compressed_file_name')
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the BackupStorageDaily rollups from every backup file.'
+
+    @transaction.commit_on_success
+    def handle(self, *args, **options):
+        BackupStorageDaily.objects.all().delete()
+        files = BackupFile.objects.filter(file_backup_product__isnull = False)
+        counts = {}
+        BackupStorageDaily.count_files(counts, files.values(*FIELDS).iterator(), 'added')
+        BackupStorageDaily.count_files(counts, files.exclude(compressed_file_name = '')\
+            .values(*FIELDS).iterator(), 'compressed')
+        BackupStorageDaily.count_files(counts, files.filter(deletion_date__isnull = False).values(*FIELDS).iterator(), 'deleted')
+        BackupStorageDaily.add_counts(counts)
+        logger.debug('%d storage rollups rebuilt', len(counts))
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding index on 'FileBackupTask', fields ['checker_fqdn']
+        db.create_index('backups_filebackuptask', ['checker_fqdn'])
+
+        # Adding index on 'BackupFile', fields ['compressed_file_name', 'deletion_date', 'original_date', 'id']
+        db.create_index('backups_backupfile', ['compressed_file_name', 'deletion_date', 'original_date', 'id'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'BackupFile', fields ['compressed_file_name', 'deletion_date', 'original_date', 'id']
+        db.delete_index('backups_backupfile', ['compressed_file_name', 'deletion_date', 'original_date', 'id'])
+
+        # Removing index on 'FileBackupTask', fields ['checker_fqdn']
+        db.delete_index('backups_filebackuptask', ['checker_fqdn'])
+
+
+    models = {
+        'backups.backupfile': {
+            'Meta': {'ordering': "['-original_date']", 'object_name': 'BackupFile'},
+            'compressed_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'compressed_file_name': ('django.db.models.fields.CharField', [], {'max_length': '512'}),
+            'compressed_file_size': ('django.db.models.fields.FloatField', [], {'null': 'True', 'blank': 'True'}),
+            'compressed_md5': ('django.db.models.fields.CharField', [], {'max_length': '32'}),
+            'deletion_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'disk_id': ('django.db.models.fields.CharField', [], {'max_length': '512', 'null': 'True', 'blank': 'True'}),
+            'file_backup_product': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['backups.FileBackupProduct']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'integrity_checked': ('django.db.models.fields.NullBooleanField', [], {'null': 'True', 'blank': 'True'}),
+            'original_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'original_file_name': ('django.db.models.fields.CharField', [], {'max_length': '512'}),
+            'original_file_size': ('django.db.models.fields.FloatField', [], {}),
+            'original_md5': ('django.db.models.fields.CharField', [], {'max_length': '32'}),
+            'task_check': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['scheduler.TaskCheck']", 'null': 'True', 'blank': 'True'}),
+            'utility_checked': ('django.db.models.fields.NullBooleanField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'backups.backuptask': {
+            'Meta': {'object_name': 'BackupTask', '_ormbases': ['scheduler.Task']},
+            'bckp_type': ('django.db.models.fields.IntegerField', [], {'default': '3', 'null': 'True', 'blank': 'True'}),
+            'duration': ('django.db.models.fields.TimeField', [], {'null': 'True', 'blank': 'True'}),
+            'extra_options': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'machine': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['inventory.Machine']"}),
+            'task_ptr': ('django.db.models.fields.related.OneToOneField', [], {'to': "orm['scheduler.Task']", 'unique': 'True', 'primary_key': 'True'})
+        },
+        'backups.cachegeneration': {
+            'Meta': {'object_name': 'CacheGeneration'},
+            'generation': ('django.db.models.fields.BigIntegerField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'key': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '100'})
+        },
+        'backups.filebackupproduct': {
+            'Meta': {'object_name': 'FileBackupProduct'},
+            'end_seq': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'file_backup_task': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'file_backup'", 'to': "orm['backups.FileBackupTask']"}),
+            'file_pattern': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['backups.FileNamePattern']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'start_seq': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'variable_percentage': ('django.db.models.fields.DecimalField', [], {'default': '20', 'null': 'True', 'max_digits': '2', 'decimal_places': '0', 'blank': 'True'})
+        },
+        'backups.filebackuptask': {
+            'Meta': {'object_name': 'FileBackupTask', '_ormbases': ['backups.BackupTask']},
+            'backuptask_ptr': ('django.db.models.fields.related.OneToOneField', [], {'to': "orm['backups.BackupTask']", 'unique': 'True', 'primary_key': 'True'}),
+            'checker_fqdn': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'days_in_hard_drive': ('django.db.models.fields.IntegerField', [], {'default': '180'}),
+            'directory': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'max_backup_month': ('django.db.models.fields.IntegerField', [], {'default': '7'})
+        },
+        'backups.filenamepattern': {
+            'Meta': {'ordering': "['pattern']", 'object_name': 'FileNamePattern'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'pattern': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'})
+        },
+        'backups.r1backuptask': {
+            'Meta': {'object_name': 'R1BackupTask', '_ormbases': ['backups.BackupTask']},
+            'backuptask_ptr': ('django.db.models.fields.related.OneToOneField', [], {'to': "orm['backups.BackupTask']", 'unique': 'True', 'primary_key': 'True'}),
+            'r1_server': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        },
+        'backups.tsmbackuptask': {
+            'Meta': {'object_name': 'TSMBackupTask', '_ormbases': ['backups.BackupTask']},
+            'backuptask_ptr': ('django.db.models.fields.related.OneToOneField', [], {'to': "orm['backups.BackupTask']", 'unique': 'True', 'primary_key': 'True'}),
+            'tsm_server': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        },
+        'backups.vcbbackuptask': {
+            'Meta': {'object_name': 'VCBBackupTask', '_ormbases': ['backups.BackupTask']},
+            'backuptask_ptr': ('django.db.models.fields.related.OneToOneField', [], {'to': "orm['backups.BackupTask']", 'unique': 'True', 'primary_key': 'True'}),
+            'tsm_server': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        },
+        'inventory.interface': {
+            'Meta': {'object_name': 'Interface'},
+            'hwaddr': ('django.db.models.fields.CharField', [], {'max_length': '17'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'ip': ('django.db.models.fields.IPAddressField', [], {'max_length': '15'}),
+            'machine': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['inventory.Machine']"}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'}),
+            'network': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['network.Network']", 'null': 'True', 'blank': 'True'}),
+            'visible': ('django.db.models.fields.BooleanField', [], {'default': 'False'})
+        },
+        'inventory.machine': {
+            'Meta': {'ordering': "['fqdn']", 'object_name': 'Machine'},
+            'description': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'epo_level': ('django.db.models.fields.IntegerField', [], {'default': '5'}),
+            'fqdn': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'networks': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['network.Network']", 'through': "orm['inventory.Interface']", 'symmetrical': 'False'}),
+            'os': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['inventory.OperatingSystem']", 'null': 'True', 'blank': 'True'}),
+            'start_up': ('django.db.models.fields.DateField', [], {'null': 'True', 'blank': 'True'}),
+            'up': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'up_to_date_date': ('django.db.models.fields.DateField', [], {'null': 'True', 'blank': 'True'}),
+            'update_priority': ('django.db.models.fields.IntegerField', [], {'default': '30'})
+        },
+        'inventory.operatingsystem': {
+            'Meta': {'object_name': 'OperatingSystem'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'logo': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'max_length': '50'}),
+            'type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['inventory.OperatingSystemType']"}),
+            'version': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'})
+        },
+        'inventory.operatingsystemtype': {
+            'Meta': {'object_name': 'OperatingSystemType'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'max_length': '50'})
+        },
+        'network.network': {
+            'Meta': {'object_name': 'Network'},
+            'desc': ('django.db.models.fields.CharField', [], {'max_length': '250'}),
+            'first_ip': ('django.db.models.fields.IPAddressField', [], {'max_length': '15'}),
+            'first_ip_int': ('django.db.models.fields.IntegerField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'ip': ('django.db.models.fields.CharField', [], {'max_length': '18'}),
+            'last_ip': ('django.db.models.fields.IPAddressField', [], {'max_length': '15'}),
+            'last_ip_int': ('django.db.models.fields.IntegerField', [], {}),
+            'size': ('django.db.models.fields.IntegerField', [], {})
+        },
+        'scheduler.task': {
+            'Meta': {'object_name': 'Task'},
+            'active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'description': ('django.db.models.fields.TextField', [], {}),
+            'hour': ('django.db.models.fields.CharField', [], {'default': "'*'", 'max_length': '10'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_status': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'+'", 'null': 'True', 'on_delete': 'models.SET_NULL', 'to': "orm['scheduler.TaskStatus']"}),
+            'last_task_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'minute': ('django.db.models.fields.CharField', [], {'default': "'*'", 'max_length': '10'}),
+            'month': ('django.db.models.fields.CharField', [], {'default': "'*'", 'max_length': '10'}),
+            'monthday': ('django.db.models.fields.CharField', [], {'default': "'*'", 'max_length': '10'}),
+            'status': ('django.db.models.fields.CharField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'}),
+            'status_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'status_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'weekday': ('django.db.models.fields.CharField', [], {'default': "'*'", 'max_length': '40'})
+        },
+        'scheduler.taskcheck': {
+            'Meta': {'unique_together': "(('task', 'task_time'),)", 'object_name': 'TaskCheck'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_status': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'+'", 'null': 'True', 'on_delete': 'models.SET_NULL', 'to': "orm['scheduler.TaskStatus']"}),
+            'status': ('django.db.models.fields.CharField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'}),
+            'status_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'status_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'task': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['scheduler.Task']"}),
+            'task_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'scheduler.taskstatus': {
+            'Meta': {'object_name': 'TaskStatus'},
+            'check_time': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'null': 'True', 'blank': 'True'}),
+            'comment': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'first_check_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'repeat_count': ('django.db.models.fields.IntegerField', [], {'default': '1'}),
+            'status': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'task_check': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['scheduler.TaskCheck']"})
+        }
+    }
+
+    complete_apps = ['backups']
\ No newline at end of file
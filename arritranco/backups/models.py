@@ -1,11 +1,15 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models.signals import post_save, post_delete
 from django.utils.translation import ugettext_lazy as _
-from scheduler.models import Task, TaskCheck
-from inventory.models import Machine
+from scheduler.models import Task, TaskCheck, bulk_create, in_batches, BULK_CREATE_BATCH_SIZE
+from inventory.models import Machine, PhysicalMachine, VirtualMachine
 from django.conf import settings
 
 import datetime
+import itertools
+import os
 import re
+import time
 
 import logging
 
@@ -34,19 +38,22 @@ class BackupTask(Task):
     def __unicode__(self):
         return _(u"%(fqdn)s @ %(bckp_type)s/%(cron)s") % {'fqdn': self.machine.fqdn, 'bckp_type': self.get_bckp_type_display(), 'cron': self.cron_syntax()}
 
-    def fecha_fin(self, day):
+    def duration_delta(self):
         """
-            Devuelve el dia y la hora en el que terminara la planificacion.
+            Duration as a timedelta, half an hour if it is not set.
         """
-        if self.duracion:
-            duracion = self.duracion
+        if self.duration:
+            duration = self.duration
         else:
-            duracion = datetime.time(hour = 0, minute = 30)
-        return datetime.datetime.combine(day, self.time) + datetime.timedelta(
-                    hours = duracion.hour,
-                    minutes = duracion.minute,
-                    seconds = duracion.second
-            )
+            duration = datetime.time(hour = 0, minute = 30)
+        return datetime.timedelta(hours = duration.hour, minutes = duration.minute, seconds = duration.second)
+
+    def fecha_fin(self, run_time):
+        """
+            Devuelve el dia y la hora en el que terminara la ejecucion que
+            empieza en run_time.
+        """
+        return run_time + self.duration_delta()
 
 class VCBBackupTask(BackupTask):
     """
@@ -74,7 +81,7 @@ class FileBackupTask(BackupTask):
     """
         File backup task
     """
-    checker_fqdn = models.CharField(max_length=255, choices=settings.FILE_BACKUP_CHECKERS, verbose_name=_(u"Checker fqdn"),
+    checker_fqdn = models.CharField(max_length=255, choices=settings.FILE_BACKUP_CHECKERS, verbose_name=_(u"Checker fqdn"), db_index=True,
         help_text=_(u"Machine fqdn where this backups shoud be checked."))
     directory = models.CharField(max_length=255,
         help_text=_(u'Directory where files shoud be.'))
@@ -85,12 +92,21 @@ class FileBackupTask(BackupTask):
 
     @staticmethod
     def get_fbp(machine, filename):
+        fbp, fields = FileBackupTask.match_file(machine, filename)
+        return fbp
+
+    @staticmethod
+    def match_file(machine, filename):
+        """
+            (FileBackupProduct, date fields parsed from filename) of the first
+            product of machine whose pattern matches filename, (None, None)
+            when there is none.
+        """
         logger.debug('Searching FileBackupProduct for filename %s and machine %s', filename, machine)
-        for fbp in FileBackupProduct.objects.filter(file_backup_task__machine = machine):
-            if fbp.file_pattern.get_re(machine).match(filename):
-                return fbp
-        logger.debug('There is no FileBackupProduct for machine %s', machine)
-        return None
+        result = FileNamePatternMatcher.for_machine(machine).match(filename)
+        if result[0] is None:
+            logger.debug('There is no FileBackupProduct for machine %s', machine)
+        return result
 
 class FileNamePattern(models.Model):
     """
@@ -99,24 +115,29 @@ class FileNamePattern(models.Model):
     pattern = models.CharField('Nombre del archivo', max_length=255, blank=True, null=True,
         help_text=_(u'File name pattern, you can use regexp and date patterns here.'))
 
-    def get_re (self, machine = None):
-        # FIXME: Change month list based on default locale language
-        sustituciones = (
-                ('%Y', '(?P<year4>\d{4})'),
-                ('%y', '(?P<year2>\d{2})'),
-                ('%m', '(?P<month>\d{2})'),
-                ('%d', '(?P<day>\d{2})'),
-                ('%H', '(?P<hour>\d{2})'),
-                ('%M', '(?P<minute>\d{2})'),
-#                ('%B', '(?P<month_large>' + _(u'(Enero|Febrero|Marzo|Abril|Mayo|Junio|Julio|Agosto|Septiembre|Octubre|Noviembre|Diciembre))')),
-                ('#', '(?P<chunk>\d+)'),
-            )
-        patron_re = self.pattern
+    # FIXME: Change month list based on default locale language
+    SUSTITUCIONES = (
+            ('%Y', '(?P<year4>\d{4})'),
+            ('%y', '(?P<year2>\d{2})'),
+            ('%m', '(?P<month>\d{2})'),
+            ('%d', '(?P<day>\d{2})'),
+            ('%H', '(?P<hour>\d{2})'),
+            ('%M', '(?P<minute>\d{2})'),
+#            ('%B', '(?P<month_large>' + _(u'(Enero|Febrero|Marzo|Abril|Mayo|Junio|Julio|Agosto|Septiembre|Octubre|Noviembre|Diciembre))')),
+            ('#', '(?P<chunk>\d+)'),
+        )
+
+    def get_re_pattern(self, machine = None):
+        patron_re = self.pattern or ''
         if machine is not None:
             patron_re = patron_re.replace('__FQDN__', machine.fqdn)
-        for o, d in sustituciones:
+        for o, d in self.SUSTITUCIONES:
             patron_re = patron_re.replace (o, d)
-        logger.error('Regular expression pattern: %s', patron_re)
+        return patron_re
+
+    def get_re (self, machine = None):
+        patron_re = self.get_re_pattern(machine)
+        logger.debug('Regular expression pattern: %s', patron_re)
         return re.compile (patron_re)
 
     def get_filename_for_date (self, d):
@@ -161,13 +182,30 @@ class FileBackupProduct(models.Model):
     def __unicode__(self):
         return u"%si -> %s" % (self.file_backup_task, self.file_pattern)
 
+SIZE_OK = 'ok'
+SIZE_ANOMALY = 'anomaly'
+SIZE_UNKNOWN = 'unknown'
+SIZE_STATUS_CHOICES = (
+    (SIZE_OK, _(u'Ok')),
+    (SIZE_ANOMALY, _(u'Anomaly')),
+    (SIZE_UNKNOWN, _(u'Unknown')),
+)
+# Sizes kept by BackupSizeStats, weight of the last size in the EWMA, and
+# deviations of the last sizes a file may differ from the EWMA once there
+# are SIZE_MIN_SAMPLES of them.
+SIZE_HISTORY = 10
+SIZE_EWMA_ALPHA = 0.3
+SIZE_DEVIATIONS = 3
+SIZE_MIN_SAMPLES = 3
+DEFAULT_VARIABLE_PERCENTAGE = 20
+
 class BackupFile(models.Model):
     file_backup_product = models.ForeignKey(FileBackupProduct)
     task_check = models.ForeignKey(TaskCheck, null=True, blank=True)
 
     original_file_name = models.CharField(_(u'Original file name'), max_length=512,
         help_text=_(u'Exact file name generated by a backup task.'))
-    original_md5 = models.CharField(_(u'MD5 original file hash'), max_length=32,
+    original_md5 = models.CharField(_(u'MD5 original file hash'), max_length=32, db_index=True,
         help_text=_(u'MD5 original file hash.'))
     original_file_size= models.FloatField(_(u'Original file size'), help_text=_(u'Original file size in bytes'))
 
@@ -175,7 +213,7 @@ class BackupFile(models.Model):
 
     compressed_file_name = models.CharField(_(u'Compressed file name'), max_length=512,
         help_text=_(u'Exact file name generated by a backup task once it has been compressed.'))
-    compressed_md5 = models.CharField(_(u'Compressed MD5 file hash'), max_length=32,
+    compressed_md5 = models.CharField(_(u'Compressed MD5 file hash'), max_length=32, db_index=True,
         help_text=_(u'Compressed MD5 file hash.'))
     compressed_file_size= models.FloatField(_(u'Compressed file size'),
         help_text=_(u'Compressed file size in bytes.'), blank=True, null=True)
@@ -191,14 +229,71 @@ class BackupFile(models.Model):
     utility_checked = models.NullBooleanField(blank=True, null=True,
         help_text=_(u'Useful.'))
 
+    # Copied on save from the file name and the task, to look files up without joins
+    file_stem = models.CharField(max_length=512, blank=True, editable=False, db_index=True,
+        help_text=_(u'Original file name without extension.'))
+    checker_fqdn = models.CharField(max_length=255, blank=True, editable=False,
+        help_text=_(u'Checker fqdn of the task.'))
+    task_directory = models.CharField(max_length=255, blank=True, editable=False,
+        help_text=_(u'Directory of the task.'))
+
+    # Size verdict given when the file was registered, see BackupSizeStats
+    size_status = models.CharField(max_length=10, blank=True, editable=False, choices=SIZE_STATUS_CHOICES,
+        help_text=_(u'Original size compared with the previous files of the product when registered.'))
+    expected_min_size = models.FloatField(blank=True, null=True, editable=False,
+        help_text=_(u'Minimum original size expected when registered.'))
+    expected_max_size = models.FloatField(blank=True, null=True, editable=False,
+        help_text=_(u'Maximum original size expected when registered.'))
+
     def machine(self):
         return self.file_backup_product.file_backup_task.machine
 
     def directory(self):
-        return self.file_backup_product.file_backup_task.directory
+        return self.task_directory or self.file_backup_product.file_backup_task.directory
 
     def checker(self):
-        return self.file_backup_product.file_backup_task.checker_fqdn
+        return self.checker_fqdn or self.file_backup_product.file_backup_task.checker_fqdn
+
+    def fill_denormalized(self):
+        """
+            Sets file_stem, checker_fqdn and task_directory, bulk inserts
+            have to call it as save() is not called.
+        """
+        task = self.file_backup_product.file_backup_task
+        self.file_stem = os.path.splitext(self.original_file_name)[0]
+        self.checker_fqdn = task.checker_fqdn
+        self.task_directory = task.directory
+
+    def save(self, *args, **kwargs):
+        self.fill_denormalized()
+        super(BackupFile, self).save(*args, **kwargs)
+
+    @staticmethod
+    def find(checker_fqdn, directory, file_names):
+        """
+            Oldest file of the task directory matching each of file_names
+            (its original or compressed name, with or without the last
+            extension), as a {file name: BackupFile} dict.
+        """
+        names = {}
+        stems = set()
+        for file_name in file_names:
+            names[file_name] = set((file_name, os.path.splitext(file_name)[0]))
+            stems.update(os.path.splitext(name)[0] for name in names[file_name])
+        all_names = set()
+        for n in names.values():
+            all_names.update(n)
+        files = BackupFile.objects.filter(checker_fqdn = checker_fqdn, task_directory = directory)
+        rows = []
+        for batch in in_batches(stems | all_names, BULK_CREATE_BATCH_SIZE // 2):
+            rows += list(files.filter(models.Q(file_stem__in = batch) | models.Q(compressed_file_name__in = batch)))
+        found = {}
+        # Oldest first, files without date before the others as the database sorts them
+        for bf in sorted(set(rows), key = lambda bf: (bf.original_date is not None, bf.original_date, bf.pk)):
+            for file_name, matching in names.items():
+                if file_name not in found and (bf.original_file_name in matching or bf.compressed_file_name in matching):
+                    found[file_name] = bf
+        return found
 
     def original_file_size_display (self):
         if self.original_file_size:
@@ -222,8 +317,405 @@ class BackupFile(models.Model):
     def __unicode__(self):
         return "%s" % self.original_file_name
 
+    @staticmethod
+    def to_compress(checker_fqdn, after = None):
+        """
+            (id, directory, original file name, original file size, original
+            date) of the files of checker_fqdn to compress, newest first and
+            files without date last. after is the (original date, id) of the
+            last file already listed, for keyset pagination.
+        """
+        files = BackupFile.objects.filter(checker_fqdn = checker_fqdn, compressed_file_name = '',
+            deletion_date__isnull = True)
+        fields = ('id', 'task_directory', 'original_file_name', 'original_file_size', 'original_date')
+        dated = files.filter(original_date__isnull = False).order_by('-original_date', '-id')
+        undated = files.filter(original_date__isnull = True).order_by('-id')
+        if after is not None:
+            original_date, pk = after
+            if original_date is None:
+                dated = dated.none()
+                undated = undated.filter(id__lt = pk)
+            else:
+                dated = dated.filter(models.Q(original_date__lt = original_date) |
+                    models.Q(original_date = original_date, id__lt = pk))
+        # Querysets run one after the other, and only when iterated up to them
+        return itertools.chain(dated.values_list(*fields).iterator(), undated.values_list(*fields).iterator())
+
     class Meta:
         ordering = ['-original_date',]
         verbose_name_plural = _(u'Backup files')
         verbose_name = _(u'Backup file')
 
+
+class BackupSizeStats(models.Model):
+    """
+        Running statistics of the original size of the files of a file
+        backup product, updated as every file is registered: mean and
+        variance (Welford's algorithm), EWMA and the last SIZE_HISTORY sizes.
+
+        A new file is expected within the EWMA plus or minus the
+        variable_percentage of the product, widened to SIZE_DEVIATIONS
+        standard deviations of the last sizes for products that change a
+        lot.
+    """
+    file_backup_product = models.OneToOneField(FileBackupProduct, related_name = 'size_stats')
+    count = models.IntegerField(default=0)
+    mean = models.FloatField(default=0)
+    m2 = models.FloatField(default=0, help_text=_(u'Sum of squared differences from the mean.'))
+    ewma = models.FloatField(default=0, help_text=_(u'Exponentially weighted moving average.'))
+    recent_sizes = models.TextField(blank=True, help_text=_(u'Last sizes, oldest first, comma separated.'))
+    last_date = models.DateTimeField(blank=True, null=True, help_text=_(u'Date of the last file.'))
+
+    class Meta:
+        verbose_name_plural = _(u'Backup size statistics')
+        verbose_name = _(u'Backup size statistics')
+
+    def __unicode__(self):
+        return u"%s" % self.file_backup_product_id
+
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def stddev(self):
+        return self.variance() ** 0.5
+
+    def recent(self):
+        return [float(size) for size in self.recent_sizes.split(',') if size]
+
+    def expected_range(self, variable_percentage = None):
+        """
+            (minimum, maximum) size expected for the next file, None without
+            previous files.
+        """
+        if not self.count:
+            return None
+        if variable_percentage is None:
+            variable_percentage = DEFAULT_VARIABLE_PERCENTAGE
+        margin = float(variable_percentage) / 100 * self.ewma
+        recent = self.recent()
+        if len(recent) >= SIZE_MIN_SAMPLES:
+            mean = sum(recent) / len(recent)
+            deviation = (sum((size - mean) ** 2 for size in recent) / (len(recent) - 1)) ** 0.5
+            margin = max(margin, SIZE_DEVIATIONS * deviation)
+        return max(self.ewma - margin, 0), self.ewma + margin
+
+    def verdict(self, size, variable_percentage = None):
+        """
+            (status, minimum, maximum) of a new file of size bytes.
+        """
+        expected = self.expected_range(variable_percentage)
+        if expected is None:
+            return SIZE_UNKNOWN, None, None
+        status = expected[0] <= size <= expected[1] and SIZE_OK or SIZE_ANOMALY
+        return status, expected[0], expected[1]
+
+    def add(self, size, date = None):
+        self.count += 1
+        delta = size - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (size - self.mean)
+        if self.count == 1:
+            self.ewma = size
+        else:
+            self.ewma = SIZE_EWMA_ALPHA * size + (1 - SIZE_EWMA_ALPHA) * self.ewma
+        self.recent_sizes = ','.join(repr(s) for s in (self.recent() + [size])[-SIZE_HISTORY:])
+        self.last_date = date
+
+    @staticmethod
+    def judge(files):
+        """
+            Sets the size verdict of the new BackupFile objects files and
+            adds their sizes to the statistics of their products, oldest
+            first. Called once per file, when it is registered.
+        """
+        if not files:
+            return
+        stats = {}
+        for ids in in_batches(set(bf.file_backup_product_id for bf in files)):
+            for row in BackupSizeStats.objects.select_for_update().filter(file_backup_product__in = ids):
+                stats[row.file_backup_product_id] = row
+        new_stats = []
+        for bf in sorted(files, key = lambda bf: bf.original_date):
+            product_stats = stats.get(bf.file_backup_product_id)
+            if product_stats is None:
+                product_stats = stats[bf.file_backup_product_id] = BackupSizeStats(
+                    file_backup_product_id = bf.file_backup_product_id)
+                new_stats.append(product_stats)
+            size = float(bf.original_file_size or 0)
+            bf.size_status, bf.expected_min_size, bf.expected_max_size = product_stats.verdict(size,
+                bf.file_backup_product.variable_percentage)
+            product_stats.add(size, bf.original_date)
+        for product_stats in stats.values():
+            if product_stats.pk is not None:
+                product_stats.save(force_update = True)
+        bulk_create(BackupSizeStats, new_stats)
+
+
+class BackupStorageDaily(models.Model):
+    """
+        Bytes each file backup product added to, or freed from, the disk of
+        its checker in a day. Disk usage grows by added_bytes and shrinks by
+        compressed_bytes (original minus compressed size) and deleted_bytes.
+    """
+    day = models.DateField(help_text=_(u'Day'))
+    checker_fqdn = models.CharField(max_length=255, help_text=_(u'Checker fqdn of the task.'))
+    file_backup_task = models.ForeignKey(FileBackupTask)
+    file_backup_product = models.ForeignKey(FileBackupProduct)
+    added_files = models.IntegerField(default=0)
+    added_bytes = models.FloatField(default=0, help_text=_(u'Original size of the files registered.'))
+    compressed_files = models.IntegerField(default=0)
+    compressed_bytes = models.FloatField(default=0, help_text=_(u'Bytes freed compressing files.'))
+    deleted_files = models.IntegerField(default=0)
+    deleted_bytes = models.FloatField(default=0, help_text=_(u'Bytes freed deleting files.'))
+
+    COUNTERS = ('added_files', 'added_bytes', 'compressed_files', 'compressed_bytes', 'deleted_files', 'deleted_bytes')
+
+    class Meta:
+        unique_together = (('day', 'file_backup_product'),)
+        ordering = ['day', ]
+        verbose_name_plural = _(u'Backup storage by day')
+        verbose_name = _(u'Backup storage by day')
+
+    def __unicode__(self):
+        return u"%s %s %s" % (self.day, self.checker_fqdn, self.file_backup_product_id)
+
+    def net_bytes(self):
+        return self.added_bytes - self.compressed_bytes - self.deleted_bytes
+
+    @staticmethod
+    def add_counts(counts):
+        """
+            Adds a {(day, product id): {counter: value}} dict to the rollup
+            rows, creating the missing ones.
+        """
+        counts = dict((key, values) for key, values in counts.items() if any(values.values()))
+        if not counts:
+            return
+        existing = {}
+        product_ids = set(product for day, product in counts)
+        days = set(day for day, product in counts)
+        for ids in in_batches(product_ids):
+            for row in BackupStorageDaily.objects.filter(file_backup_product__in = ids, day__in = days):
+                existing[(row.day, row.file_backup_product_id)] = row
+        missing = [key for key in counts if key not in existing]
+        products = {}
+        for ids in in_batches(set(product for day, product in missing)):
+            products.update((pk, (task, checker)) for pk, task, checker in FileBackupProduct.objects.filter(
+                pk__in = ids).values_list('id', 'file_backup_task', 'file_backup_task__checker_fqdn'))
+        new_rows = []
+        for key, values in counts.items():
+            if key in existing:
+                BackupStorageDaily.objects.filter(pk = existing[key].pk).update(
+                    **dict((name, models.F(name) + value) for name, value in values.items()))
+            elif key[1] in products:
+                task, checker = products[key[1]]
+                new_rows.append(BackupStorageDaily(day = key[0], file_backup_product_id = key[1],
+                    file_backup_task_id = task, checker_fqdn = checker, **values))
+        bulk_create(BackupStorageDaily, new_rows)
+
+    @staticmethod
+    def count_files(counts, files, counter):
+        """
+            Adds BackupFile rows to counts for add_counts. counter is "added"
+            (by original date), "compressed" (by compression date) or
+            "deleted" (by deletion date). files are BackupFile objects or
+            dicts from BackupFile values().
+        """
+        for bf in files:
+            if isinstance(bf, BackupFile):
+                bf = dict((f.name, getattr(bf, f.attname)) for f in BackupFile._meta.fields)
+            original_size = float(bf['original_file_size'] or 0)
+            compressed_size = float(bf['compressed_file_size'] or 0)
+            if counter == 'added':
+                day, size = bf['original_date'], original_size
+            elif counter == 'compressed':
+                day, size = bf['compressed_date'], original_size - compressed_size
+            else:
+                day = bf['deletion_date']
+                size = bf['compressed_file_name'] and compressed_size or original_size
+            day = (day or datetime.datetime.now()).date()
+            values = counts.setdefault((day, bf['file_backup_product']), {})
+            values[counter + '_files'] = values.get(counter + '_files', 0) + 1
+            values[counter + '_bytes'] = values.get(counter + '_bytes', 0) + size
+        return counts
+
+
+class CacheGeneration(models.Model):
+    """
+        Generation of a kind of cached values, shared by every process:
+        cached values are stored under the current generation of their key
+        and any change of the data they are built from starts a new one.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    generation = models.BigIntegerField()
+
+    def __unicode__(self):
+        return u"%s: %s" % (self.key, self.generation)
+
+    @staticmethod
+    def _create(key):
+        # Generations start from the current time in ms, so a lost row
+        # never brings back the values cached under an old one
+        sid = transaction.savepoint()
+        try:
+            CacheGeneration.objects.create(key = key, generation = int(time.time() * 1000))
+            transaction.savepoint_commit(sid)
+        except IntegrityError:
+            # Created by a concurrent request
+            transaction.savepoint_rollback(sid)
+
+    @staticmethod
+    def get(key):
+        """
+            Current generation of key.
+        """
+        generations = CacheGeneration.objects.values_list('generation', flat = True)
+        try:
+            return generations.get(key = key)
+        except CacheGeneration.DoesNotExist:
+            CacheGeneration._create(key)
+            return generations.get(key = key)
+
+    @staticmethod
+    def bump(key):
+        """
+            Starts a new generation of key.
+        """
+        if not CacheGeneration.objects.filter(key = key).update(generation = models.F('generation') + 1):
+            CacheGeneration._create(key)
+
+
+# Cached values are stored under the current generation of their key, any
+# change of the data they are built from starts a new one.
+CHECKER_CACHE_GENERATION_KEY = 'backups-checker-generation'
+PATTERN_CACHE_GENERATION_KEY = 'backups-pattern-generation'
+
+def checker_cache_generation():
+    return CacheGeneration.get(CHECKER_CACHE_GENERATION_KEY)
+
+def pattern_cache_generation():
+    return CacheGeneration.get(PATTERN_CACHE_GENERATION_KEY)
+
+def invalidate_checker_cache(sender, **kwargs):
+    CacheGeneration.bump(CHECKER_CACHE_GENERATION_KEY)
+
+def invalidate_pattern_cache(sender, **kwargs):
+    CacheGeneration.bump(PATTERN_CACHE_GENERATION_KEY)
+
+# Statuses and files are not cached, see BackupFileCheckerView
+for model in (FileBackupTask, FileBackupProduct, FileNamePattern, Machine, PhysicalMachine, VirtualMachine):
+    post_save.connect(invalidate_checker_cache, sender = model)
+    post_delete.connect(invalidate_checker_cache, sender = model)
+for model in (FileBackupTask, FileBackupProduct, FileNamePattern, Machine, PhysicalMachine, VirtualMachine):
+    post_save.connect(invalidate_pattern_cache, sender = model)
+    post_delete.connect(invalidate_pattern_cache, sender = model)
+
+def update_backup_files(sender, instance, created, **kwargs):
+    """
+        Copies the checker and directory of a saved task to its files.
+    """
+    if created:
+        return
+    if sender is FileBackupProduct:
+        files = BackupFile.objects.filter(file_backup_product = instance)
+        task = instance.file_backup_task
+    else:
+        files = BackupFile.objects.filter(file_backup_product__file_backup_task = instance)
+        task = instance
+    files.exclude(checker_fqdn = task.checker_fqdn, task_directory = task.directory).update(
+        checker_fqdn = task.checker_fqdn, task_directory = task.directory)
+
+post_save.connect(update_backup_files, sender = FileBackupTask)
+post_save.connect(update_backup_files, sender = FileBackupProduct)
+
+
+class FileNamePatternMatcher(object):
+    """
+        File name patterns of all the products of a machine compiled into as
+        few alternations as possible, (?P<pN>...) being the pattern of the
+        N-th product and its groups renamed to pN_<group> (patterns with
+        numbered back references are compiled on their own). Matchers are
+        cached in process until the pattern CacheGeneration changes, which
+        is read from the database so edits made by any process are seen.
+    """
+    # The re module does not support more groups than this in one expression
+    MAX_GROUPS = 99
+    DATE_FIELDS = ('year4', 'year2', 'month', 'day', 'hour', 'minute', 'chunk')
+    GROUP_RE = re.compile(r'\(\?P([<=])(\w+)')
+    BACKREF_RE = re.compile(r'\\[1-9]')
+
+    _matchers = {}
+    _generation = None
+
+    def __init__(self, products, machine = None):
+        self.products = list(products)
+        self.regexps = []
+        alternatives = []
+        groups = 0
+        for i, fbp in enumerate(self.products):
+            pattern = fbp.file_pattern.get_re_pattern(machine)
+            pattern = self.GROUP_RE.sub(lambda m: '(?P%sp%d_%s' % (m.group(1), i, m.group(2)), pattern)
+            try:
+                pattern_groups = re.compile(pattern).groups + 1
+            except re.error, e:
+                logger.error('Invalid pattern %s of %s: %s', fbp.file_pattern.pattern, fbp, e)
+                continue
+            if self.BACKREF_RE.search(pattern) or pattern_groups > self.MAX_GROUPS:
+                # Numbered back references only work in their own expression
+                self._add(alternatives)
+                self.regexps.append((re.compile(pattern), i))
+                alternatives, groups = [], 0
+                continue
+            alternative = '(?P<p%d>%s)' % (i, pattern)
+            if groups + pattern_groups > self.MAX_GROUPS:
+                self._add(alternatives)
+                alternatives, groups = [], 0
+            alternatives.append(alternative)
+            groups += pattern_groups
+        self._add(alternatives)
+
+    def _add(self, alternatives):
+        if alternatives:
+            self.regexps.append((re.compile('|'.join(alternatives)), None))
+
+    def match(self, filename):
+        """
+            (product, fields) of the first product matching filename, fields
+            being its named groups (date ones as integers).
+        """
+        for regexp, i in self.regexps:
+            m = regexp.match(filename)
+            if m is None:
+                continue
+            if i is None:
+                # The pN group encloses the others so it is the last one closed
+                i = int(m.lastgroup[1:])
+            prefix = 'p%d_' % i
+            fields = {}
+            for name, value in m.groupdict().items():
+                if value is not None and name.startswith(prefix):
+                    name = name[len(prefix):]
+                    fields[name] = int(value) if name in self.DATE_FIELDS else value
+            return self.products[i], fields
+        return None, None
+
+    @classmethod
+    def for_machine(cls, machine, generation = None):
+        """
+            Matcher of machine. Callers matching a batch of files read the
+            pattern generation once and pass it.
+        """
+        if generation is None:
+            generation = pattern_cache_generation()
+        if generation != cls._generation:
+            cls._matchers.clear()
+            cls._generation = generation
+        matcher = cls._matchers.get(machine.pk)
+        if matcher is None:
+            products = FileBackupProduct.objects.filter(file_backup_task__machine = machine)\
+                .select_related('file_pattern', 'file_backup_task').order_by('pk')
+            matcher = cls(products, machine)
+            cls._matchers[machine.pk] = matcher
+        return matcher
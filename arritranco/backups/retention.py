@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+'''
+    Which backup files a checker has to delete.
+
+    The runs (task checks) of a task older than its days_in_hard_drive are
+    deleted, and in each of the 11 months before the current one only
+    max_backup_month runs with files on disk are kept, evenly spaced.
+    Everything is computed from the files still on disk, loaded with one
+    query per batch of tasks.
+'''
+from models import FileBackupTask, BackupFile
+from scheduler.models import in_batches
+
+import datetime
+import os
+
+MONTHS = 11
+
+
+def month_windows(today, months = MONTHS):
+    '''
+        (first day, first day of the next month) of each of the months
+        before today's one, newest first. Both ends are included when
+        selecting runs, as FilesToDeleteView always did.
+    '''
+    windows = []
+    first_month_day = datetime.datetime(today.year, today.month, 1)
+    for m in range(months):
+        last_month_day = first_month_day
+        tmp_day = last_month_day - datetime.timedelta(minutes = 1)
+        first_month_day = datetime.datetime(tmp_day.year, tmp_day.month, 1)
+        windows.append((first_month_day, last_month_day))
+    return windows
+
+def thin(task_times, keep):
+    '''
+        task_times (sorted) to delete so that only keep of them remain,
+        spread along the month.
+    '''
+    n = len(task_times)
+    if n <= keep:
+        return []
+    # Every n / (n - keep) runs from the end, ceil(n - k * n / (n - keep))
+    # computed on integers so rounding never skips the first run
+    remove = n - keep
+    return [task_times[-(-n * (remove - k) // remove)] for k in range(1, remove + 1)]
+
+def select_runs(task, task_times, now, today):
+    '''
+        Runs of task to delete, from the sorted task_times of its runs with
+        files on disk.
+    '''
+    older = now - datetime.timedelta(days = task.days_in_hard_drive)
+    selected = [t for t in task_times if t <= older]
+    for first_month_day, last_month_day in month_windows(today):
+        selected += thin([t for t in task_times if first_month_day <= t <= last_month_day], task.max_backup_month)
+    # A run can be both too old and thinned, or on the boundary of two months
+    seen = set()
+    return [t for t in selected if not (t in seen or seen.add(t))]
+
+
+def plan_deletions(checker_fqdn, machine = None, now = None):
+    '''
+        Files the checker has to delete, as a list of {path, pk, size}
+        dicts, size being the bytes on disk (compressed size once
+        compressed).
+    '''
+    if now is None:
+        now = datetime.datetime.now()
+    tasks = FileBackupTask.objects.filter(checker_fqdn = checker_fqdn)
+    if machine is not None:
+        tasks = tasks.filter(machine = machine)
+    tasks = dict((task.pk, task) for task in tasks.order_by('pk'))
+
+    files = {}
+    for ids in in_batches(tasks.keys()):
+        for row in BackupFile.objects.filter(deletion_date__isnull = True, task_check__task__in = ids).order_by('pk')\
+                .values_list('id', 'task_check__task', 'task_check__task_time', 'original_file_name',
+                    'compressed_file_name', 'original_file_size', 'compressed_file_size'):
+            files.setdefault(row[1], {}).setdefault(row[2], []).append(row)
+
+    to_delete = []
+    for task_id, task in sorted(tasks.items()):
+        runs = files.get(task_id, {})
+        for task_time in select_runs(task, sorted(runs), now, now.date()):
+            for row in runs[task_time]:
+                original_name, compressed_name, original_size, compressed_size = row[3:]
+                to_delete.append({
+                    'path': os.path.join(task.directory, compressed_name or original_name),
+                    'pk': row[0],
+                    'size': (compressed_size if compressed_name else original_size) or 0,
+                })
+    return to_delete
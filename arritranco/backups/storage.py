@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+'''
+    Disk usage of the checkers from the BackupStorageDaily rollups, and the
+    days left until they are full at the pace of the last days (least
+    squares line over the daily usage).
+'''
+from django.conf import settings
+from django.db.models import Sum
+from models import BackupStorageDaily
+
+import datetime
+
+GB = 1024 ** 3
+MAX_DAYS = 365
+
+
+def _net(row):
+    return (row['added'] or 0) - (row['compressed'] or 0) - (row['deleted'] or 0)
+
+def _sums(queryset):
+    # No ordering, the default one would be grouped by too
+    return queryset.order_by().annotate(added = Sum('added_bytes'), compressed = Sum('compressed_bytes'), deleted = Sum('deleted_bytes'))
+
+def fit_trend(values):
+    '''
+        (slope, intercept) of the least squares line through values, one
+        per day. None when there are less than two values.
+    '''
+    n = len(values)
+    if n < 2:
+        return None
+    mean_x = (n - 1) / 2.0
+    mean_y = sum(values) / float(n)
+    sxx = sum((x - mean_x) ** 2 for x in range(n))
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+    slope = sxy / sxx
+    return slope, mean_y - slope * mean_x
+
+def daily_usage(days, today = None, checker = None):
+    '''
+        {checker: (used bytes now, [used bytes at the end of each of the
+        last days])} from two aggregate queries.
+    '''
+    if today is None:
+        today = datetime.date.today()
+    start = today - datetime.timedelta(days = days - 1)
+    rows = BackupStorageDaily.objects.all()
+    if checker is not None:
+        rows = rows.filter(checker_fqdn = checker)
+    totals = dict((row['checker_fqdn'], _net(row)) for row in _sums(rows.values('checker_fqdn')))
+    nets = {}
+    for row in _sums(rows.filter(day__gte = start, day__lte = today).values('checker_fqdn', 'day')):
+        nets.setdefault(row['checker_fqdn'], {})[row['day']] = _net(row)
+    usage = {}
+    for name, used in totals.items():
+        checker_nets = nets.get(name, {})
+        # Usage before the window, then day by day
+        level = used - sum(checker_nets.values())
+        series = []
+        for i in range(days):
+            level += checker_nets.get(start + datetime.timedelta(days = i), 0)
+            series.append(level)
+        usage[name] = (used, series)
+    return usage
+
+def storage_forecast(days = 30, today = None, checker = None, capacities = None):
+    '''
+        Usage, growth per day and days until full of every checker.
+        capacities is a {checker: GB} dict, settings.FILE_BACKUP_CHECKER_CAPACITY_GB
+        by default.
+    '''
+    if today is None:
+        today = datetime.date.today()
+    if capacities is None:
+        capacities = getattr(settings, 'FILE_BACKUP_CHECKER_CAPACITY_GB', {})
+    forecasts = []
+    for name, (used, series) in sorted(daily_usage(days, today, checker).items()):
+        trend = fit_trend(series)
+        slope = trend and trend[0]
+        capacity = capacities.get(name) and capacities[name] * GB
+        days_to_full = None
+        if capacity and slope and slope > 0:
+            days_to_full = max(capacity - used, 0) / slope
+        forecasts.append({
+            'checker': name,
+            'used_bytes': used,
+            'bytes_per_day': slope,
+            'capacity_bytes': capacity,
+            'days_to_full': days_to_full,
+            'full_date': days_to_full is not None and today + datetime.timedelta(days = int(days_to_full)) or None,
+            'usage': series,
+        })
+    return forecasts
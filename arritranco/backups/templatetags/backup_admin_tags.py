@@ -1,6 +1,7 @@
 from django.template import Library
 from django.conf import settings
 from backups.models import BackupFile, FileBackupTask
+from scheduler.models import Task
 import datetime
 
 register = Library()
@@ -25,9 +26,10 @@ def today_backups():
     yesterday = today - datetime.timedelta(days=1)
     list_of_tasks = {}
     number_of_tasks = 0
-    for fbt in FileBackupTask.objects.filter(active = True, machine__up = True):
-        last_run = fbt.next_run(yesterday)
-        while (last_run <= today):
+    tasks = FileBackupTask.objects.filter(active = True, machine__up = True).select_related('machine')
+    runs = Task.runs_between(tasks, yesterday, today)
+    for fbt in tasks:
+        for last_run in runs[fbt.pk]:
             if fbt.machine.fqdn not in list_of_tasks:
                 list_of_tasks[fbt.machine.fqdn] = []
             number_of_tasks += 1
@@ -35,7 +37,6 @@ def today_backups():
                 'time':last_run,
                 'task':fbt,
             })
-            last_run = fbt.next_run(last_run + datetime.timedelta(minutes = 1))
     return {
             'list_of_tasks':list_of_tasks,
             'number_of_tasks': number_of_tasks,
@@ -5,7 +5,64 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from south.db import db
+from concurrency import concurrency_curve, peak_windows
+from retention import plan_deletions, thin
+from storage import fit_trend, storage_forecast
+from duplicates import duplicate_groups
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from inventory.models import Machine, Interface
+from monitoring.nagios.models import NagiosContactGroup
+from scheduler.models import TaskCheck
+from models import BackupFile, BackupSizeStats, BackupStorageDaily, TSMBackupTask, FileBackupTask, FileBackupProduct, FileNamePattern, FileNamePatternMatcher, \
+    checker_cache_generation, pattern_cache_generation
+
+import backups.views
+import contextlib
+import datetime
+import json
+import time
+
+
+@contextlib.contextmanager
+def other_process():
+    """
+        Runs the block like another process would: with its own local cache
+        and compiled patterns.
+    """
+    cache = backups.views.cache
+    matchers = FileNamePatternMatcher._matchers, FileNamePatternMatcher._generation
+    backups.views.cache = LocMemCache('other-process', {})
+    FileNamePatternMatcher._matchers, FileNamePatternMatcher._generation = {}, None
+    try:
+        yield
+    finally:
+        backups.views.cache = cache
+        FileNamePatternMatcher._matchers, FileNamePatternMatcher._generation = matchers
+
+
+class BackupFixtures(object):
+    """
+        Every machine needs the default nagios contact group.
+        create_file_backup() adds a daily file backup task with a product.
+    """
+    def setUp(self):
+        super(BackupFixtures, self).setUp()
+        NagiosContactGroup.objects.create(name = 'Sistemas', ngcontact = 'sistemas')
+
+    def create_file_backup(self, fqdn = 'host.example.com', pattern = 'db-%Y%m%d.sql', **options):
+        """
+            Returns (task, product) of a backup at 02:00 to /backups of
+            bckpsrv01.example.com, options override the task fields.
+        """
+        machine, created = Machine.objects.get_or_create(fqdn = fqdn, defaults = {'up': True})
+        fields = {'description': 'files', 'minute': '0', 'hour': '2', 'checker_fqdn': 'bckpsrv01.example.com', 'directory': '/backups'}
+        fields.update(options)
+        task = FileBackupTask.objects.create(machine = machine, **fields)
+        file_pattern, created = FileNamePattern.objects.get_or_create(pattern = pattern)
+        return task, FileBackupProduct.objects.create(file_backup_task = task, file_pattern = file_pattern)
 
 
 class SimpleTest(TestCase):
@@ -14,3 +71,424 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class ConcurrencyTest(BackupFixtures, TestCase):
+    def test_curve_and_peaks(self):
+        start = datetime.datetime(2012, 3, 1)
+        at = lambda h, m: datetime.datetime(2012, 3, 1, h, m)
+        curve = concurrency_curve([(at(1, 0), at(2, 0)), (at(1, 30), at(1, 45)), (at(1, 40), at(3, 0)),
+            (start - datetime.timedelta(hours = 1), at(0, 10))], start, start + datetime.timedelta(days = 1))
+        self.assertEqual(len(curve), 24 * 60)
+        self.assertEqual((curve[0], curve[10], curve[60], curve[100], curve[130], curve[180]), (1, 0, 1, 3, 1, 0))
+        self.assertEqual(peak_windows(curve, start), [(at(1, 40), at(1, 45), 3)])
+        self.assertEqual(peak_windows(curve, start, threshold = 2), [(at(1, 30), at(2, 0), 3)])
+
+    def test_concurrency_view(self):
+        for hour in (2, 2, 3):
+            self.create_file_backup(hour = str(hour), duration = datetime.time(1, 30))
+        response = self.client.get('/rest/backup/concurrency/', {'date': '2012/03/01', 'days': '7'}, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(response.status_code, 200)
+        groups = json.loads(response.content)['groups']
+        self.assertEqual([(g['kind'], g['name'], g['runs'], g['peak']) for g in groups], [('checker', 'bckpsrv01.example.com', 21, 3)])
+        self.assertEqual(len(groups[0]['curve']), 7 * 24 * 60)
+        self.assertEqual(len(groups[0]['peak_windows']), 7)
+        self.assertEqual(self.client.get('/rest/backup/concurrency/', {'days': '0'}).status_code, 400)
+        self.assertEqual(self.client.get('/admin/backups/concurrency/', {'date': '2012/03/01'}).status_code, 200)
+
+
+class BackupStatusTest(BackupFixtures, TestCase):
+    def test_status_filters(self):
+        task, fbp = self.create_file_backup()
+        task.update_status(datetime.datetime(2012, 3, 1, 2, 0), 'Ok')
+        response = self.client.get('/rest/backup/status/', {'checker': 'bckpsrv01.example.com'}, HTTP_ACCEPT = 'application/json')
+        self.assertEqual([(r['task'], r['status']) for r in json.loads(response.content)], [(task.pk, 'Ok')])
+        response = self.client.get('/rest/backup/status/', {'machine': 'other.example.com'}, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(json.loads(response.content), [])
+
+
+class MergeDuplicateChecksTest(BackupFixtures, TransactionTestCase):
+    def setUp(self):
+        super(MergeDuplicateChecksTest, self).setUp()
+        db.delete_unique('scheduler_taskcheck', ['task_id', 'task_time'])
+
+    def tearDown(self):
+        TaskCheck.objects.all().delete()
+        db.create_unique('scheduler_taskcheck', ['task_id', 'task_time'])
+
+    def test_backup_files_moved(self):
+        task, fbp = self.create_file_backup()
+        task_time = datetime.datetime(2012, 3, 1, 2, 0)
+        checks = [TaskCheck.objects.create(task = task, task_time = task_time) for i in range(2)]
+        for i, check in enumerate(checks):
+            BackupFile.objects.create(file_backup_product = fbp, task_check = check, original_file_size = 100,
+                original_file_name = 'db-20120301.sql.%d' % i, original_date = task_time)
+        checks[1].update_status('Ok')
+
+        self.assertEqual(TaskCheck.merge_duplicates(), 1)
+        self.assertEqual(list(BackupFile.objects.values_list('task_check', flat = True)), [checks[0].pk] * 2)
+        self.assertEqual(TaskCheck.objects.get(pk = checks[0].pk).status, 'Ok')
+        self.assertEqual(FileBackupTask.objects.get(pk = task.pk).status, 'Ok')
+
+
+class BackupFileCheckerTest(BackupFixtures, TestCase):
+    def test_cached_checker_tasks(self):
+        task, fbp = self.create_file_backup(pattern = 'db-%Y%m%d.sql.gz ')
+        params = {'checker': 'bckpsrv01.example.com'}
+
+        # generation, tasks, products with their patterns, the Ok checks and
+        # the files of the last runs
+        with self.assertNumQueries(6):
+            response = self.client.get('/rest/backup/backupfilechecker/', params, HTTP_ACCEPT = 'application/json')
+        tasks = json.loads(response.content)['host.example.com']
+        self.assertEqual([t['id'] for t in tasks], [task.pk])
+        self.assertEqual(tasks[0]['files'][0]['pattern'], 'db-%Y%m%d.sql.gz')
+        self.assertEqual(tasks[0]['files'][0]['last_run_files'], [])
+        # Only the generation, the checks and the files
+        with self.assertNumQueries(3):
+            self.client.get('/rest/backup/backupfilechecker/', params, HTTP_ACCEPT = 'application/json')
+
+        # Statuses do not start a new generation
+        generation = checker_cache_generation()
+        task.update_status(task.last_run(), 'Ok')
+        self.assertEqual(checker_cache_generation(), generation)
+        response = self.client.get('/rest/backup/backupfilechecker/', params, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(json.loads(response.content), {})
+
+        # A task added through another process, with its own cache
+        with other_process():
+            other, other_fbp = self.create_file_backup(fqdn = 'other.example.com')
+        response = self.client.get('/rest/backup/backupfilechecker/', params, HTTP_ACCEPT = 'application/json')
+        self.assertEqual([t['id'] for t in json.loads(response.content)['other.example.com']], [other.pk])
+
+
+class FileNamePatternMatcherTest(BackupFixtures, TestCase):
+    def test_match(self):
+        products = [FileBackupProduct(file_pattern = FileNamePattern(pattern = 'db%d-%%Y%%m%%d.sql' % i)) for i in range(50)]
+        products.append(FileBackupProduct(file_pattern = FileNamePattern(pattern = r'(\w+)-\1-%Y.tgz')))
+        matcher = FileNamePatternMatcher(products)
+        self.assertTrue(len(matcher.regexps) > 1)
+        self.assertEqual(matcher.match('db42-20120301.sql'), (products[42], {'year4': 2012, 'month': 3, 'day': 1}))
+        self.assertEqual(matcher.match('etc-etc-2012.tgz'), (products[50], {'year4': 2012}))
+        self.assertEqual(matcher.match('etc-var-2012.tgz'), (None, None))
+
+    def test_get_fbp(self):
+        task, fbp = self.create_file_backup(pattern = '__FQDN__-%Y%m%d.tgz')
+        machine, pattern = task.machine, fbp.file_pattern
+        self.assertEqual(FileBackupTask.get_fbp(machine, 'host.example.com-20120301.tgz'), fbp)
+        # Only the pattern generation, none when the caller passes it
+        with self.assertNumQueries(1):
+            self.assertEqual(FileBackupTask.match_file(machine, 'host.example.com-20120301.tgz'),
+                (fbp, {'year4': 2012, 'month': 3, 'day': 1}))
+        generation = pattern_cache_generation()
+        with self.assertNumQueries(0):
+            matcher = FileNamePatternMatcher.for_machine(machine, generation)
+            self.assertEqual(matcher.match('host.example.com-20120302.tgz')[0], fbp)
+        # The pattern is edited through another process
+        with other_process():
+            pattern.pattern = '__FQDN__-%Y%m%d.tar.gz'
+            pattern.save()
+        self.assertEqual(FileBackupTask.get_fbp(machine, 'host.example.com-20120301.tgz'), None)
+        self.assertEqual(FileBackupTask.get_fbp(machine, 'host.example.com-20120301.tar.gz'), fbp)
+
+
+class BackupFileManifestTest(BackupFixtures, TestCase):
+    def test_manifest(self):
+        task, fbp = self.create_file_backup()
+        mtime = time.mktime(datetime.datetime(2012, 3, 1, 2, 30).timetuple())
+        manifest = [
+            {'host': 'host.example.com', 'files': [
+                {'name': 'db-20120301.sql', 'mtime': mtime, 'size': 1024, 'md5': 'a' * 32},
+                {'name': 'db-20120302.sql', 'mtime': mtime + 24 * 3600, 'size': 2048},
+                {'name': 'other.txt', 'mtime': mtime, 'size': 1},
+                {'name': 'db-20120303.sql'},
+            ]},
+            {'host': 'unknown.example.com', 'files': [{'name': 'db-20120301.sql', 'mtime': mtime, 'size': 1}]},
+        ]
+        response = self.client.post('/rest/backup/addBackupFiles', json.dumps(manifest),
+            content_type = 'application/json', HTTP_ACCEPT = 'application/json')
+        results = json.loads(response.content)
+        self.assertEqual([r['ok'] for r in results], [True, True, False, False, False])
+        self.assertEqual(results[0]['task_time'], '2012-03-01T02:00:00')
+        self.assertEqual(results[1]['task_time'], '2012-03-02T02:00:00')
+        self.assertEqual(BackupFile.objects.filter(task_check__task = task).count(), 2)
+        self.assertEqual(BackupFile.objects.get(original_file_name = 'db-20120301.sql').original_md5, 'a' * 32)
+
+        response = self.client.post('/rest/backup/addBackupFiles', json.dumps(manifest[:1]),
+            content_type = 'application/json', HTTP_ACCEPT = 'application/json')
+        self.assertEqual([r.get('created') for r in json.loads(response.content)], [False, False, None, None])
+        self.assertEqual(BackupFile.objects.count(), 2)
+
+    def test_queries(self):
+        task, fbp = self.create_file_backup()
+        mtime = time.mktime(datetime.datetime(2012, 3, 1, 2, 30).timetuple())
+        def post(first_day, days):
+            files = [{'name': 'db-201203%02d.sql' % day, 'mtime': mtime + (day - 1) * 24 * 3600, 'size': 1024}
+                for day in range(first_day, first_day + days)]
+            self.client.post('/rest/backup/addBackupFiles', json.dumps({'host': 'host.example.com', 'files': files}),
+                content_type = 'application/json', HTTP_ACCEPT = 'application/json')
+        post(1, 1)
+        # The number of queries does not depend on the number of files
+        with self.assertNumQueries(13):
+            post(2, 3)
+        with self.assertNumQueries(13):
+            post(5, 20)
+        self.assertEqual(BackupFile.objects.count(), 24)
+
+
+class RetentionTest(BackupFixtures, TestCase):
+    def test_thin(self):
+        self.assertEqual(thin(range(5), 7), [])
+        selected = thin(range(30), 7)
+        self.assertEqual(len(selected), 23)
+        self.assertEqual(len(set(selected)), 23)
+
+    def test_plan_deletions(self):
+        task, fbp = self.create_file_backup(days_in_hard_drive = 60, max_backup_month = 7)
+        day = datetime.datetime(2012, 3, 1, 2, 0)
+        while day < datetime.datetime(2012, 6, 15):
+            tch = TaskCheck.objects.create(task = task, task_time = day)
+            BackupFile.objects.create(file_backup_product = fbp, task_check = tch, original_file_size = 10,
+                original_file_name = day.strftime('db-%Y%m%d.sql'), original_date = day)
+            day += datetime.timedelta(days = 1)
+        now = datetime.datetime(2012, 6, 15, 12, 0)
+
+        # The tasks and the files on disk
+        with self.assertNumQueries(2):
+            deleted = plan_deletions('bckpsrv01.example.com', now = now)
+        self.assertEqual(len(deleted), len(set(f['pk'] for f in deleted)))
+        self.assertEqual(sum(f['size'] for f in deleted), 10 * len(deleted))
+        self.assertEqual(deleted[0]['path'], '/backups/db-20120301.sql')
+        kept = BackupFile.objects.exclude(pk__in = [f['pk'] for f in deleted])
+        self.assertFalse(kept.filter(original_date__lte = now - datetime.timedelta(days = 60)).exists())
+        self.assertEqual(kept.filter(original_date__year = 2012, original_date__month = 5).count(), 7)
+        self.assertEqual(kept.filter(original_date__year = 2012, original_date__month = 6).count(), 14)
+        self.assertEqual(plan_deletions('bckpsrv02.example.com', now = now), [])
+
+    def test_mark_deleted(self):
+        Machine.objects.create(fqdn = 'bckpsrv01.example.com', up = True)
+        task, fbp = self.create_file_backup(directory = '/backups/host')
+        for name, compressed in (('db-20120301.sql', 'db-20120301.sql.bz2'), ('db-20120302.sql', '')):
+            BackupFile.objects.create(file_backup_product = fbp, original_file_size = 10,
+                original_file_name = name, compressed_file_name = compressed)
+        paths = ['/backups/host/db-20120301.sql.bz2', '/backups/host/db-20120302.sql',
+            '/backups/other/db-20120302.sql', '/backups/host/db-20120303.sql']
+        # Checker by IP and name, files named like the posted ones, the
+        # update and the storage rollup (rows, products and insert)
+        with self.assertNumQueries(7):
+            response = self.client.post('/rest/backup/filesToDelete?checker=bckpsrv01.example.com',
+                {'deleted_files': paths}, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(json.loads(response.content), [[paths[0], True], [paths[1], True], [paths[2], False], [paths[3], False]])
+        self.assertFalse(BackupFile.objects.filter(deletion_date__isnull = True).exists())
+        rollup = BackupStorageDaily.objects.get()
+        self.assertEqual((rollup.deleted_files, rollup.deleted_bytes), (2, 20))
+
+
+class FilesToCompressTest(BackupFixtures, TestCase):
+    def test_pages(self):
+        Machine.objects.create(fqdn = 'bckpsrv01.example.com', up = True)
+        task, fbp = self.create_file_backup()
+        ids = []
+        for day in (3, 1, 2, None, 2):
+            ids.append(BackupFile.objects.create(file_backup_product = fbp, original_file_size = 10,
+                original_file_name = 'db-%s.sql' % day, original_date = day and datetime.datetime(2012, 3, day, 2)).pk)
+        BackupFile.objects.create(file_backup_product = fbp, original_file_size = 10, original_file_name = 'db.sql.bz2',
+            compressed_file_name = 'db.sql.bz2')
+        expected = [ids[0], ids[4], ids[2], ids[1], ids[3]]
+
+        response = self.client.get('/rest/backup/filesToCompress', {'checker': 'bckpsrv01.example.com'},
+            HTTP_ACCEPT = 'application/json')
+        self.assertEqual([f[0] for f in json.loads(response.content)], expected)
+        self.assertEqual(json.loads(response.content)[0][1], '/backups/db-3.sql')
+
+        pages = []
+        params = {'checker': 'bckpsrv01.example.com', 'limit': 2}
+        while True:
+            response = self.client.get('/rest/backup/filesToCompress', params, HTTP_ACCEPT = 'application/json')
+            page = json.loads(response.content)
+            pages.append([f[0] for f in page['results']])
+            if not page['next']:
+                break
+            params['cursor'] = page['next']
+        self.assertEqual(pages, [expected[:2], expected[2:4], expected[4:]])
+
+
+class BackupFileInfoTest(BackupFixtures, TestCase):
+    def test_lookups(self):
+        Machine.objects.create(fqdn = 'bckpsrv01.example.com', up = True)
+        task, fbp = self.create_file_backup()
+        bf = BackupFile.objects.create(file_backup_product = fbp, original_file_size = 10, original_file_name = 'db-20120301.sql',
+            original_date = datetime.datetime(2012, 3, 1, 2))
+        self.assertEqual((bf.file_stem, bf.checker_fqdn, bf.task_directory), ('db-20120301', 'bckpsrv01.example.com', '/backups'))
+
+        self.client.get('/rest/backup/addCompressedBackupFile', {'checker': 'bckpsrv01.example.com', 'directory': '/backups',
+            'compressedfilename': 'db-20120301.sql.bz2', 'filedate': '1330570800', 'filesize': '5'})
+        self.assertEqual(BackupFile.objects.get(pk = bf.pk).compressed_file_name, 'db-20120301.sql.bz2')
+
+        response = self.client.get('/rest/backup/BackupFileInfo', {'checker': 'bckpsrv01.example.com',
+            'directory': '/backups', 'file_name': 'db-20120301.sql.bz2'}, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(json.loads(response.content)['id'], bf.pk)
+        files = [{'directory': '/backups', 'file_name': name} for name in ('db-20120301.sql', 'db-20120301.sql.bz2.md5', 'db-20120302.sql')]
+        files.append({'directory': '/other', 'file_name': 'db-20120301.sql'})
+        response = self.client.post('/rest/backup/BackupFilesInfo?checker=bckpsrv01.example.com', json.dumps(files),
+            content_type = 'application/json', HTTP_ACCEPT = 'application/json')
+        self.assertEqual([f and f['id'] for f in json.loads(response.content)], [bf.pk, bf.pk, None, None])
+
+        task.directory = '/backups/host'
+        task.save()
+        self.assertEqual(BackupFile.objects.get(pk = bf.pk).task_directory, '/backups/host')
+
+
+class TSMHostsTest(BackupFixtures, TestCase):
+    def test_conditional_get(self):
+        Machine.objects.create(fqdn = 'bckpsrv01.example.com', up = True)
+        for i in range(3):
+            machine = Machine.objects.create(fqdn = 'host%d.example.com' % i, up = True)
+            TSMBackupTask.objects.create(machine = machine, description = 'tsm', minute = '0', hour = '2', tsm_server = 'tsm01')
+        Interface.objects.create(machine = machine, name = 'service', ip = '10.0.0.2', hwaddr = '00:00:00:00:00:02')
+        params = {'checker': 'bckpsrv01.example.com', 'tsm_server': 'tsm01'}
+
+        # Checker by IP and name, tasks and service interfaces
+        with self.assertNumQueries(4):
+            response = self.client.get('/rest/backup/tsm/hosts/', params, HTTP_ACCEPT = 'application/json')
+        hosts = sorted((h['fqdn'], h['ipaddress']) for h in json.loads(response.content))
+        self.assertEqual(hosts, [('host0.example.com', '127.0.0.1'), ('host1.example.com', '127.0.0.1'),
+            ('host2.example.com', '10.0.0.2')])
+        etag = response['ETag']
+
+        with self.assertNumQueries(4):
+            response = self.client.get('/rest/backup/tsm/hosts/', params, HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Changes made without signals are seen too, those of fields not
+        # in the list are not
+        Machine.objects.filter(pk = machine.pk).update(up = False)
+        response = self.client.get('/rest/backup/tsm/hosts/', params, HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 304)
+        Machine.objects.filter(pk = machine.pk).update(fqdn = 'host3.example.com')
+        response = self.client.get('/rest/backup/tsm/hosts/', params, HTTP_IF_NONE_MATCH = etag, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+        Interface.objects.filter(machine = machine).update(ip = '10.0.0.3')
+        response = self.client.get('/rest/backup/tsm/hosts/', params, HTTP_IF_NONE_MATCH = etag, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(('host3.example.com', '10.0.0.3') in [(h['fqdn'], h['ipaddress']) for h in json.loads(response.content)])
+
+
+class StorageForecastTest(BackupFixtures, TestCase):
+    def test_fit_trend(self):
+        self.assertEqual(fit_trend([5]), None)
+        self.assertEqual(fit_trend([1, 3, 5, 7]), (2, 1))
+
+    def test_forecast(self):
+        task, fbp = self.create_file_backup()
+        today = datetime.date(2012, 3, 10)
+        for i in range(10):
+            day = datetime.datetime(2012, 3, 1 + i, 2, 0)
+            BackupFile.objects.create(file_backup_product = fbp, original_file_size = 1000,
+                original_file_name = day.strftime('db-%Y%m%d.sql'), original_date = day)
+        # 1000 bytes a day, half of them freed compressing the files the next day
+        counts = BackupStorageDaily.count_files({}, BackupFile.objects.all(), 'added')
+        for bf in BackupFile.objects.exclude(original_date = datetime.datetime(2012, 3, 10, 2, 0)):
+            bf.compressed_file_name = bf.original_file_name + '.bz2'
+            bf.compressed_file_size = 500
+            bf.compressed_date = bf.original_date + datetime.timedelta(days = 1)
+            bf.save()
+            BackupStorageDaily.count_files(counts, [bf], 'compressed')
+        BackupStorageDaily.add_counts(counts)
+        self.assertEqual(BackupStorageDaily.objects.count(), 10)
+
+        # Totals and the days in the window
+        with self.assertNumQueries(2):
+            forecast, = storage_forecast(5, today = today, capacities = {'bckpsrv01.example.com': 20000.0 / 1024 ** 3})
+        self.assertEqual(forecast['used_bytes'], 5500)
+        self.assertEqual(forecast['usage'], [3500, 4000, 4500, 5000, 5500])
+        self.assertAlmostEqual(forecast['bytes_per_day'], 500)
+        self.assertAlmostEqual(forecast['days_to_full'], 29)
+        self.assertEqual(forecast['full_date'], datetime.date(2012, 4, 8))
+
+        rollups = list(BackupStorageDaily.objects.values_list('day', *BackupStorageDaily.COUNTERS))
+        call_command('rebuild_storage_rollups')
+        self.assertEqual(list(BackupStorageDaily.objects.values_list('day', *BackupStorageDaily.COUNTERS)), rollups)
+
+        response = self.client.get('/rest/backup/storage/forecast/', {'checker': 'bckpsrv01.example.com',
+            'capacity_gb': 1, 'days': 400}, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/rest/backup/storage/forecast/', {'checker': 'bckpsrv01.example.com',
+            'capacity_gb': 1}, HTTP_ACCEPT = 'application/json')
+        forecast, = json.loads(response.content)
+        self.assertEqual((forecast['used_bytes'], forecast['capacity_bytes']), (5500, 1024 ** 3))
+
+
+class BackupSizeStatsTest(BackupFixtures, TestCase):
+    def test_running_stats(self):
+        sizes = [100.0, 110.0, 90.0, 105.0, 95.0, 400.0]
+        stats = BackupSizeStats()
+        self.assertEqual(stats.verdict(100), ('unknown', None, None))
+        for size in sizes:
+            stats.add(size)
+        mean = sum(sizes) / len(sizes)
+        self.assertAlmostEqual(stats.mean, mean)
+        self.assertAlmostEqual(stats.variance(), sum((s - mean) ** 2 for s in sizes) / (len(sizes) - 1))
+        self.assertEqual(stats.recent(), sizes)
+        stats.add(100.0)
+        self.assertEqual(len(stats.recent()), 7)
+
+        stats = BackupSizeStats()
+        for size in sizes[:5]:
+            stats.add(size)
+        self.assertEqual(stats.verdict(102)[0], 'ok')
+        self.assertEqual(stats.verdict(400)[0], 'anomaly')
+        self.assertEqual(stats.verdict(0)[0], 'anomaly')
+        # A wider variable_percentage accepts more
+        self.assertEqual(stats.verdict(150, 60)[0], 'ok')
+
+    def test_registered_files(self):
+        task, fbp = self.create_file_backup()
+        mtime = time.mktime(datetime.datetime(2012, 3, 1, 2, 30).timetuple())
+        files = [{'name': 'db-201203%02d.sql' % (i + 1), 'mtime': mtime + i * 24 * 3600, 'size': size}
+            for i, size in enumerate([1000, 1010, 990, 1005, 5000])]
+        response = self.client.post('/rest/backup/addBackupFiles', json.dumps([{'host': 'host.example.com', 'files': files}]),
+            content_type = 'application/json', HTTP_ACCEPT = 'application/json')
+        self.assertEqual([r['size_status'] for r in json.loads(response.content)], ['unknown', 'ok', 'ok', 'ok', 'anomaly'])
+        self.assertEqual(BackupFile.objects.get(original_file_name = 'db-20120305.sql').size_status, 'anomaly')
+        self.assertEqual(fbp.size_stats.count, 5)
+
+        stats = list(BackupSizeStats.objects.values_list('count', 'mean', 'm2', 'ewma', 'recent_sizes'))
+        call_command('rebuild_size_stats')
+        self.assertEqual(list(BackupSizeStats.objects.values_list('count', 'mean', 'm2', 'ewma', 'recent_sizes')), stats)
+
+
+class DuplicatesTest(BackupFixtures, TestCase):
+    def test_duplicates(self):
+        fbps = [self.create_file_backup('host%d.example.com' % i, directory = '/backups/host%d' % i)[1] for i in range(2)]
+        # The first product has not changed for three runs, its last file is
+        # copied by the second one too
+        for fbp, day, md5 in ((fbps[0], 1, 'a'), (fbps[0], 2, 'b'), (fbps[0], 3, 'b'), (fbps[0], 4, 'b'),
+                (fbps[0], 5, 'c'), (fbps[1], 5, 'c'), (fbps[1], 6, '')):
+            date = datetime.datetime(2012, 3, day, 2, 0)
+            BackupFile.objects.create(file_backup_product = fbp, original_file_size = 100, original_md5 = md5 * 32,
+                original_file_name = date.strftime('db-%Y%m%d.sql'), original_date = date)
+
+        with self.assertNumQueries(1):
+            groups = duplicate_groups()
+        self.assertEqual([(g['md5'][0], g['kind'], g['files'], g['wasted_bytes']) for g in groups],
+            [('b', 'frozen', 3, 200), ('c', 'duplicate', 2, 100)])
+        self.assertEqual(groups[0]['product'], fbps[0].pk)
+        self.assertEqual(duplicate_groups('compressed_md5'), [])
+        self.assertRaises(ValueError, duplicate_groups, 'original_file_name')
+
+        BackupFile.objects.filter(original_md5 = 'c' * 32, file_backup_product = fbps[1]).update(
+            deletion_date = datetime.datetime(2012, 3, 7))
+        response = self.client.get('/rest/backup/duplicates/', {'checker': 'bckpsrv01.example.com'},
+            HTTP_ACCEPT = 'application/json')
+        groups = json.loads(response.content)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual([f['path'] for f in groups[0]['file_list']],
+            ['/backups/host0/db-20120302.sql', '/backups/host0/db-20120303.sql', '/backups/host0/db-20120304.sql'])
+        response = self.client.get('/rest/backup/duplicates/', {'deleted': '1'}, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(len(json.loads(response.content)), 2)
+        response = self.client.get('/rest/backup/duplicates/', {'hash': 'other'}, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(response.status_code, 400)
@@ -4,7 +4,7 @@ from djangorestframework.views import ListOrCreateModelView, InstanceModelView
 
 from models import BackupTask, TSMBackupTask, R1BackupTask
 from scheduler.models import Task
-from scheduler.views import Todo
+from scheduler.views import Todo, TaskStatusBulkView
 from views import *
 
 class BackupTaskResource(ModelResource):
@@ -19,16 +19,32 @@ class TSMBackupsTodo(BackupsTodo):
 class R1BackupsTodo(BackupsTodo):
     queryset = R1BackupTask.objects.all()
 
+class BackupsStatus(TaskStatusBulkView):
+    queryset = BackupTask.objects.all()
+
+    def filter_queryset(self, request, queryset):
+        if request.GET.get('machine'):
+            queryset = queryset.filter(machine__fqdn = request.GET['machine'])
+        if request.GET.get('checker'):
+            queryset = queryset.filter(filebackuptask__checker_fqdn = request.GET['checker'])
+        return queryset
+
 urlpatterns = patterns('',
     url(r'^$', ListOrCreateModelView.as_view(resource=BackupTaskResource)),
     url(r'^tsm/hosts/$', TSMHostsView.as_view(), name='tsm-hosts'), 
+    url(r'^concurrency/$', BackupConcurrencyView.as_view(), name='backup-concurrency'),
+    url(r'^storage/forecast/$', BackupStorageForecastView.as_view(), name='backup-storage-forecast'),
+    url(r'^duplicates/$', BackupDuplicatesView.as_view(), name='backup-duplicates'),
     url(r'^r1/todo/$', R1BackupsTodo.as_view(), name='r1-backups-todo'), 
     url(r'^todo/$', BackupsTodo.as_view(), name='backups-todo'), 
+    url(r'^status/$', BackupsStatus.as_view(), name='backups-status'),
     url(r'^backupfilechecker/$', BackupFileCheckerView.as_view(), name='backup-file-checker'),
     url(r'^filesToCompress$', FilesToCompressView.as_view(), name='backup-files-to-compress'),
     url(r'^filesToDelete$', FilesToDeleteView.as_view(), name='backup-files-to-delete'),
     url(r'^addBackupFile$', add_backup_file, name="addBackupFile"),
+    url(r'^addBackupFiles$', BackupFileManifestView.as_view(), name="addBackupFiles"),
     url(r'^BackupFileInfo$', GetBackupFileInfo.as_view(), name="BackupFileInfo"),
+    url(r'^BackupFilesInfo$', GetBackupFilesInfo.as_view(), name="BackupFilesInfo"),
     url(r'^addWindowsBackupFile$', add_backup_file, { 'windows':True }, name="addWindowsBackupFile"),
     url(r'^registerFileFromChecker$', register_file_from_checker, name="register_file_from_checker"),
     url(r'^addCompressedBackupFile$', add_compressed_backup_file, name="addCompressedBackupFile"),
@@ -38,7 +38,7 @@ STATE_TO_HUMAN = {
 
 URLBASE = 'https://inventario.stic.ull.es/rest/backup/backupfilechecker/?checker=xxxx'
 UPDATEURL = 'https://inventario.stic.ull.es/rest/backup/set_integrity_status'
-UPDATE_STATUS_URL = 'https://inventario.stic.ull.es/rest/scheduler/taskstatus/'
+UPDATE_STATUS_URL = 'https://inventario.stic.ull.es/rest/scheduler/taskstatus/bulk/'
 FILE_INFO_URL = 'https://inventario.stic.ull.es/rest/backup/BackupFileInfo'
 
 LOGGING = {
@@ -201,6 +201,31 @@ class FileBackupProduct(object):
         self.variable_percentage = float(fbp['variable_percentage'])
         self.directory = directory
         self.verbose = verbose
+        # Size verdicts given by the inventory to the files of the last run
+        self.verdicts = {}
+        for f in fbp.get('last_run_files', []):
+            self.verdicts[f['original_file_name']] = f
+            if f['compressed_file_name']:
+                self.verdicts[f['compressed_file_name']] = f
+
+    def size_verdict(self, filename):
+        '''
+            Status of filename from the size verdict of the inventory, None if
+            it has not judged it.
+        '''
+        verdict = self.verdicts.get(filename)
+        if verdict is None or verdict['size_status'] not in ('ok', 'anomaly'):
+            return None
+        logger.debug("Veredicto del inventario para %s: %s (%s - %s)" % (filename, verdict['size_status'],
+            verdict['expected_min_size'], verdict['expected_max_size']))
+        if verdict['size_status'] == 'ok':
+            return (OK, "%s (%s)" % (filename, sizeof_fmt(verdict['original_file_size'])))
+        return (WARNING, "Error: El tamanyo de %s (%s) esta fuera del esperado (%s - %s)" % (
+                    filename,
+                    sizeof_fmt(verdict['original_file_size']),
+                    sizeof_fmt(verdict['expected_min_size']),
+                    sizeof_fmt(verdict['expected_max_size'])
+                ))
 
     def get_dated_filenames(self, run):
         filenames = []
@@ -256,7 +281,10 @@ class FileBackupProduct(object):
         logger.debug("previous run files: %s" % previous_run_files)
         if not last_run_files:
             return (CRITICAL, 'No hay ultimo backup (%s)' % last_run)
-        elif not previous_run_files:
+        verdict = self.size_verdict(last_run_files[0])
+        if verdict is not None:
+            return verdict
+        if not previous_run_files:
             return (WARNING, "No hay backup anterior con el que comparar la copia del: %s [%s %s]" % (
                     last_run,
                     last_run_files[0],
@@ -378,6 +406,7 @@ if __name__ == "__main__":
         raise e
 
     filesToCheck = json.load(res)
+    statuses = []
     for host in filesToCheck.keys():
         if fqdn is not None and host != fqdn:
             continue
@@ -396,15 +425,7 @@ if __name__ == "__main__":
             }
             logger.info("   * Status information: %s (%s)", data['status'], data['comment'].replace('\n', ''))
             if not dryrun:
-                try:
-                    logger.info("    * Sending status to inventory ...")
-                    request = urllib2.Request(UPDATE_STATUS_URL, urllib.urlencode(data), {'Accept': 'application/json'})
-                    res = urllib2.urlopen(request)
-                except Exception, e:
-                    logger.critical('Error sending status to inventory: %s', e)
-                    raise e
-
-                logger.info('      * Ok: %s', res.read())
+                statuses.append(dict(data, task_time = data['task_time'].strftime('%Y-%m-%d %H:%M:%S')))
             elif verbose:
                 if data['task_time'] > datetime.datetime.now():
                     logger.debug("ERROR!!!!!!: task_time cant be in the future")
@@ -415,3 +436,18 @@ if __name__ == "__main__":
             elif (verbose or (out[0] != OK)):
                 logger.debug("%s %s: %s %s" % (host, fbp.description, STATE_TO_HUMAN[out[0]], out[1]))
 
+    if statuses:
+        # All the statuses are sent in one request
+        try:
+            logger.info("Sending %d statuses to inventory ...", len(statuses))
+            request = urllib2.Request(UPDATE_STATUS_URL, json.dumps(statuses),
+                {'Accept': 'application/json', 'Content-Type': 'application/json'})
+            res = urllib2.urlopen(request)
+        except Exception, e:
+            logger.critical('Error sending status to inventory: %s', e)
+            raise e
+        for result in json.load(res):
+            if not result['ok']:
+                logger.error('Error updating status of task %s: %s', result['task'], result['error'])
+        logger.info('  * Ok')
+
@@ -8,6 +8,7 @@ import urllib2
 import urllib
 import simplejson as json
 import getopt
+import os
 import socket
 
 from tsmclient import *
@@ -23,6 +24,7 @@ hostname = None
 manual = False
 num_backups = 10000
 tivoli_server = None
+cache_file = None
 
 def usage():
     """
@@ -39,15 +41,16 @@ Usage: check_nagios_tsm.py [options]
  -m  <backups_esperados /> Se pretende verificar un backup manual, no un backup automático.
  -?  Show help
  -t  Tivoli server
+ -c  <cache file/> Keep the inventory hosts here, they are only downloaded again when changed.
 """
 
 def parseOpts():
     """
         Analiza los argumentos pasados por línea de comandos
     """
-    global verbose, nagios, hostname, password_file, num_dias, manual, num_backups, tivoli_server
+    global verbose, nagios, hostname, password_file, num_dias, manual, num_backups, tivoli_server, cache_file
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "vh:n?P:d:m:t:")
+        opts, args = getopt.getopt(sys.argv[1:], "vh:n?P:d:m:t:c:")
     except getopt.GetoptError:
         # print help information and exit:
         usage()
@@ -71,6 +74,35 @@ def parseOpts():
             num_backups = int(a)
         elif o == "-t":
             tivoli_server = str(a)
+        elif o == "-c":
+            cache_file = a
+
+def get_inventory_hosts(tivoli_server, cache_file = None):
+    """
+        Hosts of tivoli_server in the inventory. With cache_file the last
+        list and its ETag are kept there, and the list is only downloaded
+        again when it has changed.
+    """
+    hosts_url = URLBASE + '?' + urllib.urlencode({'tsm_server':tivoli_server})
+    headers = {'Accept': 'application/json'}
+    cached = None
+    if cache_file and os.path.exists(cache_file):
+        try:
+            cached = json.load(open(cache_file))
+            headers['If-None-Match'] = cached['etag']
+        except (ValueError, KeyError, IOError):
+            cached = None
+    try:
+        res = urllib2.urlopen(urllib2.Request(hosts_url, None, headers))
+    except urllib2.HTTPError, e:
+        if e.code == 304 and cached:
+            return cached['hosts']
+        raise
+    hosts = json.load(res)
+    etag = res.info().getheader('ETag')
+    if cache_file and etag:
+        json.dump({'etag': etag, 'hosts': hosts}, open(cache_file, 'w'))
+    return hosts
 
 def get_node_name(hostname = None, ip = None):
     """
@@ -235,20 +267,18 @@ if __name__ == "__main__":
         sys.exit(0)
 
     try:
-        hosts_url = URLBASE + '?' + urllib.urlencode({'tsm_server':tivoli_server})
-        request = urllib2.Request(hosts_url, None, {'Accept': 'application/json'})
-        res = urllib2.urlopen(request)
+        hosts = get_inventory_hosts(tivoli_server, cache_file)
     except Exception, e:
         print e
         raise e
 
     if nagios:
-        chequea_inventario(json.load(res), fecha_anterior)
+        chequea_inventario(hosts, fecha_anterior)
         sys.exit(0)
 
     if verbose:
         print " ----------------- Escaneando nodos del inventario ------------------------------"
-    nodos_inventario = chequea_inventario(json.load(res), fecha_anterior)
+    nodos_inventario = chequea_inventario(hosts, fecha_anterior)
     if verbose:
         print " ----------------- Escaneando nodos del tsm ------------------------------"
     nodos_TSM = chequea_tsm(fecha_anterior, nodos_inventario)
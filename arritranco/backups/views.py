@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotModified
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from djangorestframework.compat import View
@@ -7,11 +7,20 @@ from djangorestframework.mixins import ResponseMixin
 from djangorestframework.renderers import DEFAULT_RENDERERS
 from djangorestframework.response import Response
 from django.conf import settings
-from models import FileBackupTask, FileBackupProduct, BackupFile, TSMBackupTask
-from scheduler.models import TaskCheck, TaskStatus
+from django.core.cache import cache
+from django.utils.http import parse_etags, quote_etag
+from django.db import transaction
+from models import FileBackupTask, FileBackupProduct, BackupFile, BackupSizeStats, BackupStorageDaily, TSMBackupTask, FileNamePatternMatcher, \
+    checker_cache_generation, pattern_cache_generation
+from concurrency import backup_concurrency, parse_window
+from retention import plan_deletions
+from storage import storage_forecast, MAX_DAYS as MAX_FORECAST_DAYS
+from duplicates import duplicate_backups, MAX_GROUPS as MAX_DUPLICATE_GROUPS
+from scheduler.models import TaskCheck, TaskStatus, bulk_create, in_batches
 from inventory.models import Machine
 import datetime
-import math
+import hashlib
+import json
 import os
 import logging
 logger = logging.getLogger(__name__)
@@ -20,28 +29,40 @@ MACHINE_NOT_FOUND_ERROR = 'Machine object not found'
 
 
 class BackupFileCheckerView(ResponseMixin, View):
-    """An example view using Django 1.3's class based views.
-    Uses djangorestframework's RendererMixin to provide support for multiple output formats."""
+    """File backups a checker has to look for: the active ones whose last
+    run is not checked Ok yet, by machine, with the files of that run
+    already registered and their size verdict.
 
-    renderers = DEFAULT_RENDERERS
+    The tasks of every checker, with their runs and products, are cached
+    until the next run of any of them or until a task, product, pattern or
+    machine changes, under the checker CacheGeneration shared by every
+    process. The checks and files of the last runs change with every status
+    a checker posts, they are read on each request with two queries."""
 
-    def get(self, request):
-        list_of_tasks = {}
+    renderers = DEFAULT_RENDERERS
+    cache_timeout = 3600
+
+    def get_tasks(self, checker, now):
+        """
+            ([(fqdn, task, [(product id, file)])], seconds until it changes)
+            for checker (None for every checker), the payload without the
+            checks and files of the last runs.
+        """
         f = {}
-        if 'checker' in request.GET:
-            f = {'checker_fqdn':request.GET['checker']}
-        for fbt in FileBackupTask.objects.filter(active = True, machine__up = True, **f):
-            last_run = fbt.last_run()
-            try:
-                tc = TaskCheck.objects.get(task = fbt, task_time = last_run)
-                status = tc.get_status()
-                if (isinstance(status, TaskStatus) and status.status == 'Ok') or (status == 'Ok'):
-                    continue
-            except TaskCheck.DoesNotExist:
-                pass
-            previous_run = fbt.last_run(last_run)
-            if fbt.machine.fqdn not in list_of_tasks:
-                list_of_tasks[fbt.machine.fqdn] = []
+        if checker is not None:
+            f = {'checker_fqdn':checker}
+        tasks = list(FileBackupTask.objects.filter(active = True, machine__up = True, **f)
+                    .select_related('machine').prefetch_related('file_backup__file_pattern'))
+        # Runs are computed once per schedule
+        runs = {}
+        for fbt in tasks:
+            schedule = fbt.get_schedule()
+            if schedule not in runs:
+                last_run = schedule.prev_run(now)
+                runs[schedule] = (last_run, schedule.prev_run(last_run), schedule.next_run(now))
+        checker_tasks = []
+        for fbt in tasks:
+            last_run, previous_run, next_run = runs[fbt.get_schedule()]
             task = {
                     'id':fbt.id,
                     'description':fbt.description,
@@ -49,18 +70,57 @@ class BackupFileCheckerView(ResponseMixin, View):
                     'directory':fbt.directory,
                     'last_run': last_run,
                     'previous_run':previous_run,
-                    'files':[],
                 }
-            for product in FileBackupProduct.objects.filter(file_backup_task = fbt):
-                task['files'].append({
+            products = []
+            for product in fbt.file_backup.all():
+                products.append((product.pk, {
                     'pattern':product.file_pattern.pattern.strip(),
                     'start_seq':product.start_seq,
                     'end_seq':product.end_seq,
                     'variable_percentage':product.variable_percentage,
-                    })
-            list_of_tasks[fbt.machine.fqdn].append(task)
+                    }))
+            checker_tasks.append((fbt.machine.fqdn, task, products))
+        timeout = self.cache_timeout
+        if runs:
+            next_change = min(r[2] for r in runs.values()) - now
+            timeout = min(timeout, next_change.days * 24 * 3600 + next_change.seconds + 1)
+        return checker_tasks, timeout
+
+    def get_payload(self, checker_tasks):
+        """
+            {fqdn: [task]} of the tasks whose last run is not checked Ok,
+            with the files registered for it.
+        """
+        last_runs = set(task['last_run'] for fqdn, task, products in checker_tasks)
+        checked = set()
+        for ids in in_batches([task['id'] for fqdn, task, products in checker_tasks]):
+            checked.update(TaskCheck.objects.filter(task__in = ids, status = 'Ok',
+                task_time__in = last_runs).values_list('task', 'task_time'))
+        checker_tasks = [t for t in checker_tasks if (t[1]['id'], t[1]['last_run']) not in checked]
+        # Files already registered for the last runs, with their size verdict
+        last_files = {}
+        for ids in in_batches([task['id'] for fqdn, task, products in checker_tasks]):
+            for row in BackupFile.objects.filter(task_check__task__in = ids, task_check__task_time__in = last_runs)\
+                    .order_by('id').values('file_backup_product', 'task_check__task_time', 'original_file_name',
+                    'compressed_file_name', 'original_file_size', 'size_status', 'expected_min_size', 'expected_max_size'):
+                last_files.setdefault((row.pop('file_backup_product'), row.pop('task_check__task_time')), []).append(row)
+        list_of_tasks = {}
+        for fqdn, task, products in checker_tasks:
+            task = dict(task, files = [])
+            for product_id, product in products:
+                task['files'].append(dict(product, last_run_files = last_files.get((product_id, task['last_run']), [])))
+            list_of_tasks.setdefault(fqdn, []).append(task)
+        return list_of_tasks
 
-        response = Response(200, list_of_tasks)
+    def get(self, request):
+        checker = request.GET.get('checker')
+        key = 'backups-checker-%s-%s' % (checker_cache_generation(),
+            checker is None and '*' or hashlib.md5(checker.encode('utf-8')).hexdigest())
+        checker_tasks = cache.get(key)
+        if checker_tasks is None:
+            checker_tasks, timeout = self.get_tasks(checker, datetime.datetime.now())
+            cache.set(key, checker_tasks, timeout)
+        response = Response(200, self.get_payload(checker_tasks))
         return self.render(response)
 
 def add_backup_file(request, machine = False, windows = False):
@@ -115,18 +175,10 @@ def add_backup_file(request, machine = False, windows = False):
         msg = "There is no pattern for this file"
         logger.error(msg)
         return HttpResponse(msg)
-    next_run = fbp.file_backup_task.next_run(filedate)
-    previous_run = fbp.file_backup_task.last_run(filedate)
-    if (abs(next_run - filedate) <= abs(filedate - previous_run)):
-        tch_time = next_run
-    else:
-        tch_time = previous_run
+    tch_time = fbp.file_backup_task.nearest_run(filedate)
     if tch_time > datetime.datetime.now():
         logger.error('Future backup')
-    tch, created = TaskCheck.objects.get_or_create (
-            task = fbp.file_backup_task,
-            task_time = tch_time
-        )
+    tch, created = TaskCheck.upsert(fbp.file_backup_task, tch_time)
     if created:
         logger.debug('TaskCheck created')
     else:
@@ -140,6 +192,10 @@ def add_backup_file(request, machine = False, windows = False):
         )
     if created:
         logger.debug('BackupFile created')
+        BackupSizeStats.judge([bf])
+        BackupFile.objects.filter(pk = bf.pk).update(size_status = bf.size_status,
+            expected_min_size = bf.expected_min_size, expected_max_size = bf.expected_max_size)
+        BackupStorageDaily.add_counts(BackupStorageDaily.count_files({}, [bf], 'added'))
     else:
         logger.debug('BackupFile already exists')
     return HttpResponse("Ok")
@@ -157,6 +213,124 @@ def register_file_from_checker(request):
 
     return add_backup_file(request, machine)
 
+
+class BackupFileManifestView(ResponseMixin, View):
+    """
+        Registers many backup files at once, the bulk version of
+        addBackupFile and registerFileFromChecker.
+
+        POST body: a JSON list of {"host": ..., "files": [{"name", "mtime"
+        (unix timestamp), "size", "md5" (optional)}, ...]}, host being the
+        IP or fqdn of the machine (the caller by default). Returns the
+        result of every file, in the same order.
+    """
+
+    renderers = DEFAULT_RENDERERS
+
+    @staticmethod
+    def parse_file(item):
+        """
+            (name, date, size, md5) of a manifest file.
+        """
+        if not isinstance(item, dict) or not item.get('name'):
+            raise ValueError('name is required')
+        filedate = datetime.datetime.fromtimestamp(float(item['mtime']))
+        # Same minute added by add_backup_file to get this run as the last one
+        filedate = filedate + datetime.timedelta(minutes=1)
+        return item['name'], filedate, float(item.get('size') or 0), item.get('md5') or ''
+
+    @transaction.commit_on_success
+    def register(self, entries):
+        """
+            Bins the files of entries in the runs of their tasks and creates
+            the missing task checks and backup files with bulk inserts.
+        """
+        by_task = {}
+        for entry in entries:
+            by_task.setdefault(entry['fbp'].file_backup_task_id, []).append(entry)
+        now = datetime.datetime.now()
+        for task_entries in by_task.values():
+            task = task_entries[0]['fbp'].file_backup_task
+            for entry, task_time in zip(task_entries, task.nearest_runs([e['date'] for e in task_entries])):
+                if task_time > now:
+                    logger.error('Future backup')
+                entry['task_time'] = task_time
+
+        checks = TaskCheck.bulk_upsert((e['fbp'].file_backup_task_id, e['task_time']) for e in entries)
+        existing = {}
+        for ids in in_batches(set(tch.pk for tch in checks.values())):
+            for row in BackupFile.objects.filter(task_check__in = ids).values_list('id', 'file_backup_product',
+                    'task_check', 'original_file_name', 'original_date', 'original_file_size', 'original_md5'):
+                existing[row[1:6]] = row
+        new_files = []
+        created = []
+        for entry in entries:
+            tch = checks[(entry['fbp'].file_backup_task_id, entry['task_time'])]
+            key = (entry['fbp'].pk, tch.pk, entry['name'], entry['date'], entry['size'])
+            entry['result'].update({'ok': True, 'created': key not in existing,
+                'task': tch.task_id, 'task_time': tch.task_time, 'task_check': tch.pk})
+            if key not in existing:
+                new_files.append(BackupFile(file_backup_product = entry['fbp'], task_check = tch,
+                    original_file_name = entry['name'], original_date = entry['date'],
+                    original_file_size = entry['size'], original_md5 = entry['md5']))
+                new_files[-1].fill_denormalized()
+                created.append((entry, new_files[-1]))
+                # Repeated files of the manifest are stored once
+                existing[key] = (None,) + key + (entry['md5'],)
+            elif entry['md5'] and not existing[key][6] and existing[key][0] is not None:
+                BackupFile.objects.filter(pk = existing[key][0]).update(original_md5 = entry['md5'])
+        BackupSizeStats.judge(new_files)
+        for entry, bf in created:
+            entry['result'].update({'size_status': bf.size_status,
+                'expected_min_size': bf.expected_min_size, 'expected_max_size': bf.expected_max_size})
+        bulk_create(BackupFile, new_files)
+        BackupStorageDaily.add_counts(BackupStorageDaily.count_files({}, new_files, 'added'))
+        logger.debug('%d backup files registered, %d new', len(entries), len(new_files))
+
+    def post(self, request):
+        try:
+            manifest = json.loads(request.raw_post_data)
+        except ValueError, e:
+            logger.error(e)
+            return HttpResponseBadRequest(str(e))
+        if isinstance(manifest, dict):
+            manifest = [manifest]
+        if not isinstance(manifest, list) or \
+                not all(isinstance(host, dict) and isinstance(host.get('files'), list) for host in manifest):
+            return HttpResponseBadRequest('A list of {"host": ..., "files": [...]} is expected')
+
+        # Machines and their matchers are resolved once per host
+        generation = pattern_cache_generation()
+        matchers = {}
+        results = []
+        entries = []
+        for host in manifest:
+            addr = host.get('host') or request.META['REMOTE_ADDR']
+            if addr not in matchers:
+                machine = Machine.get_by_addr(addr)
+                matchers[addr] = machine and FileNamePatternMatcher.for_machine(machine, generation)
+            matcher = matchers[addr]
+            for item in host['files']:
+                result = {'host': addr, 'name': isinstance(item, dict) and item.get('name') or None, 'ok': False}
+                results.append(result)
+                if not matcher:
+                    result['error'] = MACHINE_NOT_FOUND_ERROR
+                    continue
+                try:
+                    name, filedate, filesize, md5 = self.parse_file(item)
+                except (KeyError, TypeError, ValueError), e:
+                    result['error'] = 'Invalid file: %s' % e
+                    continue
+                fbp, fields = matcher.match(name)
+                if not fbp:
+                    result['error'] = 'There is no pattern for this file'
+                    continue
+                entries.append({'result': result, 'fbp': fbp, 'name': name, 'date': filedate,
+                    'size': filesize, 'md5': md5})
+        if entries:
+            self.register(entries)
+        return self.render(Response(200, results))
+
 def add_compressed_backup_file (request):
     """Compressed file tied with original backup file."""
     id = directory = compressedmd5 = originalmd5 = None
@@ -198,11 +372,19 @@ def add_compressed_backup_file (request):
         backup_file = get_object_or_404 (BackupFile, pk = id)
     else:
         logger.debug('path: %s', directory)
-        logger.debug('filename: %s', os.path.splitext(compressed_file_name)[0])
-        backup_file = get_object_or_404 (BackupFile,
-            original_file_name__startswith = os.path.splitext(compressed_file_name)[0],
-            file_backup_product__file_backup_task__directory__startswith = directory
-            )
+        prefix = os.path.splitext(compressed_file_name)[0]
+        logger.debug('filename: %s', prefix)
+        # Compressed names are the original one or its stem plus an extension
+        backup_files = [bf for bf in BackupFile.objects.filter(checker_fqdn = machine.fqdn, task_directory = directory,
+                            file_stem__in = (prefix, os.path.splitext(prefix)[0]))
+                        if bf.original_file_name.startswith(prefix)]
+        if not backup_files:
+            raise Http404('There is no such file in database')
+        if len(backup_files) > 1:
+            logger.error('%d files match %s in %s', len(backup_files), compressed_file_name, directory)
+            return HttpResponseBadRequest('More than one file matches')
+        backup_file = backup_files[0]
+    was_compressed = bool(backup_file.compressed_file_name)
     backup_file.compressed_file_name = compressed_file_name
     backup_file.compressed_file_size = filesize
     backup_file.compressed_date = filedate
@@ -211,13 +393,35 @@ def add_compressed_backup_file (request):
     if originalmd5:
         backup_file.original_md5 = originalmd5
     backup_file.save ()
+    if not was_compressed:
+        BackupStorageDaily.add_counts(BackupStorageDaily.count_files({}, [backup_file], 'compressed'))
     return HttpResponse("Ok")
 
 
 class FilesToCompressView(ResponseMixin, View):
-    """Returns a json with the list of files to be compressed"""
+    """Returns a json with the list of files to be compressed, newest first
+    and up to MAX_COMPRESS_GB.
+
+    If limit or cursor are given, results are paginated:
+    {'results': [...], 'next': cursor for the next page or None}"""
 
     renderers = DEFAULT_RENDERERS
+    # Files per page when a cursor is given without limit, and max limit
+    page_size = 1000
+    max_page_size = 10000
+
+    CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+    @staticmethod
+    def format_cursor(original_date, pk):
+        return "%s-%s" % (original_date and original_date.strftime(FilesToCompressView.CURSOR_TIME_FORMAT) or '', pk)
+
+    @staticmethod
+    def parse_cursor(cursor):
+        original_date, pk = cursor.split('-', 1)
+        if original_date:
+            original_date = datetime.datetime.strptime(original_date, FilesToCompressView.CURSOR_TIME_FORMAT)
+        return original_date or None, int(pk)
 
     def get(self, request):
         if request.GET.has_key('checker'):
@@ -228,38 +432,50 @@ class FilesToCompressView(ResponseMixin, View):
             logger.error(MACHINE_NOT_FOUND_ERROR)
             raise Http404(MACHINE_NOT_FOUND_ERROR)
 
+        after = limit = None
+        try:
+            if request.GET.has_key('cursor'):
+                after = self.parse_cursor(request.GET['cursor'])
+            if request.GET.has_key('limit'):
+                limit = int(request.GET['limit'])
+                if limit < 1:
+                    raise ValueError("limit must be positive")
+        except ValueError, e:
+            logger.error(e)
+            return HttpResponseBadRequest(str(e))
+        paginated = limit is not None or after is not None
+        if paginated:
+            limit = min(limit or self.page_size, self.max_page_size)
+
         logger.debug('Files to compress in: %s', machine.fqdn)
         tocompress = []
         totalsize = 0
-        for bf in BackupFile.objects.filter(
-                compressed_file_name = '', deletion_date__isnull = True,
-                file_backup_product__file_backup_task__checker_fqdn = machine.fqdn).order_by('-original_date'):
-            tocompress.append (
-                [
-                    bf.id,
-                    os.path.join(bf.file_backup_product.file_backup_task.directory, bf.original_file_name)
-                ])
-            totalsize += bf.original_file_size
+        last = None
+        more = False
+        for pk, directory, original_file_name, original_file_size, original_date in BackupFile.to_compress(machine.fqdn, after):
+            if paginated and len(tocompress) == limit:
+                more = True
+                break
+            tocompress.append([pk, os.path.join(directory, original_file_name)])
+            last = (original_date, pk)
+            totalsize += original_file_size
             if (totalsize > settings.MAX_COMPRESS_GB * 1024**3):
                 logger.debug('Total size max reached: %s', totalsize)
+                more = True
                 break
         logger.debug('Total files: %s', len(tocompress))
+        if paginated:
+            tocompress = {'results': tocompress, 'next': more and self.format_cursor(*last) or None}
         response = Response(200, tocompress)
         return self.render(response)
 
 
 class FilesToDeleteView(ResponseMixin, View):
-    """Returns a json with the list of files to be deleted"""
+    """Returns a json with the list of files to be deleted (see
+    retention.plan_deletions), with dry_run the bytes they take too"""
 
     renderers = DEFAULT_RENDERERS
 
-    def task_checks_older_than_max_days_in_disk(self, task):
-        return list(TaskCheck.objects.filter(
-                    task_time__lte = datetime.datetime.now() - datetime.timedelta(days = task.days_in_hard_drive),
-                    task = task
-                    )
-                 )
-
     def post(self, request):
         if request.GET.has_key('checker'):
             machine = Machine.get_by_addr(request.GET['checker'])
@@ -273,22 +489,34 @@ class FilesToDeleteView(ResponseMixin, View):
             return HttpResponseBadRequest()
         files_to_delete = request.POST.getlist('deleted_files')
         logger.debug('deleted_files: %s', files_to_delete)
+        paths = [os.path.split(f) for f in files_to_delete]
+        # Files of the checker named like any of the posted ones, by name
+        by_name = {}
+        for names in in_batches(set(filename for directory, filename in paths)):
+            for row in BackupFile.objects.filter(Q(original_file_name__in = names) | Q(compressed_file_name__in = names),
+                    checker_fqdn = machine.fqdn).values('id', 'original_file_name', 'compressed_file_name', 'task_directory',
+                    'file_backup_product', 'original_file_size', 'compressed_file_size', 'deletion_date'):
+                by_name.setdefault(row['original_file_name'], []).append(row)
+                if row['compressed_file_name'] and row['compressed_file_name'] != row['original_file_name']:
+                    by_name.setdefault(row['compressed_file_name'], []).append(row)
         response = []
-        for f in files_to_delete:
-            directory, filename = os.path.split(f)
+        deleted = {}
+        for f, (directory, filename) in zip(files_to_delete, paths):
             logger.debug('Deleting directory: %s file: %s', directory, filename)
-            status = False
-            for backupFile in BackupFile.objects.filter((Q(original_file_name = filename) | Q(compressed_file_name = filename)),
-                                                        Q(file_backup_product__file_backup_task__directory__startswith = directory),
-                                                        Q(file_backup_product__file_backup_task__checker_fqdn = machine.fqdn)):
-                backupFile.deletion_date = datetime.datetime.now()    # Se mantiene la entrada en la bd hasta que desaparezca de las cintas
-                backupFile.save()
-                status = True
-            response.append((f,status))
-            if status:
+            rows = [row for row in by_name.get(filename, []) if row['task_directory'].startswith(directory)]
+            deleted.update((row['id'], row) for row in rows)
+            response.append((f, bool(rows)))
+            if rows:
                 logger.debug('Deleted')
             else:
                 logger.debug('Already deleted, nothing to do')
+        now = datetime.datetime.now()
+        for ids in in_batches(deleted):
+            # Se mantiene la entrada en la bd hasta que desaparezca de las cintas
+            BackupFile.objects.filter(pk__in = ids).update(deletion_date = now)
+        # Only files on disk until now free space
+        newly_deleted = [dict(row, deletion_date = now) for row in deleted.values() if row['deletion_date'] is None]
+        BackupStorageDaily.add_counts(BackupStorageDaily.count_files({}, newly_deleted, 'deleted'))
         response = Response(200, response)
         return self.render(response)
 
@@ -301,57 +529,25 @@ class FilesToDeleteView(ResponseMixin, View):
             logger.error(MACHINE_NOT_FOUND_ERROR)
             raise Http404(MACHINE_NOT_FOUND_ERROR)
 
-        filter = {}
+        host = None
         if request.GET.has_key('host'):
             host = Machine.get_by_addr(request.GET['host'])
-            filter['machine'] = host
 
-        task_to_delete = []
         logger.debug('Files to delete in: %s', machine.fqdn)
-        today = datetime.date.today()
-        task_to_delete = []
-        for task in FileBackupTask.objects.filter(checker_fqdn = machine.fqdn, **filter):
-            logger.debug('Delete files for task: %s: %s', task, task.description)
-            task_to_delete += self.task_checks_older_than_max_days_in_disk(task)
-            first_month_day = datetime.datetime(today.year, today.month, 1, 0, 0, 0)
-#            first_month_day = datetime.datetime(last_month_day.year, last_month_day.month, 1, 0, 0, 0)
-            for m in range(1, 12):
-                last_month_day = first_month_day
-                tmp_day = last_month_day -  datetime.timedelta(minutes = 1)
-                first_month_day = datetime.datetime(tmp_day.year, tmp_day.month, 1, 0, 0, 0)
-                logger.debug('first month day: %s, Last month day: %s', first_month_day, last_month_day)
-                tchs = []
-                for tch in TaskCheck.objects.filter(
-                        task = task,
-                        task_time__gte = first_month_day,
-                        task_time__lte = last_month_day).order_by('task_time'):
-#                    backupfile__deletion_date__isnull = True).order_by('task_time'):
-                    if tch.backupfile_set.filter(deletion_date__isnull = True).count():
-                        tchs.append(tch)
-                logger.debug('len tash checks: %s, max_backup_month: %s', len(tchs), task.max_backup_month)
-                if len(tchs) > task.max_backup_month:
-                    logger.debug('Selecting task check to delete')
-                    step = float(len(tchs)) / (len(tchs) - task.max_backup_month)
-                    #last = len(tchs) - 1 - step
-                    last = len(tchs) - step
-                    logger.debug("Last: %s", last)
-                    while last >= 0:
-                        task_to_delete.append(tchs[int(math.ceil(last))])
-                        logger.debug('Selected: %s', tchs[int(math.ceil(last))].task_time)
-                        last -= step
-#                else:
-#                    break
-        files_to_delete = []
-        logger.debug("Start filling files_to_delete")
-        for tch in task_to_delete:
-            directory = tch.task.backuptask.filebackuptask.directory
-            logger.debug('Deleting files of task: [%d] %s %s', tch.id, tch, tch.task_time)
-            for bf in tch.backupfile_set.filter(deletion_date__isnull = True):
-                path = os.path.join(directory, bf.compressed_file_name or bf.original_file_name)
-                files_to_delete.append({'path':path, 'pk':bf.id})
-                logger.debug('Adding: %s', path)
-        logger.debug("End filling files_to_delete")
-
+        if request.GET.has_key('host') and not host:
+            # Unknown host, it has nothing to delete
+            files_to_delete = []
+        else:
+            files_to_delete = plan_deletions(machine.fqdn, host)
+        logger.debug('Total files: %s', len(files_to_delete))
+        if request.GET.get('dry_run'):
+            response = Response(200, {
+                'files': files_to_delete,
+                'count': len(files_to_delete),
+                'bytes': sum(f['size'] for f in files_to_delete),
+            })
+            return self.render(response)
+        files_to_delete = [{'path':f['path'], 'pk':f['pk']} for f in files_to_delete]
         response = Response(200, files_to_delete)
         return self.render(response)
  
@@ -377,36 +573,78 @@ class GetBackupFileInfo(ResponseMixin, View):
         file_name = request.GET['file_name']
         logger.debug('Searching for: "%s" in "%s"', file_name, request.GET['directory'])
         logger.debug('Checker: "%s"', machine.fqdn)
-        file_info = BackupFile.objects.filter(
-                Q(file_backup_product__file_backup_task__checker_fqdn = machine.fqdn) &
-                Q(file_backup_product__file_backup_task__directory = request.GET['directory']) &
-                (
-                    Q(compressed_file_name = file_name) |
-                    Q(original_file_name = file_name) |
-                    Q(compressed_file_name = os.path.splitext(file_name)[0]) |
-                    Q(original_file_name = os.path.splitext(file_name)[0])
-                )
-            ).order_by('original_date')
-        if file_info.count() == 0:
+        file_info = BackupFile.find(machine.fqdn, request.GET['directory'], [file_name])
+        if file_name not in file_info:
             logger.debug('File not found in DB')
             raise Http404('There is no such file in database')
-        info = {
-            'original_file_name': file_info[0].original_file_name,
-            'original_date': file_info[0].original_date,
-            'original_file_size': file_info[0].original_file_size,
-            'original_md5': file_info[0].original_md5,
-            'compressed_file_name': file_info[0].compressed_file_name,
-            'compressed_date': file_info[0].compressed_date,
-            'compressed_file_size': file_info[0].compressed_file_size,
-            'compressed_md5': file_info[0].compressed_md5,
-            'id': file_info[0].id,
-        }
-        response = Response(200, info)
+        response = Response(200, self.file_info(file_info[file_name]))
         return self.render(response)
 
+    @staticmethod
+    def file_info(bf):
+        return {
+            'original_file_name': bf.original_file_name,
+            'original_date': bf.original_date,
+            'original_file_size': bf.original_file_size,
+            'original_md5': bf.original_md5,
+            'compressed_file_name': bf.compressed_file_name,
+            'compressed_date': bf.compressed_date,
+            'compressed_file_size': bf.compressed_file_size,
+            'compressed_md5': bf.compressed_md5,
+            'size_status': bf.size_status,
+            'expected_min_size': bf.expected_min_size,
+            'expected_max_size': bf.expected_max_size,
+            'id': bf.id,
+        }
+
+
+class GetBackupFilesInfo(ResponseMixin, View):
+    """
+        BackupFileInfo of many files at once.
+
+        POST body: a JSON list of {"file_name": ..., "directory": ...}.
+        Returns the info of every file in the same order, null for the files
+        not in the database.
+    """
+
+    renderers = DEFAULT_RENDERERS
+
+    def post(self, request):
+        if request.GET.has_key('checker'):
+            machine = Machine.get_by_addr(request.GET['checker'])
+        else:
+            machine = Machine.get_by_addr(request.META['REMOTE_ADDR'])
+        if not machine:
+            logger.error(MACHINE_NOT_FOUND_ERROR)
+            raise Http404(MACHINE_NOT_FOUND_ERROR)
+        try:
+            files = json.loads(request.raw_post_data)
+        except ValueError, e:
+            logger.error(e)
+            return HttpResponseBadRequest(str(e))
+        if not isinstance(files, list) or \
+                not all(isinstance(f, dict) and f.get('file_name') and f.get('directory') for f in files):
+            return HttpResponseBadRequest('A list of {"file_name": ..., "directory": ...} is expected')
+
+        by_directory = {}
+        for f in files:
+            by_directory.setdefault(f['directory'], set()).add(f['file_name'])
+        found = {}
+        for directory, file_names in by_directory.items():
+            found[directory] = BackupFile.find(machine.fqdn, directory, file_names)
+        results = []
+        for f in files:
+            bf = found[f['directory']].get(f['file_name'])
+            results.append(bf and GetBackupFileInfo.file_info(bf))
+        return self.render(Response(200, results))
+
 
 class TSMHostsView(ResponseMixin, View):
-    """Lists of hosts baked up with tsm"""
+    """Lists of hosts baked up with tsm
+
+    Responses carry an ETag digested from the task, machine and interface
+    rows the list is built from, so any change to them, however it is made,
+    gives a new one. An unchanged list is answered with 304 unserialized."""
 
     renderers = DEFAULT_RENDERERS
 
@@ -424,15 +662,106 @@ class TSMHostsView(ResponseMixin, View):
         else:
             qs = TSMBackupTask.objects.all()
         logger.debug('TSM Hosts')
-        totalsize = 0
-        tsm_hosts = []
-        for bt in qs:
-            tsm_hosts.append({
-                'fqdn':bt.machine.fqdn,
-                'tsm_server':bt.tsm_server,
-                'ipaddress':bt.machine.get_service_ip(),
-                })
-        logger.debug('Total hosts: %s', len(tsm_hosts))
-        response = Response(200, tsm_hosts)
-        return self.render(response)
+        hosts = list(qs.order_by('pk').values_list('machine', 'machine__fqdn', 'tsm_server'))
+        service_ips = Machine.get_service_ips(set(host[0] for host in hosts))
+        rows = [(fqdn, tsm_server, service_ips[machine_id]) for machine_id, fqdn, tsm_server in hosts]
+        etag = hashlib.md5(repr(rows)).hexdigest()
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            tsm_hosts = []
+            for fqdn, tsm_server, ipaddress in rows:
+                tsm_hosts.append({
+                    'fqdn':fqdn,
+                    'tsm_server':tsm_server,
+                    'ipaddress':ipaddress,
+                    })
+            logger.debug('Total hosts: %s', len(tsm_hosts))
+            response = self.render(Response(200, tsm_hosts))
+        response['ETag'] = quote_etag(etag)
+        return response
+
+
 
+class BackupConcurrencyView(ResponseMixin, View):
+    """
+        Number of backups running each minute on every checker and TSM
+        server, and the windows where most of them overlap.
+
+        GET parameters: date (%Y/%m/%d) and days (7 for a week), kind
+        ("checker" or "tsm") and name to get a single group, threshold to
+        list the windows reaching it instead of the peak ones and step to
+        get the maximum of every step minutes in the curve.
+    """
+
+    renderers = DEFAULT_RENDERERS
+
+    def get(self, request):
+        try:
+            start, end = parse_window(request.GET)
+            threshold = request.GET.has_key('threshold') and int(request.GET['threshold']) or None
+            step = int(request.GET.get('step', 1))
+        except ValueError, e:
+            logger.error(e)
+            return HttpResponseBadRequest(str(e))
+        kind = request.GET.get('kind')
+        if kind not in (None, 'checker', 'tsm'):
+            return HttpResponseBadRequest('kind must be checker or tsm')
+        profiles = backup_concurrency(start, end, kind, request.GET.get('name'), threshold, step)
+        return self.render(Response(200, {'start': start, 'end': end, 'groups': profiles}))
+
+
+class BackupStorageForecastView(ResponseMixin, View):
+    """
+        Disk usage of every checker from the daily storage rollups, its
+        growth per day over the last days and when it will be full.
+
+        GET parameters: days (30 by default), checker to get a single one
+        and capacity_gb to give its capacity instead of
+        settings.FILE_BACKUP_CHECKER_CAPACITY_GB.
+    """
+
+    renderers = DEFAULT_RENDERERS
+
+    def get(self, request):
+        checker = request.GET.get('checker')
+        capacities = None
+        try:
+            days = int(request.GET.get('days', 30))
+            if not 2 <= days <= MAX_FORECAST_DAYS:
+                raise ValueError('days must be between 2 and %d' % MAX_FORECAST_DAYS)
+            if request.GET.has_key('capacity_gb'):
+                if not checker:
+                    raise ValueError('capacity_gb needs a checker')
+                capacities = {checker: float(request.GET['capacity_gb'])}
+        except ValueError, e:
+            logger.error(e)
+            return HttpResponseBadRequest(str(e))
+        forecasts = storage_forecast(days, checker = checker, capacities = capacities)
+        return self.render(Response(200, forecasts))
+
+
+class BackupDuplicatesView(ResponseMixin, View):
+    """
+        Backup files with the same MD5 hash: frozen (all from the same
+        product, its source has not changed) or duplicate (copied by more
+        than one task), biggest first with their files.
+
+        GET parameters: hash (original, the default, or compressed),
+        checker, deleted=1 to include the files already deleted and limit
+        (100 hashes by default).
+    """
+
+    renderers = DEFAULT_RENDERERS
+
+    def get(self, request):
+        try:
+            limit = int(request.GET.get('limit', 100))
+            if not 0 < limit <= MAX_DUPLICATE_GROUPS:
+                raise ValueError('limit must be between 1 and %d' % MAX_DUPLICATE_GROUPS)
+            groups = duplicate_backups('%s_md5' % request.GET.get('hash', 'original'), request.GET.get('checker'),
+                request.GET.get('deleted') != '1', limit)
+        except ValueError, e:
+            logger.error(e)
+            return HttpResponseBadRequest(str(e))
+        return self.render(Response(200, groups))
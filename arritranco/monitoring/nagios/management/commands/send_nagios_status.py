@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, make_option
+from django.db import connection
+from monitoring.nagios.models import NagiosStatusOutbox
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('-o', '--once', action='store_true', dest='once', default=False,
+            help="Send the queued statuses and exit"),
+        make_option('-i', '--interval', action='store', type='int', dest='interval', default=None,
+            help="Seconds between two sends (default settings.PROPAGATE_STATUS_INTERVAL)"),
+        make_option('-d', '--debug', action='store_true', dest='debug', default=False,
+            help="Print the statuses instead of sending them (they are dequeued anyway)"),
+    )
+    help = 'Sends the statuses queued in NagiosStatusOutbox to nagios through send_nsca.'
+
+    def handle(self, *args, **options):
+        interval = options.get('interval') or getattr(settings, 'PROPAGATE_STATUS_INTERVAL', 30)
+        while True:
+            try:
+                sent = NagiosStatusOutbox.flush(options.get('debug', False))
+                if sent:
+                    logger.debug('%d statuses sent to nagios', sent)
+            except (RuntimeWarning, OSError), e:
+                # send_nsca failed or could not be run, the statuses stay
+                # queued for the next run
+                logger.error('Error sending statuses to nagios: %s', e)
+            if options.get('once', False):
+                break
+            # Do not keep a transaction (and its snapshot) open while sleeping
+            connection.close()
+            time.sleep(interval)
@@ -2,7 +2,7 @@
 from django.db import models
 from django.db.models.signals import post_save
 from django.conf import settings
-from scheduler.models import TaskStatus
+from scheduler.models import Task, TaskStatus, statuses_added, in_batches
 from nsca import NSCA
 
 from django.utils.translation import ugettext_lazy as _
@@ -104,19 +104,80 @@ class NagiosNetworkParent(models.Model):
         return ', '.join(nagios_parents)
 
 
+class NagiosStatusOutbox(models.Model):
+    """
+        Passive check results waiting to be sent to nagios by the
+        send_nagios_status command.
+    """
+    host = models.CharField(max_length = 255)
+    service = models.CharField(max_length = 255)
+    status = models.IntegerField()
+    message = models.TextField(blank = True)
+    queued = models.DateTimeField(auto_now_add = True)
+
+    def __unicode__(self):
+        return u"%s/%s: %s" % (self.host, self.service, self.status)
+
+    @staticmethod
+    def queue(task_statuses):
+        """
+            Queues the statuses of backup tasks, only the last one of every
+            host and service in task_statuses.
+        """
+        checks = set(ts.task_check for ts in task_statuses)
+        tasks = {}
+        for pk, description, fqdn in Task.objects.filter(pk__in = set(tch.task_id for tch in checks)).values_list(
+                'pk', 'description', 'backuptask__machine__fqdn'):
+            if fqdn is not None:
+                tasks[pk] = (fqdn, nagios_safe(description))
+        # Rows of a bulk insert may not keep their order (sqlite), so
+        # flush() could not tell which one is the last
+        rows = {}
+        for ts in task_statuses:
+            if ts.task_check.task_id in tasks:
+                host, service = tasks[ts.task_check.task_id]
+                rows[(host, service)] = NagiosStatusOutbox(host = host, service = service,
+                    status = HUMAN_TO_NAGIOS.get(ts.status, NAGIOS_UNKNOWN), message = ts.comment or '')
+        NagiosStatusOutbox.objects.bulk_create(rows.values())
+
+    @staticmethod
+    def flush(debug = False):
+        """
+            Sends the queued statuses with a single send_nsca call, only the
+            last status of every host and service is sent. The rows read are
+            deleted once sent, so they are retried if send_nsca fails and
+            rows queued meanwhile wait for the next call. Returns the number
+            of sent statuses.
+        """
+        latest = {}
+        ids = []
+        for pk, host, service, status, message in NagiosStatusOutbox.objects.order_by('id').values_list(
+                'id', 'host', 'service', 'status', 'message'):
+            latest[(host, service)] = (pk, status, message)
+            ids.append(pk)
+        if not ids:
+            return 0
+        nsca = NSCA()
+        for (host, service), (pk, status, message) in sorted(latest.items(), key = lambda item: item[1][0]):
+            nsca.add_custom_status(host, service, status, message)
+        nsca.send(debug)
+        for pks in in_batches(ids):
+            NagiosStatusOutbox.objects.filter(pk__in = pks).delete()
+        return len(latest)
+
+
 def propagate_status(sender, **kwargs):
     if not settings.PROPAGATE_STATUS_TO_NAGIOS:
         return
     if kwargs['raw']:
         return
+    NagiosStatusOutbox.queue([kwargs['instance']])
 
-    status = kwargs['instance']
-    task = status.task_check.task
-    if hasattr(task, 'backuptask'):
-        nsca = NSCA()
-        status_code = HUMAN_TO_NAGIOS[status.status]
-        nsca.add_custom_status(task.backuptask.machine.fqdn, nagios_safe(task.description), status_code, status.comment)
-        nsca.send()
+
+def propagate_statuses(sender, **kwargs):
+    if not settings.PROPAGATE_STATUS_TO_NAGIOS:
+        return
+    NagiosStatusOutbox.queue(kwargs['statuses'])
 
 
 def assign_default_checks(sender, **kwargs):
@@ -129,6 +190,7 @@ def assign_default_checks(sender, **kwargs):
             nchopt.save()
 
 post_save.connect(propagate_status, sender=TaskStatus)
+statuses_added.connect(propagate_statuses, sender=TaskStatus)
 post_save.connect(assign_default_checks, sender=Machine)
 post_save.connect(assign_default_checks, sender=PhysicalMachine)
 post_save.connect(assign_default_checks, sender=VirtualMachine)
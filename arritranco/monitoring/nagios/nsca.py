@@ -43,30 +43,30 @@ class NSCA:
     NAGIOS_OK = 0
     NAGIOS_WARNING = 1
     NAGIOS_CRITICAL = 2
-    NAGIOS_UNKNOWN = 2
+    NAGIOS_UNKNOWN = 3
 
     def __init__(self, timeout=300):
         self.timeout = timeout
         self.nagios_status = []
 
     def add_ok(self, host, service, message):
-        self.nagios_status.append( (host, service, Nagios.NAGIOS_OK, message) )
+        self.nagios_status.append( (host, service, NSCA.NAGIOS_OK, message) )
 
     def add_warning(self, host, service, message):
-        self.nagios_status.append( (host, service, Nagios.NAGIOS_WARNING, message) )
+        self.nagios_status.append( (host, service, NSCA.NAGIOS_WARNING, message) )
 
     def add_critical(self, host, service, message):
-        self.nagios_status.append( (host, service, Nagios.NAGIOS_CRITICAL, message) )
+        self.nagios_status.append( (host, service, NSCA.NAGIOS_CRITICAL, message) )
 
     def add_custom_status(self, host, service, status, message):
         if int(status) not in [NSCA.NAGIOS_OK, NSCA.NAGIOS_WARNING, NSCA.NAGIOS_CRITICAL, NSCA.NAGIOS_UNKNOWN]:
-            raise RuntimeError('%s is not a valid nagios status')
+            raise RuntimeError('%s is not a valid nagios status' % status)
         self.nagios_status.append( (host, service, int(status), message) )
 
     def get_nagios_status(self):
         out = ""
         for host, service, status, message in self.nagios_status:
-            result = u'%s\t%s\t%s\t%s\n' % (host, service, status, message.replace('\n', ' '))
+            result = u'%s\t%s\t%s\t%s\n' % (host, service, status, (message or '').replace('\n', ' '))
             out += result
         return out.encode('utf-8')
 
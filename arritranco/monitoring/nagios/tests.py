@@ -0,0 +1,80 @@
+"""
+This file demonstrates writing tests using the unittest module. These will pass
+when you run "manage.py test".
+
+Replace this with more appropriate tests for your application.
+"""
+
+from django.test import TestCase
+from django.core.management import call_command
+from backups.models import FileBackupTask
+from inventory.models import Machine
+from scheduler.models import Task, TaskStatus
+from models import NagiosContactGroup, NagiosStatusOutbox, NAGIOS_CRITICAL, NAGIOS_OK, NAGIOS_WARNING
+
+import datetime
+import os
+import shutil
+import tempfile
+
+
+class NagiosStatusOutboxTest(TestCase):
+    def setUp(self):
+        NagiosContactGroup.objects.create(name = 'Sistemas', ngcontact = 'sistemas')
+        self.tasks = []
+        for fqdn in ('host.example.com', 'other.example.com'):
+            machine = Machine.objects.create(fqdn = fqdn, up = True)
+            self.tasks.append(FileBackupTask.objects.create(machine = machine, description = 'files', minute = '0', hour = '2',
+                checker_fqdn = 'bckpsrv01.example.com', directory = '/backups'))
+        # send_nsca replacement saving what it is sent
+        self.tmpdir = tempfile.mkdtemp()
+        self.sent = os.path.join(self.tmpdir, 'sent')
+        self.send_nsca = os.path.join(self.tmpdir, 'send_nsca')
+        script = open(self.send_nsca, 'w')
+        script.write('#!/bin/sh\ncat >> %s\n' % self.sent)
+        script.close()
+        os.chmod(self.send_nsca, 0755)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def sent_lines(self):
+        if not os.path.exists(self.sent):
+            return []
+        return open(self.sent).read().splitlines()
+
+    def test_queue(self):
+        task_time = datetime.datetime(2012, 3, 1, 2, 0)
+        with self.settings(PROPAGATE_STATUS_TO_NAGIOS = True):
+            self.tasks[0].update_status(task_time, 'Warning', 'small\nfile')
+            TaskStatus.bulk_add([(self.tasks[1].pk, task_time, 'Ok', None), (self.tasks[0].pk, task_time, 'Critical', None)])
+            # Tasks without machine are not sent
+            Task.objects.create(minute = '0', hour = '3', description = 'plain').update_status(task_time, 'Ok')
+        outbox = NagiosStatusOutbox.objects.order_by('id').values_list('host', 'status', 'message')
+        self.assertEqual(outbox[0], ('host.example.com', NAGIOS_WARNING, 'small\nfile'))
+        self.assertEqual(sorted(outbox[1:]), [('host.example.com', NAGIOS_CRITICAL, ''), ('other.example.com', NAGIOS_OK, '')])
+        # Only the last status of every host and service is queued
+        NagiosStatusOutbox.queue(TaskStatus.objects.order_by('id'))
+        self.assertEqual(sorted(outbox[3:]), [('host.example.com', NAGIOS_CRITICAL, ''), ('other.example.com', NAGIOS_OK, '')])
+
+    def test_flush(self):
+        task_time = datetime.datetime(2012, 3, 1, 2, 0)
+        for task, status in ((self.tasks[0], 'Warning'), (self.tasks[1], 'Ok'), (self.tasks[0], 'Critical')):
+            task.update_status(task_time, status)
+            NagiosStatusOutbox.queue([TaskStatus.objects.latest('id')])
+
+        # Nothing is dequeued when send_nsca fails or is missing
+        with self.settings(SEND_NSCA_BIN = '/bin/false'):
+            self.assertRaises(RuntimeWarning, NagiosStatusOutbox.flush)
+        with self.settings(SEND_NSCA_BIN = os.path.join(self.tmpdir, 'missing')):
+            self.assertRaises(OSError, NagiosStatusOutbox.flush)
+            call_command('send_nagios_status', once = True)
+        self.assertEqual(NagiosStatusOutbox.objects.count(), 3)
+
+        # Only the last status of every host and service is sent
+        with self.settings(SEND_NSCA_BIN = self.send_nsca):
+            self.assertEqual(NagiosStatusOutbox.flush(), 2)
+            self.assertEqual(self.sent_lines(), ['other.example.com\tfiles\t0\t', 'host.example.com\tfiles\t2\t'])
+            self.assertEqual(NagiosStatusOutbox.objects.count(), 0)
+            self.assertEqual(NagiosStatusOutbox.flush(), 0)
+        self.assertEqual(len(self.sent_lines()), 2)
@@ -127,21 +127,18 @@ def backup_checks(request):
 def refresh_nagios_status(request):
     logger.debug('Refreshing nagios status')
     nsca = NSCA()
-    for bt in BackupTask.objects.filter(active = True, machine__up = True):
-        try:
-            tch = TaskCheck.objects.filter(task = bt).order_by('-task_time')[0]
-        except IndexError:
-            logger.debug('There is no TaskCheck for %s', bt)
+    for bt in BackupTask.objects.filter(active = True, machine__up = True).select_related('machine', 'last_status'):
+        status = bt.get_status()
+        if status is None:
+            logger.debug('There is no TaskStatus for %s', bt)
             continue
-        status = tch.get_status()
-        if isinstance(status, TaskStatus):
-            logger.debug('Last status for %s: %s is %s (%s)', bt, bt.description, status, status.check_time)
-            nsca.add_custom_status(
-                    bt.machine.fqdn,
-                    nagios_safe(bt.description),
-                    HUMAN_TO_NAGIOS[status.status],
-                    status.comment
-                )
+        logger.debug('Last status for %s: %s is %s (%s)', bt, bt.description, status, status.check_time)
+        nsca.add_custom_status(
+                bt.machine.fqdn,
+                nagios_safe(bt.description),
+                HUMAN_TO_NAGIOS[status.status],
+                status.comment
+            )
     nsca.send()
     logger.debug('Nagios status updated for %s', bt)
 
@@ -4,7 +4,7 @@ Created on 25/12/2010
 @author:  rmrodri
 '''
 from django.contrib import admin
-from models import Task, TaskCheck, TaskStatus
+from models import Task, TaskCheck, TaskStatus, TaskStatusDailySummary
 from django.db import models
 from django import forms
 from django.conf import settings
@@ -26,7 +26,7 @@ class TaskStatusAdminForm(forms.ModelForm):
 class TaskStatusAdmin(admin.StackedInline):
     model = TaskStatus
     form = TaskStatusAdminForm
-    readonly_fields = ('check_time', )
+    readonly_fields = ('check_time', 'first_check_time', 'repeat_count')
     ordering = ('check_time', )
     extra = 1
 
@@ -44,10 +44,11 @@ class TaskCheckAdmin(admin.ModelAdmin):
             return u"Machine: %s" % obj.task.backuptask.machine.fqdn
 
     def get_status(self, obj):
-        status = obj.get_status()
-        if isinstance(status, TaskStatus):
-            nagios_status = HUMAN_TO_NAGIOS[status.status]
+        if obj.status is not None:
+            status = u"%s %s" % (obj.status_time.strftime('%d-%m-%Y %H:%M:%S'), obj.status)
+            nagios_status = HUMAN_TO_NAGIOS[obj.status]
         else:
+            status = u'Unknown'
             nagios_status = NAGIOS_UNKNOWN
         if nagios_status == NAGIOS_OK:
             color = '#BBFEC9'
@@ -79,6 +80,13 @@ class TaskAdmin(admin.ModelAdmin):
         ),
     ]
 
+
+class TaskStatusDailySummaryAdmin(admin.ModelAdmin):
+    list_display = ('task', 'day', 'status', 'count')
+    list_filter = ('status', )
+    date_hierarchy = 'day'
+    search_fields = ['task__description', ]
+
 admin.site.register(Task, TaskAdmin)
 admin.site.register(TaskCheck, TaskCheckAdmin)
-
+admin.site.register(TaskStatusDailySummary, TaskStatusDailySummaryAdmin)
@@ -0,0 +1,172 @@
+'''
+Scheduler benchmarks over synthetic task corpora.
+
+Run them with "./manage.py benchmark_scheduler", results are written as
+JSON so they can be compared between versions.
+'''
+from django.db import transaction
+from django.conf import settings
+from cron import SimpleCrontabEntry, compile_schedule
+from croniter import croniter
+from models import Task, bulk_create
+
+import datetime
+import django
+import platform
+import random
+import time
+
+BENCHMARK_DESCRIPTION = 'scheduler benchmark task'
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+def _daily(rnd):
+    return '%d %d * * *' % (rnd.randrange(60), rnd.randrange(24))
+
+def _weekly(rnd):
+    return '%d %d * * %d' % (rnd.randrange(60), rnd.randrange(24), rnd.randrange(7))
+
+def _working_days(rnd):
+    return '%d %d * * %s' % (rnd.randrange(60), rnd.randrange(24), rnd.choice(('1-5', '2,5', '1,6', '1-6')))
+
+def _monthly(rnd):
+    return '%d %d %d * *' % (rnd.randrange(60), rnd.randrange(24), rnd.randrange(1, 29))
+
+def _twice_a_day(rnd):
+    hour = rnd.randrange(12)
+    return '%d %d,%d * * *' % (rnd.randrange(60), hour, hour + 12)
+
+def _hourly(rnd):
+    return '%d * * * *' % rnd.randrange(60)
+
+def _every_minutes(rnd):
+    return '*/%d * * * *' % rnd.choice((5, 10, 15, 30))
+
+# (weight, generator) pairs, mostly nightly backups like a real installation
+CRON_MIX = (
+    (45, _daily),
+    (15, _weekly),
+    (10, _working_days),
+    (10, _monthly),
+    (10, _twice_a_day),
+    (6, _hourly),
+    (4, _every_minutes),
+)
+
+
+def cron_corpus(size, seed = 0):
+    '''
+        List of size crontab entries following CRON_MIX.
+    '''
+    rnd = random.Random(seed)
+    generators = []
+    for weight, generator in CRON_MIX:
+        generators += [generator] * weight
+    return [rnd.choice(generators)(rnd) for i in xrange(size)]
+
+
+def _result(name, size, calls, seconds, errors = 0):
+    return {
+        'benchmark': name,
+        'tasks': size,
+        'calls': calls,
+        'seconds': round(seconds, 6),
+        'us_per_call': round(seconds * 1e6 / calls, 3) if calls else None,
+        'errors': errors,
+    }
+
+
+def _time_calls(name, size, func, args):
+    errors = 0
+    start = time.time()
+    for arg in args:
+        try:
+            func(arg)
+        except Exception:
+            errors += 1
+    return _result(name, size, len(args), time.time() - start, errors)
+
+
+def bench_entries(entries, now, size):
+    '''
+        next/previous run of every entry with croniter, SimpleCrontabEntry
+        and the compiled schedules.
+    '''
+    results = [
+        _time_calls('croniter.get_next', size, lambda e: croniter(e, now).get_next(datetime.datetime), entries),
+        _time_calls('croniter.get_prev', size, lambda e: croniter(e, now).get_prev(datetime.datetime), entries),
+    ]
+    simple = [SimpleCrontabEntry(e) for e in entries]
+    results += [
+        _time_calls('SimpleCrontabEntry.next_run', size, lambda s: s.next_run(now), simple),
+        _time_calls('SimpleCrontabEntry.prev_run', size, lambda s: s.prev_run(now), simple),
+    ]
+    compiled = [compile_schedule(e) for e in entries]
+    results += [
+        _time_calls('CompiledSchedule.next_run', size, lambda s: s.next_run(now), compiled),
+        _time_calls('CompiledSchedule.prev_run', size, lambda s: s.prev_run(now), compiled),
+    ]
+    return results
+
+
+def bench_tasks(entries, now):
+    '''
+        Task.todo and the backup grid expansion over entries stored as
+        tasks. Both are timed like their views run them, loading the tasks
+        included. Everything is rolled back at the end.
+    '''
+    size = len(entries)
+    results = []
+    transaction.enter_transaction_management()
+    transaction.managed(True)
+    try:
+        tasks = []
+        for entry in entries:
+            minute, hour, monthday, month, weekday = entry.split()
+            tasks.append(Task(description = BENCHMARK_DESCRIPTION, minute = minute, hour = hour,
+                monthday = monthday, month = month, weekday = weekday))
+        # Task.save() only resets the schedule cache, bulk inserts leave
+        # the same rows
+        bulk_create(Task, tasks)
+        queryset = Task.objects.filter(description = BENCHMARK_DESCRIPTION)
+
+        start = time.time()
+        todo = Task.todo(now, now + datetime.timedelta(days = 1), queryset)
+        results.append(_result('Task.todo', size, 1, time.time() - start))
+        results[-1]['runs'] = len(todo)
+
+        # Same window and call as backups.admin_views.BackupGrid
+        today = now.date()
+        start = time.time()
+        runs = Task.runs_between(queryset.all(),
+            datetime.datetime.combine(today - datetime.timedelta(1), datetime.time(23, 59, 59)),
+            datetime.datetime.combine(today + datetime.timedelta(1), datetime.time(0)))
+        results.append(_result('backup_grid', size, 1, time.time() - start))
+        results[-1]['runs'] = sum(len(r) for r in runs.values())
+    finally:
+        transaction.rollback()
+        transaction.leave_transaction_management()
+    return results
+
+
+def run_benchmarks(sizes = DEFAULT_SIZES, sample = None, now = None, seed = 0):
+    '''
+        Runs every benchmark for each corpus size. Per entry benchmarks use
+        at most sample entries of the corpus when given. Returns a dict
+        ready to be dumped as JSON.
+    '''
+    if now is None:
+        now = datetime.datetime.now().replace(second = 0, microsecond = 0)
+    results = []
+    for size in sizes:
+        entries = cron_corpus(size, seed)
+        results += bench_entries(entries[:sample] if sample else entries, now, size)
+        results += bench_tasks(entries, now)
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': settings.DATABASES['default']['ENGINE'],
+        'time': now.strftime('%Y-%m-%d %H:%M:%S'),
+        'seed': seed,
+        'results': results,
+    }
@@ -18,18 +18,289 @@
 # Crontab-like string parse. Inspired on crontab.py of the
 # gnome-schedule-1.1.0 package.
 
-import re
 import datetime
-from calendar import monthrange
+from bisect import bisect_left, bisect_right
+
+MONTH_NAMES = ('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+               'jul', 'aug', 'sep', 'oct', 'nov', 'dec')
+WEEKDAY_NAMES = ('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat')
+
+SPECIAL_ENTRIES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+
+# Search limit for impossible entries such as "0 0 30 2 *". Eight years
+# always contain a leap day, so any valid entry is found before this.
+MAX_SEARCH_DAYS = 8 * 366
+
+def _field_value(value, low, names):
+    """Converts a single field value (number or name) to int."""
+    if names and value in names:
+        return names.index(value) + low
+    if not value.isdigit():
+        raise ValueError("%s is not a number" % value)
+    return int(value)
+
+def expand_field(expr, low, high, names = None):
+    """Expands a single crontab field into a sorted tuple of values.
+
+    Supports "*", "a", "a-b", "*/s", "a/s", "a-b/s" and comma separated
+    lists of them. Month and weekday names are accepted when a names
+    sequence is given (its first element maps to low)."""
+    values = set()
+    for item in expr.lower().split(','):
+        step = None
+        if '/' in item:
+            item, step = item.split('/', 1)
+            if not step.isdigit() or int(step) < 1:
+                raise ValueError("Bad step in field: %s" % expr)
+            step = int(step)
+        if item == '*':
+            start, end = low, high
+        elif '-' in item:
+            start, end = [_field_value(v, low, names) for v in item.split('-', 1)]
+        else:
+            start = _field_value(item, low, names)
+            # "a/s" runs from a to the end of the range
+            end = high if step else start
+        if start < low or end > high or start > end:
+            raise ValueError("Value out of range [%s-%s] in field: %s" % (low, high, expr))
+        values.update(range(start, end + 1, step or 1))
+    return tuple(sorted(values))
+
+def _mask(values):
+    mask = 0
+    for v in values:
+        mask |= 1 << v
+    return mask
+
+def _successors(values, high):
+    """Table t where t[i] is the first value >= i (None if there is none), for i in 0..high+1."""
+    table = [None] * (high + 2)
+    following = None
+    for i in range(high, -1, -1):
+        if i in values:
+            following = i
+        table[i] = following
+    return table
+
+def _predecessors(values, high):
+    """Table t where t[i] is the last value <= i (None if there is none), for i in 0..high."""
+    table = [None] * (high + 1)
+    preceding = None
+    for i in range(high + 1):
+        if i in values:
+            preceding = i
+        table[i] = preceding
+    return table
+
+
+class CompiledSchedule(object):
+    """Crontab entry compiled into pre-expanded fields.
+
+    Minutes and hours are kept as sorted tuples plus successor and
+    predecessor tables, days, months and weekdays as bitmasks, so the
+    next or previous run time of a day is a couple of lookups. Day of
+    month and day of week follow the usual cron rule: when both are
+    restricted a day matches if any of them does. Names of months and
+    weekdays and the @hourly, @daily... specials are accepted.
+
+    Use compile_schedule() to get a shared instance for an entry."""
+
+    def __init__(self, entry):
+        fields = SPECIAL_ENTRIES.get(entry.strip().lower(), entry).split()
+        if len(fields) != 5:
+            raise ValueError("Crontab entry needs 5 fields: %s" % entry)
+        self.entry = entry
+        self.minutes = expand_field(fields[0], 0, 59)
+        self.hours = expand_field(fields[1], 0, 23)
+        self.days = expand_field(fields[2], 1, 31)
+        self.months = expand_field(fields[3], 1, 12, MONTH_NAMES)
+        # Both 0 and 7 are sunday
+        self.weekdays = tuple(sorted(set(
+                d % 7 for d in expand_field(fields[4], 0, 7, WEEKDAY_NAMES))))
+        self.day_mask = _mask(self.days)
+        self.month_mask = _mask(self.months)
+        self.weekday_mask = _mask(self.weekdays)
+        self.day_restricted = len(self.days) != 31
+        self.weekday_restricted = len(self.weekdays) != 7
+        # Every run time of a matching day, as offsets from midnight
+        self.day_offsets = [datetime.timedelta(hours = h, minutes = m)
+                                for h in self.hours for m in self.minutes]
+        self.next_minute = _successors(self.minutes, 59)
+        self.prev_minute = _predecessors(self.minutes, 59)
+        self.next_hour = _successors(self.hours, 23)
+        self.prev_hour = _predecessors(self.hours, 23)
+
+    def __repr__(self):
+        return "<CompiledSchedule: %s>" % self.entry
+
+    def match_day(self, d):
+        """True if the task runs some time on date d."""
+        if not self.month_mask >> d.month & 1:
+            return False
+        day_ok = self.day_mask >> d.day & 1
+        # isoweekday: monday = 1 ... sunday = 7, cron wants sunday = 0
+        weekday_ok = self.weekday_mask >> (d.isoweekday() % 7) & 1
+        if self.day_restricted and self.weekday_restricted:
+            return bool(day_ok or weekday_ok)
+        return bool(day_ok and weekday_ok)
+
+    def _first_time(self, hour, minute):
+        """First (hour, minute) of a matching day at or after hour:minute."""
+        h = self.next_hour[hour]
+        if h == hour:
+            m = self.next_minute[minute]
+            if m is not None:
+                return hour, m
+            h = self.next_hour[hour + 1]
+        if h is None:
+            return None
+        return h, self.minutes[0]
+
+    def _last_time(self, hour, minute):
+        """Last (hour, minute) of a matching day at or before hour:minute."""
+        h = self.prev_hour[hour]
+        if h == hour:
+            m = self.prev_minute[minute]
+            if m is not None:
+                return hour, m
+            h = self.prev_hour[hour - 1] if hour else None
+        if h is None:
+            return None
+        return h, self.minutes[-1]
+
+    def next_run(self, time):
+        """First run strictly after time."""
+        start = time.replace(second = 0, microsecond = 0) + datetime.timedelta(minutes = 1)
+        day = start.date()
+        hm = (start.hour, start.minute)
+        for i in xrange(MAX_SEARCH_DAYS):
+            if not self.month_mask >> day.month & 1:
+                # Jump to the first day of next month
+                day = (day.replace(day = 1) + datetime.timedelta(days = 32)).replace(day = 1)
+                hm = (0, 0)
+                continue
+            if self.match_day(day):
+                found = self._first_time(*hm)
+                if found is not None:
+                    return datetime.datetime(day.year, day.month, day.day, *found)
+            day += datetime.timedelta(days = 1)
+            hm = (0, 0)
+        raise ValueError("No run time found for: %s" % self.entry)
+
+    def prev_run(self, time):
+        """Last run strictly before time."""
+        start = time.replace(second = 0, microsecond = 0)
+        if start == time:
+            start -= datetime.timedelta(minutes = 1)
+        day = start.date()
+        hm = (start.hour, start.minute)
+        for i in xrange(MAX_SEARCH_DAYS):
+            if not self.month_mask >> day.month & 1:
+                # Jump to the last day of previous month
+                day = day.replace(day = 1) - datetime.timedelta(days = 1)
+                hm = (23, 59)
+                continue
+            if self.match_day(day):
+                found = self._last_time(*hm)
+                if found is not None:
+                    return datetime.datetime(day.year, day.month, day.day, *found)
+            day -= datetime.timedelta(days = 1)
+            hm = (23, 59)
+        raise ValueError("No run time found for: %s" % self.entry)
+
+    def runs_between(self, start_time, end_time):
+        """All runs strictly after start_time and before end_time, sorted.
+
+        Expands whole days at once from day_offsets instead of looking
+        for each run separately."""
+        runs = []
+        day = start_time.date()
+        one_day = datetime.timedelta(days = 1)
+        while day <= end_time.date():
+            if self.match_day(day):
+                midnight = datetime.datetime(day.year, day.month, day.day)
+                runs.extend([midnight + offset for offset in self.day_offsets])
+            day += one_day
+        # Only the first and last days can have runs out of the window
+        first = bisect_right(runs, start_time)
+        last = bisect_left(runs, end_time)
+        return runs[first:last]
+
+    def nearest_run(self, time):
+        """Run closest to time (a run at time itself included), the later one on ties."""
+        return self.nearest_runs([time])[0]
+
+    def nearest_runs(self, times):
+        """nearest_run of every time in times, in the same order.
+
+        Times are sorted and grouped when less than a day apart, every
+        group bisects a single array of runs spanning it."""
+        nearest = [None] * len(times)
+        order = sorted(range(len(times)), key = times.__getitem__)
+        one_day = datetime.timedelta(days = 1)
+        i = 0
+        while i < len(order):
+            j = i + 1
+            while j < len(order) and times[order[j]] - times[order[j - 1]] <= one_day:
+                j += 1
+            before = self.prev_run(times[order[i]])
+            after = self.next_run(times[order[j - 1]])
+            runs = [before] + self.runs_between(before, after) + [after]
+            for k in order[i:j]:
+                time = times[k]
+                n = bisect_left(runs, time)
+                if runs[n] - time <= time - runs[n - 1]:
+                    nearest[k] = runs[n]
+                else:
+                    nearest[k] = runs[n - 1]
+            i = j
+        return nearest
+
+    def iter_runs(self, start_time, end_time):
+        """Lazy version of runs_between, expanding one day at a time."""
+        day = start_time.date()
+        one_day = datetime.timedelta(days = 1)
+        while day <= end_time.date():
+            if self.match_day(day):
+                midnight = datetime.datetime(day.year, day.month, day.day)
+                for offset in self.day_offsets:
+                    run = midnight + offset
+                    if run >= end_time:
+                        return
+                    if run > start_time:
+                        yield run
+            day += one_day
+
+
+_compiled_schedules = {}
+
+def compile_schedule(entry):
+    """Returns the CompiledSchedule for entry, compiling it only once per process."""
+    try:
+        return _compiled_schedules[entry]
+    except KeyError:
+        schedule = _compiled_schedules[entry] = CompiledSchedule(entry)
+        return schedule
+
 
 class SimpleCrontabEntry(object):
     """Contrab-like parser.
 
-    Only deals with the first 5 fields of a normal crontab
-    entry."""
+    Only deals with the first 5 fields of a normal crontab entry (or
+    one of the @hourly, @daily... specials). Run times are computed by
+    the shared CompiledSchedule of the entry: next_run is the first run
+    strictly after the given time and prev_run the last one strictly
+    before it, like croniter."""
 
     def __init__(self, entry, expiration = 0):
-        self.__setup_timespec()
         self.set_value(entry)
         self.set_expiration(expiration)
 
@@ -38,515 +309,43 @@ class SimpleCrontabEntry(object):
 
     def set_value(self, entry):
         self.data = entry
-        fields = re.findall("\S+", self.data)
-        if len(fields) != 5 :
-            raise ValueError("Crontab entry needs 5 fields")
+        try:
+            self.schedule = compile_schedule(entry)
+        except ValueError, e:
+            raise ValueError("Bad Entry: %s (%s)" % (entry, e))
         self.fields = {
-            "minute" : fields[0],
-            "hour"   : fields[1],
-            "day"    : fields[2],
-            "month"  : fields[3],
-            "weekday": fields[4],
+            "minute" : list(self.schedule.minutes),
+            "hour"   : list(self.schedule.hours),
+            "day"    : list(self.schedule.days),
+            "month"  : list(self.schedule.months),
+            "weekday": list(self.schedule.weekdays),
             }
-        if not self._is_valid():
-            raise ValueError("Bad Entry: %s" % entry)
-
-    #### HERE BEGINS THE CODE BORROWED FROM gnome-schedule ###
-    def __setup_timespec(self):
-        
-        self.special = {
-                "@reboot"  : '',
-                "@hourly"  : '0 * * * *',
-                "@daily"   : '0 0 * * *',
-                "@weekly"  : '0 0 * * 0',
-                "@monthly" : '0 0 1 * *',
-                "@yearly"  : '0 0 1 1 *'
-                }
-
-        self.timeranges = { 
-                "minute"   : range(0,60), 
-                "hour"     : range(0,24),
-                "day"      : range(1,32),
-                "month"    : range(1,13),
-                "weekday"  : range(0,8)
-                }
-
-        self.timenames = {
-                "minute"   : "Minute",
-                "hour"     : "Hour",
-                "day"      : "Day of Month",
-                "month"    : "Month",
-                "weekday"  : "Weekday"
-                }
-
-        self.monthnames = {
-                "1"        : "Jan",
-                "2"        : "Feb",
-                "3"        : "Mar",
-                "4"        : "Apr",
-                "5"        : "May",
-                "6"        : "Jun",
-                "7"        : "Jul",
-                "8"        : "Aug",
-                "9"        : "Sep",
-                "10"       : "Oct",
-                "11"       : "Nov",
-                "12"       : "Dec"
-                }
-
-        self.downames = {
-                "0"        : "Sun",
-                "1"        : "Mon",
-                "2"        : "Tue",
-                "3"        : "Wed",
-                "4"        : "Thu",
-                "5"        : "Fri",
-                "6"        : "Sat",
-                "7"        : "Sun"
-                }
-
-    def checkfield (self, expr, type):
-        """Verifies format of Crontab timefields
-
-        Checks a single Crontab time expression.
-        At first possibly contained alias names will be replaced by their
-        corresponding numbers. After that every asterisk will be replaced by
-        a "first to last" expression. Then the expression will be splitted
-        into the komma separated subexpressions.
-
-        Each subexpression will run through: 
-        1. Check for stepwidth in range (if it has one)
-        2. Check for validness of range-expression (if it is one)
-        3. If it is no range: Check for simple numeric
-        4. If it is numeric: Check if it's in range
-
-        If one of this checks failed, an exception is raised. Otherwise it will
-        do nothing. Therefore this function should be used with 
-        a try/except construct.  
-        """
-
-        timerange = self.timeranges[type]
-
-        # Replace alias names only if no leading and following alphanumeric and 
-        # no leading slash is present. Otherwise terms like "JanJan" or 
-        # "1Feb" would give a valid check. Values after a slash are stepwidths
-        # and shouldn't have an alias.
-        if type == "month": alias = self.monthnames.copy()
-        elif type == "weekday": alias = self.downames.copy()
-        else: alias = None
-        if alias != None:
-            while True:
-                try: key,value = alias.popitem()
-                except KeyError: break
-                expr = re.sub("(?<!\w|/)" + value + "(?!\w)", key, expr)
-
-        expr = expr.replace("*", str(min(timerange)) + "-" + str(max(timerange)) )
-
-        lst = expr.split(",")
-        rexp_step = re.compile("^(\d+-\d+)/(\d+)$")
-        rexp_range = re.compile("^(\d+)-(\d+)$")
-
-        expr_range = []
-        for field in lst:
-            # Extra variables for time calculation
-            step = None
-            buff = None
-            
-            result = rexp_step.match(field)
-            if  result != None:
-                field = result.groups()[0]
-                # We need to take step in count
-                step = int(result.groups()[1])
-                if step not in timerange:
-                    raise ValueError("stepwidth",
-                                     self.timenames[type],
-                                     "Must be between %(min)s and %(max)s" % { "min": min(timerange),
-                                                                               "max": max(timerange) } )
-
-            result = rexp_range.match(field)
-            if (result != None): 
-                if (int(result.groups()[0]) not in timerange) or (int(result.groups()[1]) not in timerange):
-                    raise ValueError("range",
-                                     self.timenames[type],
-                                     "Must be between %(min)s and %(max)s" % { "min": min(timerange),
-                                                                               "max": max(timerange) } )
-                # Now we deal with a range...
-                if step != None :
-                    buff = range(int(result.groups()[0]), int(result.groups()[1])+1, step)
-                else :
-                    buff = range(int(result.groups()[0]), int(result.groups()[1])+1)
-
-            elif not field.isdigit():
-                raise ValueError("fixed",
-                                 self.timenames[type],
-                                 "%s is not a number" % ( field ) )
-            elif int(field) not in timerange:                
-                raise ValueError("fixed",
-                                 self.timenames[type],
-                                 "Must be between %(min)s and %(max)s" % { "min": min(timerange),
-                                                                           "max": max(timerange) } )
-            if buff != None :
-                expr_range.extend(buff)
-            else :
-                expr_range.append(int(field))
-
-        expr_range.sort()
-        # Here we may need to check wether some elements have duplicates
-        self.fields[type] = expr_range
- 
-
-    #### HERE ENDS THE CODE BORROWED FROM gnome-schedule ###
-
-    def _is_valid(self):
-        """Validates the data to check for a well-formated cron
-        entry.
-        Returns True or false"""
-
-        try:
-            for typ, exp in self.fields.items():
-                self.checkfield(exp, typ)
-        except ValueError,(specific,caused,explanation):
-            print "PROBLEM TYPE: %s, ON FIELD: %s -> %s " % (specific,caused,explanation)
-            return False
-        return True
-
-    def __next_time(self, time_list, time_now):
-        """Little helper function to find next element on the list"""
-#        print "__next_time", time_list, time_now
-        tmp = [x for x in time_list if x >= time_now]
-#        print "tmp", tmp
-        carry = False
-        if len(tmp) == 0:
-            carry = True
-            sol = time_list[0]
-        else:
-            if not carry:
-                sol = tmp[0]
-            else :
-                if len(tmp) == 1:
-                    carry = True
-                    sol = time_list[0]
-                else :
-                    carry = False
-                    sol = tmp[1]
-        return sol, carry
-
-    def __prev_time(self, time_list, item):
-        """Little helper function to find next element on the list"""
-#        print "time_list: %s" % time_list
-#        print "item: %s" % item
-        pos = time_list.index(item)
-#        print "pos: %s" % pos
-        elem = time_list[pos-1]
-#        print "elem: %s" % elem
-        carry = elem >= time_list[pos]
-        return elem, carry
-
-    def __next_month(self, month, sol):
-        """Find next month of execution given the month arg. If month
-        is different than current calls all the other __next_*
-        functions to set up the time."""
-       
-        sol['month'], carry = self.__next_time(self.fields['month'], month)
-        if carry :
-            sol['year'] += 1
-        if sol['month'] != month :
-            self.__next_day(1,sol)
-            self.__next_hour(0,sol)
-            self.__next_minute(0,sol)
-            return False
-        return True
-
-    def __next_minute(self, minute, sol):
-        """Find next minute of execution given the minute arg."""
-        sol['minute'], carry = self.__next_time(self.fields['minute'], minute)
-        if carry:
-            self.__next_hour(sol['hour']+1, sol)
-        return True
-
-    def __next_hour(self, hour, sol):
-        """Find next hour of execution given the hour arg. If hour is
-        different than current calls the __next_hour function to set
-        up the minute """
-#        print "__next_hour", hour, sol
-        sol['hour'], carry = self.__next_time(self.fields['hour'], hour)
-#        print "sol['hour']", sol['hour'], "carry", carry
-        if carry:
-            self.__next_day(sol['day']+1, sol)
-        if sol['hour'] != hour:
-            self.__next_minute(0,sol)
-            return False
-        return True
-
-    #el weekday se calcula a partir del dia, el mes y ao dentro de sol
-    def __next_day(self, day, sol):
-        """Find next day of execution given the day and the month/year
-        information held on the sol arg. If day is different than
-        current calls __next_hour and __next_minute functions to set
-        them to the correct values"""
-
-        while True:
-            try:
-                now = datetime.date(sol['year'], sol['month'], day)
-                # first calculate day
-                day_tmp, day_carry = self.__next_time(self.fields['day'], day)
-#                print "day_tmp", day_tmp
-#                print "day_carry", day_carry
-                day_diff = datetime.date(sol['year'], sol['month'], day_tmp) - now
-#                print "day_diff", day_diff
-                break
-            except ValueError:
-                self.__next_month(sol['month']+1, sol)
-                day = 1
-                now = datetime.date(sol['year'], sol['month'], day)
-
-        # The way is handled on the system is monday = 0, but for crontab sunday =0
-        weekday = now.weekday()+1
-
-        # if we have all days but we don't have all weekdays we need to
-        # perform different
-        if len(self.fields['day']) == 31 and len(self.fields['weekday']) != 8:
-#            print "Entra el colega por aqui ...."
-            weekday_tmp, weekday_carry = self.__next_time(self.fields['weekday'], weekday)
-            # Both 0 and 7 represent sunday
-            weekday_tmp -= 1
-            if weekday_tmp < 0 : weekday_tmp = 6
-            weekday_diff = datetime.timedelta(days=weekday_tmp - (weekday - 1))
-            if weekday_carry :
-                weekday_diff += datetime.timedelta(weeks=1)
-            weekday_next_month = (now + weekday_diff).month != now.month
-#            print "weekday_next_month", weekday_next_month
-            # If next weekday is not on the next month
-            if not weekday_next_month:
-#                print "weekday_diff", weekday_diff
-#                print "now", now
-                sol['day'] = (now + weekday_diff).day
-#                print "sol['day']", sol['day'], "day", day
-#                print "sol['month']", sol['month'], "day", day
-                if sol['day'] != day :
-                    self.__next_hour(0,sol)
-                    self.__next_minute(0, sol)
-                    return False
-                return True
-            else:
-                flag = self.__next_month(sol['month']+1, sol)
-                if flag :
-#                    print "flag!"
-                    #return self.__next_day(1, sol)
-                    self.__next_day(1, sol)
-                    self.__next_hour(0,sol)
-                    self.__next_minute(0, sol)
-                    #return False
-                return False
-
-        # if we don't have all the weekdays means that we need to use
-        # them to calculate next day
-        if len(self.fields['weekday']) != 8:
-            weekday_tmp, weekday_carry = self.__next_time(self.fields['weekday'], weekday)
-            # Both 0 and 7 represent sunday
-            weekday_tmp -= 1
-            if weekday_tmp < 0 : weekday_tmp = 6
-            weekday_diff = datetime.timedelta(days=weekday_tmp - (weekday - 1))
-            if weekday_carry :
-                weekday_diff += datetime.timedelta(weeks=1)
-            weekday_next_month = (now + weekday_diff).month != now.month
-            # If next weekday is not on the next month
-            if not weekday_next_month :
-                #  If the next day is on other month, the next weekday
-                #  is closer to happen so is what we choose
-                if day_carry:
-                    sol['day'] = (now + weekday_diff).day
-                    if sol['day'] != day :
-                        self.__next_hour(0,sol)
-                        self.__next_minute(0, sol)
-                        return False
-                    return True
-                else :
-                    # Both day and weekday are good candidates, let's
-                    # find out who is going to happen
-                    # sooner
-                    diff = min(day_diff, weekday_diff)
-                    sol['day'] = (now+diff).day
-                    if sol['day'] != day :
-                        self.__next_hour(0,sol)
-                        self.__next_minute(0, sol)
-                        return False
-                    return True
-                
-        sol['day'] = day_tmp
-        if day_carry :
-            self.__next_month(sol['month']+1, sol)
-        if sol['day'] != day :
-            self.__next_hour(0,sol)
-            self.__next_minute(0, sol)
-            return False
-        return True
-                
 
-    def next_run(self, time = datetime.datetime.now()):
+    def next_run(self, time = None):
         """Calculates when will the next execution be."""
-        sol = {'minute': 0, 'hour': 0, 'day': 0, 'month' : 0, 'year' : time.year}
-        # next_month if calculated first as next_day depends on
-        # it. Also if next_month is different than time.month the
-        # function will set up the rest of the fields
-        self.__next_month(time.month, sol) and \
-                                      self.__next_day(time.day, sol) and \
-                                      self.__next_hour(time.hour, sol) and \
-                                      self.__next_minute(time.minute, sol)
-        return datetime.datetime(sol['year'], sol['month'], sol['day'], sol['hour'], sol['minute'])
-
-    def prev_run(self, time = datetime.datetime.now()):
-        """Calculates when the previous execution was."""
-        base = self.next_run(time)
-#        print "Ya se ha calculado la siguente vez: %s" % base
-        # minute
-        prev_minute, carry = self.__prev_time(self.fields['minute'], base.minute)
-        min_diff = datetime.timedelta(minutes=(base.minute - prev_minute))
-        base -= min_diff
-        if not carry :
-            return base
-
-        # hour
-        prev_hour, carry = self.__prev_time(self.fields['hour'], base.hour)
-        hour_diff = datetime.timedelta(hours=(base.hour - prev_hour))
-        base -= hour_diff
-        if not carry :
-            return base
-
-        tmp_base = base
-        previous_months = False
-        while True:
-            # day
-            while True:
-                try:
-#                    print "__prev_time day"
-                    prev_day, carry_day = self.__prev_time(self.fields['day'], tmp_base.day)
-#                    print "prev_day", prev_day
-#                    print "carry_day", carry_day
-                    break
-                except ValueError:
-                    tmp_base -= datetime.timedelta(days = 1)
-#            print "base.day", base.day
-#            print "base.month", base.month
-#            print "prev_day", prev_day
-#            print "carry_day", carry_day
-            if carry_day:
-#                if base.month <= 11:
-#                    no_days = monthrange(base.year, base.month + 1)[1]
-#                else:
-#                    no_days = monthrange(base.year + 1, 1)[1]
-                if (base.month == 1):
-                    no_days = monthrange(base.year - 1, 12)[1]
-                    carry_day = False
-                else:
-                    no_days = monthrange(base.year, base.month - 1)[1]
-#                print "no_days", no_days
-#                print "dias de diferencia:", no_days - prev_day + base.day
-                day_diff = datetime.timedelta(days=(no_days - prev_day + base.day))
-            else:
-                day_diff = datetime.timedelta(days=(base.day - prev_day))
-#            print "day_diff", day_diff
-            
-            prev_weekday, carry_weekday = self.__prev_time(self.fields['weekday'], base.weekday()+1)
-#            print "prev_weekday: %s" % prev_weekday
-#            print "carry_weekday: %s" % carry_weekday
-            
-            # if we have all days but we don't have all weekdays we need to
-            # perform different
-            if len(self.fields['day']) == 31 and len(self.fields['weekday']) != 8:
-                # Both 0 and 7 represent sunday
-#                print "Entrando por los dias raros estos ..."
-                prev_weekday -= 1
-                if prev_weekday < 0 : prev_weekday = 6
-                
-                if carry_weekday :
-                    day_diff = datetime.timedelta(days=7+base.weekday() - prev_weekday)
-#                    print "day_diff: %s" % day_diff
-                    carry = base.month != (base - day_diff).month
-#                    print "carry: %s" % carry
-                else:
-                    weekday_diff = datetime.timedelta(days=base.weekday() - prev_weekday)
-                    # weekday no es en el otro mes
-                    day_diff = max([day_diff, weekday_diff])
-                    carry = False
-
-            elif len(self.fields['weekday']) != 8:
-                # Both 0 and 7 represent sunday
-                prev_weekday -= 1
-                if prev_weekday < 0 : prev_weekday = 6
-                weekday_diff = datetime.timedelta(days=base.weekday() - prev_weekday)
-                
-                if carry_weekday :
-                    weekday_diff += datetime.timedelta(weeks=1)
-                    if carry_day :
-                        # ambos son el otro mes
-                        day_diff = max([day_diff, weekday_diff])
-                        carry = True
-                    else:
-                        # el day simple esta en el mismo mes y el weekday en otro
-                        pass
-                else:
-                    # weekday no es en el otro mes
-                    if carry_day :
-                        # el day esta en el otro mes y el weekday no
-                        prev_day = weekday_diff
-                        carry = False
-                    else :
-                        # ambos estan el el mero mes
-                        day_diff = min([day_diff, weekday_diff])
-                        carry = False
-                    
-            else :
-                carry = carry_day
-
-#            print "day_diff", day_diff
-#            print "base", base
-            base -= day_diff
-#            print "base", base
-#            print "carry", carry
-            if not carry :
-                return base
-
-            # month
-            try:
-                if not previous_months:
-#                    print "Mes anterior cuidado -----------------------------------------------------"
-#                    print "base: %s    base.month: %s" % (base, base.month)
-#                    print "tmp_base: %s    tmp_base.month: %s" % (tmp_base, tmp_base.month)
-                    prev_month, carry = self.__prev_time(self.fields['month'], tmp_base.month)
-#                    print "prev_month: %s   carry: %s" % (prev_month, carry)
-                    month_diff = datetime.date(base.year, base.month, base.day) - \
-                                 datetime.date(not carry and base.year or base.year - 1, prev_month, base.day)
-#                    print "month_diff: %s" % month_diff
-#                    print "Base: %s" % base
-                    base -= month_diff
-#                    print "Base menos month_diff: %s" % base
-#                    print "---------------------------------------------------------------------------"
-                else:
-                    base = tmp_base
-                break
-            except ValueError:
-                tmp_base -= datetime.timedelta(days = tmp_base.day)
-                previous_months = True
-
-        return base 
-
+        if time is None:
+            time = datetime.datetime.now()
+        return self.schedule.next_run(time)
 
+    def prev_run(self, time = None):
+        """Calculates when the previous execution was."""
+        if time is None:
+            time = datetime.datetime.now()
+        return self.schedule.prev_run(time)
 
-    def is_expired(self, time = datetime.datetime.now()):
+    def is_expired(self, time = None):
         """If the expiration parameter has been set this will check
-        wether too much time has been since the cron-entry. If the
-        expiration has not been set, it throws ValueError."""
-        if self.expiration == 0 :
+        wether too much time has been since the last execution (one
+        starting at time included). If the expiration has not been
+        set, it throws ValueError."""
+        if not self.expiration:
             raise ValueError("Missing argument",
                              "Expiration time has not been set")
-        next_beg = self.next_run(time)
-        next_end = next_beg + self.expiration
-        prev_beg = self.prev_run(time)
-        prev_end = prev_beg + self.expiration
-        if (time >= next_beg and time <= next_end) or (time >= prev_beg and time <= prev_end) :
-            return False
-        return True
+        if time is None:
+            time = datetime.datetime.now()
+        prev_beg = self.schedule.prev_run(time + datetime.timedelta(seconds = 1))
+        return time > prev_beg + self.expiration
+
 
 if __name__ == "__main__" :
     cron_job_list = '''00 03 * * 2,5
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from scheduler.models import Task, TaskCheck
+
+
+class Command(BaseCommand):
+    help = 'Fills the last status columns of every TaskCheck and Task from their TaskStatus rows.'
+
+    def handle(self, *args, **options):
+        checks = 0
+        for tch in TaskCheck.objects.all().iterator():
+            tch.refresh_status()
+            checks += 1
+        tasks = 0
+        for task in Task.objects.all().iterator():
+            task.refresh_status()
+            tasks += 1
+        self.stdout.write("Status updated for %d task checks and %d tasks\n" % (checks, tasks))
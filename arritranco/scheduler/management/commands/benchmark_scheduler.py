@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError, make_option
+from scheduler.benchmark import run_benchmarks, DEFAULT_SIZES
+
+import json
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('-s', '--sizes', action='store', dest='sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+            help="Comma separated corpus sizes (number of tasks)"),
+        make_option('-n', '--sample', action='store', type='int', dest='sample', default=None,
+            help="Time next/previous run on this number of entries of each corpus only"),
+        make_option('-o', '--output', action='store', dest='output', default=None,
+            help="Write the JSON results to this file instead of stdout"),
+    )
+    help = 'Times the scheduler over synthetic task corpora and prints the results as JSON.'
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(s) for s in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("Invalid sizes: %s" % options['sizes'])
+        results = json.dumps(run_benchmarks(sizes, options.get('sample')), indent = 2)
+        if options.get('output'):
+            with open(options['output'], 'w') as f:
+                f.write(results + '\n')
+        else:
+            self.stdout.write(results + '\n')
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, make_option
+from scheduler.models import TaskStatus
+
+import datetime
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('-d', '--days', action='store', type='int', dest='days', default=None,
+            help="Archive statuses older than this number of days (default settings.TASK_STATUS_ARCHIVE_DAYS)"),
+        make_option('-n', '--no-archive', action='store_true', dest='no_archive', default=False,
+            help="Only collapse repeated statuses"),
+    )
+    help = 'Collapses repeated TaskStatus rows and archives the old ones. Run it daily.'
+
+    def handle(self, *args, **options):
+        days = options.get('days')
+        if days is None:
+            days = getattr(settings, 'TASK_STATUS_ARCHIVE_DAYS', 90)
+        deleted = TaskStatus.compact()
+        self.stdout.write("%d repeated task statuses collapsed\n" % deleted)
+        if not options.get('no_archive', False):
+            archived = TaskStatus.archive(datetime.datetime.now() - datetime.timedelta(days = days))
+            self.stdout.write("%d task statuses archived\n" % archived)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from scheduler.models import TaskCheck
+
+
+class Command(BaseCommand):
+    help = 'Merges the TaskChecks with the same task and task time. Run it before migrating scheduler to 0005.'
+
+    def handle(self, *args, **options):
+        deleted = TaskCheck.merge_duplicates()
+        self.stdout.write("%d duplicated task checks merged\n" % deleted)
@@ -1,13 +1,37 @@
-from django.db import models
+from django.db import connection, models, transaction, IntegrityError
+from django.dispatch import Signal
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
 from validators import validate_day_of_month, validate_day_of_week, validate_hour, validate_minute, validate_month
 
 import datetime
+import heapq
 from cron import *
 from croniter import croniter
 
+# Max rows per INSERT in bulk_create, below sqlite's limit of 999 parameters
+# and 500 compound selects.
+BULK_CREATE_BATCH_SIZE = 400
+
+# Sent by TaskStatus.bulk_add, whose bulk inserts do not send post_save
+statuses_added = Signal(providing_args = ['statuses'])
+
+def bulk_create(model, objs):
+    """
+        model.objects.bulk_create in batches small enough for every backend.
+    """
+    batch_size = min(BULK_CREATE_BATCH_SIZE, 999 // len(model._meta.local_fields))
+    for i in range(0, len(objs), batch_size):
+        model.objects.bulk_create(objs[i:i + batch_size])
+
+def in_batches(values, batch_size = BULK_CREATE_BATCH_SIZE):
+    """
+        Splits values for __in lookups, keeping them below sqlite's parameter limit.
+    """
+    values = list(values)
+    for i in range(0, len(values), batch_size):
+        yield values[i:i + batch_size]
 
 
 class Task(models.Model):
@@ -21,6 +45,20 @@ class Task(models.Model):
     weekday = models.CharField(max_length = 40, help_text = _('Day of week (Cron like syntax)'), default = '*', validators=[validate_day_of_week])
     description = models.TextField(help_text = _('Task description'))
     active = models.BooleanField(help_text = _('Is this task active?'), default = True)
+    # Latest status of the latest (by task_time) TaskCheck with any status,
+    # kept up to date by TaskStatus.save()
+    last_status = models.ForeignKey('TaskStatus', blank = True, null = True, editable = False, related_name = '+', on_delete = models.SET_NULL)
+    last_task_time = models.DateTimeField(blank = True, null = True, editable = False,
+        help_text = _('Task time of the last status'))
+    status = models.CharField(max_length = 100, blank = True, null = True, editable = False,
+        help_text = _('Last status'))
+    status_time = models.DateTimeField(blank = True, null = True, editable = False,
+        help_text = _('Check time of the last status'))
+    status_count = models.IntegerField(default = 0, editable = False,
+        help_text = _('Number of statuses of all the checks of this task'))
+
+    # Compiled schedule cache, see get_schedule()
+    _schedule = None
 
     def cron_syntax(self):
         return "%s %s %s %s %s" % (self.minute, self.hour, self.monthday, self.month, self.weekday)
@@ -28,60 +66,152 @@ class Task(models.Model):
     def __unicode__(self):
         return "%s: %s" % (self.cron_syntax(), self.description)
 
+    def save(self, *args, **kwargs):
+        self._schedule = None
+        super(Task, self).save(*args, **kwargs)
+
     def _get_croniter_entry(self,start_time):
         return croniter(self.cron_syntax(),start_time)
     def _get_crontab_entry(self):
         return SimpleCrontabEntry(self.cron_syntax())
+
+    def get_schedule(self):
+        """
+            Compiled schedule for this task, cached until the task is saved
+            or its cron fields change.
+        """
+        if self._schedule is None or self._schedule.entry != self.cron_syntax():
+            self._schedule = compile_schedule(self.cron_syntax())
+        return self._schedule
+
     def next_run(self, start_time = None):
         if not start_time:
             start_time = datetime.datetime.now()
-        #return self._get_crontab_entry().next_run(start_time)
-        return self._get_croniter_entry(start_time).get_next(datetime.datetime)
+        return self.get_schedule().next_run(start_time)
 
     def last_run(self, start_time = None):
         if not start_time:
             start_time = datetime.datetime.now()
-        #return self._get_crontab_entry().prev_run(start_time)
-        return self._get_croniter_entry(start_time).get_prev(datetime.datetime)
+        return self.get_schedule().prev_run(start_time)
+
+    def nearest_run(self, time):
+        """
+            Run of this task closest to time.
+        """
+        return self.get_schedule().nearest_run(time)
+
+    def nearest_runs(self, times):
+        """
+            Runs of this task closest to each of times, for registering many
+            files at once.
+        """
+        return self.get_schedule().nearest_runs(times)
 
     @staticmethod
-    def todo(start_time = None, end_time = None, queryset = None):
+    def _todo_window(start_time, end_time):
         '''
-            Tasks to be done in a period of time.
+            Default todo window: the next 24 hours.
         '''
         if not start_time:
             start_time = datetime.datetime.now()
         if not end_time:
             end_time = datetime.datetime.now() + datetime.timedelta(days = 1)
         if start_time > end_time:
-            raise ValueError
-        if not queryset:
+            raise ValueError("start_time is after end_time")
+        return start_time, end_time
+
+    @staticmethod
+    def todo(start_time = None, end_time = None, queryset = None):
+        '''
+            Tasks to be done in a period of time.
+        '''
+        start_time, end_time = Task._todo_window(start_time, end_time)
+        if queryset is None:
             queryset = Task.objects.all()
 
         todo = []
-        for t in queryset:
-            execution_time = t.next_run(start_time)
-            while execution_time < end_time:
-                todo.append((t, execution_time))
-                execution_time = t.next_run(execution_time + datetime.timedelta(minutes = 1))
+        for t, runs in Task._expand_runs(queryset, start_time, end_time):
+            todo.extend([(t, execution_time) for execution_time in runs])
+        todo.sort(key = lambda item: item[1])
         return todo
 
+    @staticmethod
+    def _expand_runs(tasks, start_time, end_time):
+        '''
+            (task, runs between start_time and end_time) for every task.
+            Tasks sharing a cron entry share the expanded run times.
+        '''
+        runs = {}
+        for t in tasks:
+            schedule = t.get_schedule()
+            if schedule.entry not in runs:
+                runs[schedule.entry] = schedule.runs_between(start_time, end_time)
+            yield t, runs[schedule.entry]
+
+    @staticmethod
+    def runs_between(tasks, start_time, end_time):
+        '''
+            Runs strictly between start_time and end_time of every task in
+            tasks, as a {task id: [run times]} dict.
+        '''
+        return dict((t.pk, list(runs)) for t, runs in Task._expand_runs(tasks, start_time, end_time))
+
+    @staticmethod
+    def iter_todo(start_time = None, end_time = None, queryset = None, after = None):
+        '''
+            Lazy version of todo. Yields (task, run time) ordered by run time
+            and task id, expanding runs only as they are consumed.
+
+            after: (run time, task id) cursor, only runs after it are yielded.
+        '''
+        start_time, end_time = Task._todo_window(start_time, end_time)
+        if queryset is None:
+            queryset = Task.objects.all()
+        if after is not None:
+            # Runs at the cursor time may still be pending for greater task ids
+            start_time = max(start_time, after[0] - datetime.timedelta(minutes = 1))
+
+        runs = [_task_runs(t, start_time, end_time) for t in queryset.order_by('pk')]
+        for execution_time, pk, t in heapq.merge(*runs):
+            if after is not None and (execution_time, pk) <= after:
+                continue
+            yield t, execution_time
+
     def update_status(self, task_time, status, comment = None):
-        task_check, created = TaskCheck.objects.get_or_create(task = self, task_time = task_time)
-        if created:
-            task_check.save()
+        task_check, created = TaskCheck.upsert(self, task_time)
         task_check.update_status(status, comment)
 
     def get_status(self, d = None):
         if d is not None:
             task_check = get_object_or_404(TaskCheck, task = self, task_time = d)
             return task_check.get_status()
-        task_check = TaskCheck.objects.filter(task = self).order_by('-task_time')
-        if len(task_check):
-            return task_check[0].get_status()
-        return None
+        return self.last_status
     get_status.short_description = 'Last check and status'
 
+    def refresh_status(self):
+        """
+            Recomputes the last status columns from the task checks.
+        """
+        checks = TaskCheck.objects.filter(task = self, last_status__isnull = False).order_by('-task_time', '-status_time')
+        try:
+            last_check = checks[0]
+        except IndexError:
+            last_check = None
+        self.status_count = checks.aggregate(count = models.Sum('status_count'))['count'] or 0
+        self.last_status_id = last_check and last_check.last_status_id
+        self.last_task_time = last_check and last_check.task_time
+        self.status = last_check and last_check.status
+        self.status_time = last_check and last_check.status_time
+        Task.objects.filter(pk = self.pk).update(last_status = self.last_status_id,
+            last_task_time = self.last_task_time, status = self.status,
+            status_time = self.status_time, status_count = self.status_count)
+
+
+def _task_runs(task, start_time, end_time):
+    """(run time, task id, task) for every run of task, for merging in Task.iter_todo."""
+    for execution_time in task.get_schedule().iter_runs(start_time, end_time):
+        yield execution_time, task.pk, task
+
 
 class TaskCheck(models.Model):
     """
@@ -89,26 +219,191 @@ class TaskCheck(models.Model):
     """
     task = models.ForeignKey(Task)
     task_time = models.DateTimeField(blank=True, null=True, help_text='Task time')
+    # Latest status, kept up to date by TaskStatus.save()
+    last_status = models.ForeignKey('TaskStatus', blank=True, null=True, editable=False, related_name='+', on_delete=models.SET_NULL)
+    status = models.CharField(max_length=100, blank=True, null=True, editable=False, help_text='Last status')
+    status_time = models.DateTimeField(blank=True, null=True, editable=False, help_text='Check time of the last status')
+    status_count = models.IntegerField(default=0, editable=False, help_text='Number of statuses')
+
+    class Meta:
+        unique_together = (('task', 'task_time'),)
 
     def __unicode__(self):
-        status = ''
-        if isinstance(self.get_status(), TaskStatus):
-            status = self.get_status().status
-        return u"%s %s (%s)" % (self.task.description, self.task_time.strftime('%d-%m-%Y'), status)
+        return u"%s %s (%s)" % (self.task.description, self.task_time.strftime('%d-%m-%Y'), self.status or '')
+
+    @staticmethod
+    def upsert(task, task_time):
+        """
+            Returns (task check, created) for task and task_time. When a
+            concurrent request inserts the same check first, the unique
+            (task, task_time) constraint makes this insert fail and the
+            other check is returned.
+        """
+        task_id = getattr(task, 'pk', task)
+        try:
+            return TaskCheck.objects.get(task = task_id, task_time = task_time), False
+        except TaskCheck.DoesNotExist:
+            pass
+        sid = transaction.savepoint()
+        try:
+            task_check = TaskCheck.objects.create(task_id = task_id, task_time = task_time)
+            transaction.savepoint_commit(sid)
+            return task_check, True
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+            return TaskCheck.objects.get(task = task_id, task_time = task_time), False
+
+    @staticmethod
+    def bulk_upsert(keys):
+        """
+            upsert for many (task id, task time) keys at once: existing
+            checks are read with one query and the missing ones inserted
+            with bulk inserts. Returns a {(task id, task time): TaskCheck}
+            dict. Must run inside a transaction.
+        """
+        keys = set(keys)
+        task_ids = set(task_id for task_id, task_time in keys)
+        task_times = set(task_time for task_id, task_time in keys)
+
+        def load_checks():
+            checks = {}
+            for ids in in_batches(task_ids):
+                for times in in_batches(task_times):
+                    for tch in TaskCheck.objects.filter(task__in = ids, task_time__in = times):
+                        checks[(tch.task_id, tch.task_time)] = tch
+            return checks
+
+        checks = load_checks()
+        missing = [TaskCheck(task_id = task_id, task_time = task_time) for task_id, task_time in keys if (task_id, task_time) not in checks]
+        if missing:
+            sid = transaction.savepoint()
+            try:
+                bulk_create(TaskCheck, missing)
+                transaction.savepoint_commit(sid)
+            except IntegrityError:
+                # Some of them were inserted by a concurrent request
+                transaction.savepoint_rollback(sid)
+                for tch in missing:
+                    TaskCheck.upsert(tch.task_id, tch.task_time)
+            checks = load_checks()
+        return checks
+
+    @staticmethod
+    def merge_duplicates():
+        """
+            Merges the task checks with the same task and task_time into the
+            oldest one, every row pointing to the others (statuses, backup
+            files...) is moved to it. Returns the number of deleted checks.
+        """
+        groups = list(TaskCheck.objects.values('task', 'task_time').annotate(n = models.Count('id'),
+            keep = models.Min('id')).filter(n__gt = 1))
+        deleted = 0
+        for group in groups:
+            with transaction.commit_on_success():
+                duplicates = list(TaskCheck.objects.filter(task = group['task'], task_time = group['task_time'])
+                    .exclude(pk = group['keep']).values_list('id', flat = True))
+                for related in TaskCheck._meta.get_all_related_objects():
+                    related.model._default_manager.filter(**{'%s__in' % related.field.name: duplicates}).update(
+                        **{related.field.name: group['keep']})
+                TaskCheck.objects.filter(pk__in = duplicates).delete()
+                TaskCheck.objects.get(pk = group['keep']).refresh_status()
+                deleted += len(duplicates)
+        if deleted:
+            for task in Task.objects.filter(pk__in = set(group['task'] for group in groups)):
+                task.refresh_status()
+        return deleted
 
 
     def get_status(self):
-        try:
-            return self.taskstatus_set.all().order_by('-check_time')[0]
-        except IndexError:
+        if self.last_status_id is None:
             return u'Unknown'
+        return self.last_status
 
     def update_status(self, status, comment = None):
-        task_status = TaskStatus.objects.create(status = status, comment = comment, task_check = self)
-        task_status.save()
+        TaskStatus.objects.create(status = status, comment = comment, task_check = self)
 
     def num_status(self):
-        return self.taskstatus_set.count()
+        return self.status_count
+
+    def _status_added(self, task_status, count = 1):
+        """
+            Updates the last status columns of this check and its task after
+            inserting count statuses, task_status being the last one, without
+            reading other statuses.
+        """
+        TaskCheck.objects.filter(pk = self.pk).update(last_status = task_status, status = task_status.status,
+            status_time = task_status.check_time, status_count = models.F('status_count') + count)
+        self.last_status = task_status
+        self.status = task_status.status
+        self.status_time = task_status.check_time
+        self.status_count += count
+        Task.objects.filter(pk = self.task_id).update(status_count = models.F('status_count') + count)
+        # Statuses of older checks do not change the task status
+        Task.objects.filter(
+                models.Q(last_task_time__isnull = True) | models.Q(last_task_time__lte = self.task_time),
+                pk = self.task_id
+            ).update(last_status = task_status, last_task_time = self.task_time,
+                status = task_status.status, status_time = task_status.check_time)
+
+    @staticmethod
+    def _statuses_added(counts):
+        """
+            Updates the last status columns of many checks and their tasks
+            after a bulk insert of statuses. counts is a {task check id:
+            number of new statuses} dict. Runs a few set based UPDATEs per
+            batch of checks instead of some per check.
+        """
+        qn = connection.ops.quote_name
+        tables = {
+            'task': qn(Task._meta.db_table),
+            'check': qn(TaskCheck._meta.db_table),
+            'status': qn(TaskStatus._meta.db_table),
+        }
+        # The new statuses have the greatest ids of their checks
+        last_status = 'SELECT %%s FROM %(status)s WHERE id = (SELECT MAX(id) FROM %(status)s ' \
+            'WHERE task_check_id = %(check)s.id)' % tables
+        # Latest check by task time, as in Task.refresh_status()
+        last_check = 'SELECT %%s FROM %(check)s WHERE task_id = %(task)s.id AND last_status_id IS NOT NULL ' \
+            'ORDER BY task_time DESC, status_time DESC LIMIT 1' % tables
+        task_counts = {}
+        for ids in in_batches(counts.keys()):
+            for task_id, check_id in TaskCheck.objects.filter(pk__in = ids).values_list('task', 'id'):
+                task_counts[task_id] = task_counts.get(task_id, 0) + counts[check_id]
+        cursor = connection.cursor()
+        for model, model_counts in ((TaskCheck, counts), (Task, task_counts)):
+            # One UPDATE per batch of rows with the same number of new statuses
+            by_count = {}
+            for pk, count in model_counts.items():
+                by_count.setdefault(count, []).append(pk)
+            for count, pks in by_count.items():
+                for ids in in_batches(pks):
+                    model.objects.filter(pk__in = ids).update(status_count = models.F('status_count') + count)
+        for ids in in_batches(counts.keys()):
+            cursor.execute('UPDATE %s SET last_status_id = (%s), status = (%s), status_time = (%s) WHERE id IN (%s)' % (
+                tables['check'], last_status % 'id', last_status % 'status', last_status % 'check_time',
+                ', '.join(['%s'] * len(ids))), ids)
+        for ids in in_batches(task_counts.keys()):
+            cursor.execute('UPDATE %s SET last_status_id = (%s), last_task_time = (%s), status = (%s), status_time = (%s) WHERE id IN (%s)' % (
+                tables['task'], last_check % 'last_status_id', last_check % 'task_time', last_check % 'status',
+                last_check % 'status_time', ', '.join(['%s'] * len(ids))), ids)
+        transaction.commit_unless_managed()
+
+    def refresh_status(self):
+        """
+            Recomputes the last status columns from taskstatus_set.
+        """
+        statuses = self.taskstatus_set.order_by('-check_time', '-id')
+        try:
+            self.last_status = statuses[0]
+        except IndexError:
+            self.last_status = None
+        self.status = self.last_status and self.last_status.status
+        self.status_time = self.last_status and self.last_status.check_time
+        # Compacted statuses stand for repeat_count checks, archived ones are still counted
+        self.status_count = (statuses.aggregate(count = models.Sum('repeat_count'))['count'] or 0) + \
+            (self.taskstatusarchive_set.aggregate(count = models.Sum('repeat_count'))['count'] or 0)
+        TaskCheck.objects.filter(pk = self.pk).update(last_status = self.last_status,
+            status = self.status, status_time = self.status_time, status_count = self.status_count)
 
 
 class TaskStatus(models.Model):
@@ -119,6 +414,158 @@ class TaskStatus(models.Model):
     check_time = models.DateTimeField(auto_now_add = True, blank=True, null=True, help_text='Check time')
     status = models.CharField(max_length=100, null=False, blank=False, help_text='Status')
     comment = models.TextField(blank=True, null=True, help_text='Comment')
+    # Set by TaskStatus.compact() when consecutive identical statuses are collapsed
+    repeat_count = models.IntegerField(default=1, editable=False, help_text='Number of checks with this status')
+    first_check_time = models.DateTimeField(blank=True, null=True, editable=False, help_text='Check time of the first repeated check')
 
     def __unicode__(self):
         return "%s %s" % (self.check_time.strftime('%d-%m-%Y %H:%M:%S'), self.status)
+
+    @transaction.commit_on_success
+    def save(self, *args, **kwargs):
+        created = self.pk is None
+        super(TaskStatus, self).save(*args, **kwargs)
+        if created:
+            self.task_check._status_added(self)
+
+    @staticmethod
+    @transaction.commit_on_success
+    def bulk_add(statuses):
+        """
+            Stores many statuses at once. statuses is a list of
+            (task id, task time, status, comment) tuples.
+
+            Existing task checks are read with one query, the missing ones
+            and all the statuses are inserted with bulk inserts. Returns the
+            task checks as a {(task id, task time): TaskCheck} dict.
+        """
+        checks = TaskCheck.bulk_upsert((task_id, task_time) for task_id, task_time, status, comment in statuses)
+
+        counts = {}
+        new_statuses = []
+        for task_id, task_time, status, comment in statuses:
+            tch = checks[(task_id, task_time)]
+            counts[tch.pk] = counts.get(tch.pk, 0) + 1
+            new_statuses.append(TaskStatus(task_check = tch, status = status, comment = comment))
+        bulk_create(TaskStatus, new_statuses)
+
+        # bulk_create does not call save(), update the last status columns here
+        TaskCheck._statuses_added(counts)
+        statuses_added.send(sender = TaskStatus, statuses = new_statuses)
+        return checks
+
+    @staticmethod
+    def compact(before = None):
+        """
+            Collapses consecutive statuses of a task check with the same
+            status and comment into the last one of them, which keeps the
+            number of collapsed checks in repeat_count and the check time of
+            the first one in first_check_time. Only statuses checked before
+            "before" are compacted when given. Returns the number of deleted
+            rows.
+        """
+        statuses = TaskStatus.objects.all()
+        if before is not None:
+            statuses = statuses.filter(check_time__lt = before)
+        check_ids = [c['task_check'] for c in statuses.values('task_check').annotate(n = models.Count('id')).filter(n__gt = 1)]
+        deleted = 0
+        for ids in in_batches(check_ids):
+            with transaction.commit_on_success():
+                rows = statuses.filter(task_check__in = ids).order_by('task_check', 'check_time', 'id').values_list(
+                    'id', 'task_check', 'status', 'comment', 'check_time', 'first_check_time', 'repeat_count')
+                runs = []
+                for row in rows:
+                    if runs and runs[-1][-1][1:4] == row[1:4]:
+                        runs[-1].append(row)
+                    else:
+                        runs.append([row])
+                delete_ids = []
+                for run in runs:
+                    if len(run) == 1:
+                        continue
+                    first = run[0][5] or run[0][4]
+                    TaskStatus.objects.filter(pk = run[-1][0]).update(first_check_time = first,
+                        repeat_count = sum(row[6] for row in run))
+                    delete_ids += [row[0] for row in run[:-1]]
+                for pks in in_batches(delete_ids):
+                    TaskStatus.objects.filter(pk__in = pks).delete()
+                deleted += len(delete_ids)
+        return deleted
+
+    @staticmethod
+    def archive(before):
+        """
+            Moves the statuses checked before "before" to TaskStatusArchive
+            and adds them to TaskStatusDailySummary. The last status of every
+            task check is kept, so the last status columns stay valid.
+            Returns the number of archived rows.
+        """
+        last_ids = TaskCheck.objects.filter(last_status__isnull = False).values('last_status')
+        ids = list(TaskStatus.objects.filter(check_time__lt = before).exclude(pk__in = last_ids).values_list('id', flat = True))
+        for pks in in_batches(ids):
+            with transaction.commit_on_success():
+                rows = TaskStatus.objects.filter(pk__in = pks).values_list('id', 'task_check', 'task_check__task',
+                    'check_time', 'first_check_time', 'status', 'comment', 'repeat_count')
+                counts = {}
+                archived = []
+                for pk, task_check, task, check_time, first_check_time, status, comment, repeat_count in rows:
+                    key = (task, check_time.date(), status)
+                    counts[key] = counts.get(key, 0) + repeat_count
+                    archived.append(TaskStatusArchive(id = pk, task_check_id = task_check, check_time = check_time,
+                        first_check_time = first_check_time, status = status, comment = comment, repeat_count = repeat_count))
+                TaskStatusDailySummary.add_counts(counts)
+                bulk_create(TaskStatusArchive, archived)
+                TaskStatus.objects.filter(pk__in = pks).delete()
+        return len(ids)
+
+
+class TaskStatusArchive(models.Model):
+    """
+        Statuses moved out of TaskStatus by TaskStatus.archive(), they keep
+        their original id.
+    """
+    task_check = models.ForeignKey(TaskCheck)
+    check_time = models.DateTimeField(blank=True, null=True, help_text='Check time')
+    status = models.CharField(max_length=100, help_text='Status')
+    comment = models.TextField(blank=True, null=True, help_text='Comment')
+    repeat_count = models.IntegerField(default=1, help_text='Number of checks with this status')
+    first_check_time = models.DateTimeField(blank=True, null=True, help_text='Check time of the first repeated check')
+
+    def __unicode__(self):
+        return "%s %s" % (self.check_time.strftime('%d-%m-%Y %H:%M:%S'), self.status)
+
+
+class TaskStatusDailySummary(models.Model):
+    """
+        Number of archived checks of a task per day and status.
+    """
+    task = models.ForeignKey(Task)
+    day = models.DateField(help_text='Check day')
+    status = models.CharField(max_length=100, help_text='Status')
+    count = models.IntegerField(default=0, help_text='Number of checks')
+
+    class Meta:
+        unique_together = (('task', 'day', 'status'),)
+        ordering = ['day', ]
+
+    def __unicode__(self):
+        return u"%s %s %s: %d" % (self.task_id, self.day, self.status, self.count)
+
+    @staticmethod
+    def add_counts(counts):
+        """
+            Adds a {(task id, day, status): count} dict to the summary rows.
+        """
+        existing = {}
+        task_ids = set(task for task, day, status in counts)
+        days = set(day for task, day, status in counts)
+        for ids in in_batches(task_ids):
+            for summary in TaskStatusDailySummary.objects.filter(task__in = ids, day__in = days):
+                existing[(summary.task_id, summary.day, summary.status)] = summary
+        missing = []
+        for key, count in counts.items():
+            if key in existing:
+                TaskStatusDailySummary.objects.filter(pk = existing[key].pk).update(count = models.F('count') + count)
+            else:
+                missing.append(TaskStatusDailySummary(task_id = key[0], day = key[1], status = key[2], count = count))
+        bulk_create(TaskStatusDailySummary, missing)
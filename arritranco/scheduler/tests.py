@@ -5,7 +5,17 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from south.db import db
+from benchmark import cron_corpus, run_benchmarks
+from cron import CompiledSchedule, SimpleCrontabEntry, compile_schedule
+from croniter import croniter
+from models import Task, TaskCheck, TaskStatus, TaskStatusArchive, TaskStatusDailySummary, statuses_added
+
+import datetime
+import json
+import random
+import time
 
 
 class SimpleTest(TestCase):
@@ -14,3 +24,334 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class CompiledScheduleTest(TestCase):
+    def test_next_and_prev_run(self):
+        cs = CompiledSchedule('*/15 2 * * *')
+        t = datetime.datetime(2012, 3, 1, 2, 15)
+        self.assertEqual(cs.next_run(t), datetime.datetime(2012, 3, 1, 2, 30))
+        self.assertEqual(cs.prev_run(t), datetime.datetime(2012, 3, 1, 2, 0))
+        self.assertEqual(cs.next_run(datetime.datetime(2012, 3, 1, 2, 45)), datetime.datetime(2012, 3, 2, 2, 0))
+        self.assertEqual(cs.prev_run(datetime.datetime(2012, 3, 1, 2, 0, 30)), datetime.datetime(2012, 3, 1, 2, 0))
+
+    def test_day_or_weekday(self):
+        # 15th of month or any sunday
+        cs = CompiledSchedule('0 0 15 * 0')
+        self.assertEqual(cs.next_run(datetime.datetime(2012, 3, 1)), datetime.datetime(2012, 3, 4))
+        self.assertEqual(cs.next_run(datetime.datetime(2012, 3, 13)), datetime.datetime(2012, 3, 15))
+
+    def test_leap_day(self):
+        cs = CompiledSchedule('0 0 29 2 *')
+        self.assertEqual(cs.next_run(datetime.datetime(2013, 1, 1)), datetime.datetime(2016, 2, 29))
+        self.assertEqual(cs.prev_run(datetime.datetime(2013, 1, 1)), datetime.datetime(2012, 2, 29))
+        self.assertRaises(ValueError, CompiledSchedule('0 0 30 2 *').next_run, datetime.datetime(2013, 1, 1))
+
+    def test_nearest_runs(self):
+        cs = CompiledSchedule('0 3,15 * * *')
+        times = [datetime.datetime(2012, 3, 1, 9, 0), datetime.datetime(2012, 3, 1, 8, 59),
+                 datetime.datetime(2012, 3, 1, 15, 0), datetime.datetime(2012, 1, 1, 23, 0)]
+        self.assertEqual(cs.nearest_runs(times), [datetime.datetime(2012, 3, 1, 15, 0), datetime.datetime(2012, 3, 1, 3, 0),
+                 datetime.datetime(2012, 3, 1, 15, 0), datetime.datetime(2012, 1, 2, 3, 0)])
+        for time in times:
+            before, after = cs.prev_run(time), cs.next_run(time)
+            expected = after if after - time <= time - before else before
+            if cs.runs_between(time - datetime.timedelta(seconds = 1), time + datetime.timedelta(seconds = 1)):
+                expected = time
+            self.assertEqual(cs.nearest_run(time), expected)
+
+    def test_specials_and_names(self):
+        t = datetime.datetime(2012, 3, 1, 10, 7)
+        self.assertEqual(SimpleCrontabEntry('@hourly').next_run(t), datetime.datetime(2012, 3, 1, 11, 0))
+        self.assertEqual(SimpleCrontabEntry('@weekly').prev_run(t), datetime.datetime(2012, 2, 26, 0, 0))
+        self.assertEqual(SimpleCrontabEntry('30 2 * jan-mar sun').next_run(t), datetime.datetime(2012, 3, 4, 2, 30))
+        self.assertRaises(ValueError, SimpleCrontabEntry, '@reboot')
+        self.assertRaises(ValueError, SimpleCrontabEntry, '0 3 * * foo')
+
+    def test_default_time_is_now(self):
+        entry = SimpleCrontabEntry('* * * * *')
+        self.assertTrue(entry.next_run() > datetime.datetime.now())
+        self.assertTrue(entry.prev_run() < datetime.datetime.now())
+        entry.set_expiration(5)
+        self.assertFalse(entry.is_expired(datetime.datetime(2012, 3, 1, 10, 7, 30)))
+
+    def test_simple_crontab_entry_matches_croniter(self):
+        rnd = random.Random(0)
+        def field(low, high, names = (), step = True):
+            r = rnd.random()
+            if r < 0.3:
+                return '*'
+            if r < 0.5:
+                return str(rnd.randint(low, high))
+            if r < 0.65:
+                first = rnd.randint(low, high - 2)
+                return '%d-%d' % (first, rnd.randint(first + 1, high - 1))
+            if r < 0.8 and step:
+                return '*/%d' % rnd.randint(2, 6)
+            if r < 0.9 and names:
+                return rnd.choice(names)
+            return ','.join(str(v) for v in sorted(set(rnd.randint(low, high - 1) for i in range(3))))
+        for i in range(300):
+            # Day and weekday steps are left out, croniter does not agree with cron on them
+            entry = ' '.join([field(0, 59), field(0, 23), field(1, 28, step = False),
+                field(1, 12, ('jan', 'mar', 'dec')), field(0, 6, ('mon', 'sun', 'fri'), step = False)])
+            t = datetime.datetime(2012, 1, 1) + datetime.timedelta(minutes = rnd.randint(0, 1000000), seconds = rnd.choice((0, 30)))
+            sce = SimpleCrontabEntry(entry)
+            self.assertEqual(sce.next_run(t), croniter(entry, t).get_next(datetime.datetime), entry)
+            self.assertEqual(sce.prev_run(t), croniter(entry, t).get_prev(datetime.datetime), entry)
+
+    def test_compile_cache(self):
+        self.assertTrue(compile_schedule('0 3 * * *') is compile_schedule('0 3 * * *'))
+
+
+class TaskScheduleTest(TestCase):
+    def test_schedule_follows_cron_fields(self):
+        task = Task.objects.create(minute = '0', hour = '3', description = 'test')
+        self.assertEqual(task.get_schedule().entry, '0 3 * * *')
+        task.hour = '4'
+        task.save()
+        self.assertEqual(task.next_run(datetime.datetime(2012, 3, 1)), datetime.datetime(2012, 3, 1, 4, 0))
+
+    def test_todo(self):
+        daily = Task.objects.create(minute = '0', hour = '3', description = 'daily')
+        often = Task.objects.create(minute = '*/20', hour = '2,3', description = 'often')
+        start = datetime.datetime(2012, 3, 1, 2, 20)
+        end = datetime.datetime(2012, 3, 2, 2, 20)
+        todo = Task.todo(start, end, Task.objects.all())
+        self.assertEqual(todo, [
+            (often, datetime.datetime(2012, 3, 1, 2, 40)),
+            (daily, datetime.datetime(2012, 3, 1, 3, 0)),
+            (often, datetime.datetime(2012, 3, 1, 3, 0)),
+            (often, datetime.datetime(2012, 3, 1, 3, 20)),
+            (often, datetime.datetime(2012, 3, 1, 3, 40)),
+            (often, datetime.datetime(2012, 3, 2, 2, 0)),
+        ])
+
+    def test_runs_between(self):
+        daily = Task.objects.create(minute = '0', hour = '3', description = 'daily')
+        other = Task.objects.create(minute = '0', hour = '3', description = 'same entry')
+        start = datetime.datetime(2012, 3, 1, 3, 0)
+        end = datetime.datetime(2012, 3, 4, 3, 0)
+        runs = Task.runs_between(Task.objects.all(), start, end)
+        self.assertEqual(runs[daily.pk], [datetime.datetime(2012, 3, 2, 3, 0), datetime.datetime(2012, 3, 3, 3, 0)])
+        self.assertEqual(runs[other.pk], runs[daily.pk])
+        self.assertFalse(runs[other.pk] is runs[daily.pk])
+
+    def test_iter_todo_cursor(self):
+        first = Task.objects.create(minute = '0', hour = '3', description = 'first')
+        second = Task.objects.create(minute = '0', hour = '3', description = 'second')
+        start = datetime.datetime(2012, 3, 1)
+        end = datetime.datetime(2012, 3, 3)
+        todo = list(Task.iter_todo(start, end, Task.objects.all()))
+        self.assertEqual(todo, Task.todo(start, end, Task.objects.all()))
+        after = (datetime.datetime(2012, 3, 1, 3, 0), first.pk)
+        self.assertEqual(list(Task.iter_todo(start, end, Task.objects.all(), after)), todo[1:])
+
+    def test_todo_view_pagination(self):
+        Task.objects.create(minute = '*/30', hour = '*', description = 'often')
+        start = time.mktime(datetime.datetime(2012, 3, 1).timetuple())
+        end = time.mktime(datetime.datetime(2012, 3, 2).timetuple())
+        params = {'start_time': start, 'end_time': end, 'limit': 20}
+        runs = []
+        while True:
+            response = self.client.get('/rest/scheduler/todo/', params, HTTP_ACCEPT = 'application/json')
+            self.assertEqual(response.status_code, 200)
+            page = json.loads(response.content)
+            runs += [run for task, run in page['results']]
+            if not page['next']:
+                break
+            params['cursor'] = page['next']
+        self.assertEqual(len(runs), 47)
+        self.assertEqual(len(set(runs)), 47)
+        response = self.client.get('/rest/scheduler/todo/', {'start_time': end, 'end_time': start}, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class TaskStatusTest(TestCase):
+    def test_last_status_columns(self):
+        task = Task.objects.create(minute = '0', hour = '3', description = 'daily')
+        new = datetime.datetime(2012, 3, 2, 3, 0)
+        old = datetime.datetime(2012, 3, 1, 3, 0)
+        task.update_status(new, 'Warning', 'small')
+        task.update_status(new, 'Ok')
+        task.update_status(old, 'Critical')
+        check = TaskCheck.objects.get(task = task, task_time = new)
+        self.assertEqual((check.status, check.status_count), ('Ok', 2))
+        self.assertEqual(check.get_status().status, 'Ok')
+        task = Task.objects.get(pk = task.pk)
+        self.assertEqual((task.status, task.last_task_time, task.status_count), ('Ok', new, 3))
+        self.assertEqual(task.get_status(), check.get_status())
+
+        TaskCheck.objects.update(status = None, status_count = 0)
+        Task.objects.update(status = None, status_count = 0)
+        for check in TaskCheck.objects.all():
+            check.refresh_status()
+        task.refresh_status()
+        task = Task.objects.get(pk = task.pk)
+        self.assertEqual((task.status, task.last_task_time, task.status_count), ('Ok', new, 3))
+        self.assertEqual(TaskCheck.objects.get(task = task, task_time = old).status, 'Critical')
+
+    def test_delete_last_status(self):
+        task = Task.objects.create(minute = '0', hour = '3', description = 'daily')
+        task.update_status(datetime.datetime(2012, 3, 2, 3, 0), 'Ok')
+        check = TaskCheck.objects.get(task = task)
+        # Deleting the last status must not cascade to its check or task
+        check.last_status.delete()
+        self.assertEqual(TaskCheck.objects.get(pk = check.pk).last_status_id, None)
+        self.assertEqual(Task.objects.get(pk = task.pk).last_status_id, None)
+
+    def test_bulk_status_read(self):
+        task = Task.objects.create(minute = '0', hour = '3', description = 'daily')
+        other = Task.objects.create(minute = '0', hour = '4', description = 'other')
+        Task.objects.create(minute = '0', hour = '5', description = 'not asked')
+        task.update_status(datetime.datetime(2012, 3, 1, 3, 0), 'Critical', 'failed')
+        task.update_status(datetime.datetime(2012, 3, 2, 3, 0), 'Ok')
+        other.update_status(datetime.datetime(2012, 3, 1, 4, 0), 'Warning')
+        params = {'tasks': '%s,%s' % (task.pk, other.pk),
+            'start_time': time.mktime(datetime.datetime(2012, 3, 1).timetuple()),
+            'end_time': time.mktime(datetime.datetime(2012, 3, 4).timetuple())}
+        # Tasks and checks, runs come from the schedule
+        with self.assertNumQueries(2):
+            response = self.client.get('/rest/scheduler/taskstatus/bulk/', params, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)
+        self.assertEqual([(r['task'], r['status']) for r in results], [(task.pk, 'Ok'), (other.pk, 'Warning')])
+        self.assertEqual([(r['status'], r['comment']) for r in results[0]['runs']], [('Critical', 'failed'), ('Ok', None), (None, None)])
+        self.assertEqual([r['status'] for r in results[1]['runs']], ['Warning', None, None])
+
+        response = self.client.get('/rest/scheduler/taskstatus/bulk/', HTTP_ACCEPT = 'application/json')
+        self.assertEqual(len(json.loads(response.content)), 3)
+        response = self.client.get('/rest/scheduler/taskstatus/bulk/', {'start_time': '0'}, HTTP_ACCEPT = 'application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_status_view(self):
+        task = Task.objects.create(minute = '0', hour = '3', description = 'daily')
+        other = Task.objects.create(minute = '0', hour = '4', description = 'other')
+        other.update_status(datetime.datetime(2012, 3, 2, 4, 0), 'Ok')
+        data = [
+            {'task': task.pk, 'task_time': '2012-03-02 03:00:00', 'status': 'Warning', 'comment': 'small'},
+            {'task': task.pk, 'task_time': '2012-03-02 03:00:00', 'status': 'Ok'},
+            {'task': other.pk, 'task_time': '2012-03-02 04:00:00', 'status': 'Critical'},
+            {'task': 0, 'task_time': '2012-03-02 03:00:00', 'status': 'Ok'},
+            {'task': task.pk, 'task_time': 'yesterday', 'status': 'Ok'},
+        ]
+        response = self.client.post('/rest/scheduler/taskstatus/bulk/', json.dumps(data),
+            content_type = 'application/json', HTTP_ACCEPT = 'application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['ok'] for r in json.loads(response.content)], [True, True, True, False, False])
+        check = TaskCheck.objects.get(task = task)
+        self.assertEqual((check.status, check.status_count, check.get_status().comment), ('Ok', 2, None))
+        self.assertEqual(Task.objects.get(pk = task.pk).status_count, 2)
+        other = Task.objects.get(pk = other.pk)
+        self.assertEqual((other.status, other.status_count), ('Critical', 2))
+        self.assertEqual(TaskCheck.objects.get(task = other).status_count, 2)
+
+    def test_bulk_add(self):
+        tasks = [Task.objects.create(minute = '0', hour = '3', description = 'task %d' % i) for i in range(10)]
+        new = datetime.datetime(2012, 3, 2, 3, 0)
+        old = datetime.datetime(2012, 3, 1, 3, 0)
+        tasks[0].update_status(new, 'Warning')
+        received = []
+        def receiver(sender, statuses, **kwargs):
+            received.extend(statuses)
+        statuses_added.connect(receiver, sender = TaskStatus)
+        try:
+            statuses = [(t.pk, new, 'Ok', None) for t in tasks] + [(tasks[0].pk, old, 'Critical', None)]
+            # The last status columns are updated with set based statements, not per check
+            with self.assertNumQueries(10):
+                TaskStatus.bulk_add(statuses)
+        finally:
+            statuses_added.disconnect(receiver, sender = TaskStatus)
+        self.assertEqual(len(received), 11)
+        task = Task.objects.get(pk = tasks[0].pk)
+        self.assertEqual((task.status, task.last_task_time, task.status_count), ('Ok', new, 3))
+        self.assertEqual(task.last_status, TaskCheck.objects.get(task = task, task_time = new).taskstatus_set.latest('id'))
+        check = TaskCheck.objects.get(task = task, task_time = old)
+        self.assertEqual((check.status, check.status_count), ('Critical', 1))
+        task = Task.objects.get(pk = tasks[9].pk)
+        self.assertEqual((task.status, task.status_count, task.status_time), ('Ok', 1, task.last_status.check_time))
+
+    def test_compact_and_archive(self):
+        task = Task.objects.create(minute = '0', hour = '3', description = 'daily')
+        task_time = datetime.datetime(2012, 3, 2, 3, 0)
+        for status in ('Ok', 'Ok', 'Warning', 'Ok', 'Ok', 'Ok'):
+            task.update_status(task_time, status)
+        check = TaskCheck.objects.get(task = task)
+        for i, ts in enumerate(check.taskstatus_set.order_by('id')):
+            TaskStatus.objects.filter(pk = ts.pk).update(check_time = task_time + datetime.timedelta(hours = 12 * i))
+        last_id = check.last_status_id
+
+        self.assertEqual(TaskStatus.compact(), 3)
+        statuses = check.taskstatus_set.order_by('check_time')
+        self.assertEqual([(ts.status, ts.repeat_count) for ts in statuses], [('Ok', 2), ('Warning', 1), ('Ok', 3)])
+        self.assertEqual(statuses[2].first_check_time, task_time + datetime.timedelta(hours = 36))
+        self.assertEqual(statuses[2].pk, last_id)
+
+        self.assertEqual(TaskStatus.archive(task_time + datetime.timedelta(days = 10)), 2)
+        self.assertEqual(list(check.taskstatus_set.values_list('id', flat = True)), [last_id])
+        self.assertEqual(TaskStatusArchive.objects.filter(task_check = check).count(), 2)
+        summary = TaskStatusDailySummary.objects.filter(task = task).values_list('day', 'status', 'count')
+        self.assertEqual(sorted(summary), [(datetime.date(2012, 3, 2), 'Ok', 2), (datetime.date(2012, 3, 3), 'Warning', 1)])
+
+        check.refresh_status()
+        task.refresh_status()
+        self.assertEqual((check.status, check.status_count), ('Ok', 6))
+        self.assertEqual(Task.objects.get(pk = task.pk).status_count, 6)
+
+    def test_upsert(self):
+        task = Task.objects.create(minute = '0', hour = '3', description = 'daily')
+        task_time = datetime.datetime(2012, 3, 2, 3, 0)
+        check, created = TaskCheck.upsert(task, task_time)
+        self.assertTrue(created)
+        self.assertEqual(TaskCheck.upsert(task.pk, task_time), (check, False))
+        self.assertEqual(TaskCheck.merge_duplicates(), 0)
+
+
+class MergeDuplicatesTest(TransactionTestCase):
+    def setUp(self):
+        # Duplicates come from databases older than the unique constraint
+        db.delete_unique('scheduler_taskcheck', ['task_id', 'task_time'])
+
+    def tearDown(self):
+        TaskCheck.objects.all().delete()
+        db.create_unique('scheduler_taskcheck', ['task_id', 'task_time'])
+
+    def test_merge_duplicates(self):
+        task = Task.objects.create(minute = '0', hour = '3', description = 'daily')
+        old = datetime.datetime(2012, 3, 1, 3, 0)
+        new = datetime.datetime(2012, 3, 2, 3, 0)
+        task.update_status(old, 'Ok')
+        keep, first, second = [TaskCheck.objects.create(task = task, task_time = new) for i in range(3)]
+        keep.update_status('Warning')
+        first.update_status('Ok')
+        first.update_status('Critical', 'failed')
+        TaskStatusArchive.objects.create(task_check = second, status = 'Ok', repeat_count = 4)
+        # The task columns follow the last saved status, not the kept check
+        second.update_status('Ok')
+
+        self.assertEqual(TaskCheck.merge_duplicates(), 2)
+        self.assertEqual(list(TaskCheck.objects.filter(task = task, task_time = new)), [keep])
+        self.assertEqual(sorted(keep.taskstatus_set.values_list('status', flat = True)), ['Critical', 'Ok', 'Ok', 'Warning'])
+        self.assertEqual(list(keep.taskstatusarchive_set.values_list('repeat_count', flat = True)), [4])
+        keep = TaskCheck.objects.get(pk = keep.pk)
+        self.assertEqual((keep.status, keep.get_status(), keep.status_count), ('Ok', keep.taskstatus_set.latest('id'), 8))
+        task = Task.objects.get(pk = task.pk)
+        self.assertEqual((task.last_status, task.last_task_time, task.status_count), (keep.last_status, new, 9))
+        self.assertEqual(TaskCheck.merge_duplicates(), 0)
+
+
+class BenchmarkTest(TestCase):
+    def test_run_benchmarks(self):
+        now = datetime.datetime(2012, 3, 1, 10, 7)
+        report = run_benchmarks(sizes = (50, ), now = now)
+        results = dict((r['benchmark'], r) for r in report['results'])
+        self.assertEqual(results['Task.todo']['tasks'], 50)
+        self.assertTrue(results['Task.todo']['runs'] > 0)
+        # The corpus gives the grid the runs of the same tasks saved one by one
+        for entry in cron_corpus(50):
+            minute, hour, monthday, month, weekday = entry.split()
+            Task.objects.create(description = 'saved', minute = minute, hour = hour, monthday = monthday, month = month, weekday = weekday)
+        runs = Task.runs_between(Task.objects.filter(description = 'saved'), datetime.datetime(2012, 2, 29, 23, 59, 59), datetime.datetime(2012, 3, 2))
+        self.assertEqual(results['backup_grid']['runs'], sum(len(r) for r in runs.values()))
+        self.assertEqual(results['CompiledSchedule.next_run']['errors'], 0)
+        json.dumps(report)
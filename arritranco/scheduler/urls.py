@@ -3,7 +3,7 @@ from djangorestframework.resources import ModelResource
 from djangorestframework.views import ListOrCreateModelView, InstanceModelView
 
 from models import Task, TaskCheck
-from views import Todo, TaskStatusView
+from views import Todo, TaskStatusView, TaskStatusBulkView
 
 class TaskResource(ModelResource):
     model = Task
@@ -15,6 +15,7 @@ urlpatterns = patterns('',
     url(r'^$', ListOrCreateModelView.as_view(resource=TaskResource)),
     url(r'^taskchecks/$', ListOrCreateModelView.as_view(resource=TaskCheckResource)),
     url(r'^taskstatus/$', TaskStatusView.as_view(), {'task':None}, name='taskstatus'),
+    url(r'^taskstatus/bulk/$', TaskStatusBulkView.as_view(), name='taskstatus-bulk'),
     url(r'^taskstatus/(?P<task>[^/]+)/$', TaskStatusView.as_view(), name='taskstatus'),
     url(r'^todo/$', Todo.as_view(), name='tasks-todo'), 
     url(r'^(?P<pk>[^/]+)/$', InstanceModelView.as_view(resource=TaskCheckResource)),
@@ -1,28 +1,74 @@
 # Create your views here.
 from djangorestframework.views import View
-from djangorestframework.response import Response
+from djangorestframework.response import Response, ErrorResponse
 from djangorestframework import status
-from models import Task
+from models import Task, TaskCheck, TaskStatus, in_batches
 from forms import TaskCheckForm
 from django.shortcuts import get_object_or_404
+from django.core.exceptions import ValidationError
+from django import forms
 
 import datetime
+import itertools
 
 class Todo(View):
     '''
         Class to handle tasks todo
     '''
     queryset = Task.objects.all()
+    # Runs per page when a cursor is given without limit, and max limit
+    page_size = 1000
+    max_page_size = 10000
+
+    CURSOR_TIME_FORMAT = '%Y%m%d%H%M'
+
+    @staticmethod
+    def format_cursor(task, execution_time):
+        return "%s-%s" % (execution_time.strftime(Todo.CURSOR_TIME_FORMAT), task.pk)
+
+    @staticmethod
+    def parse_cursor(cursor):
+        execution_time, pk = cursor.split('-', 1)
+        return datetime.datetime.strptime(execution_time, Todo.CURSOR_TIME_FORMAT), int(pk)
 
     def get(self, request):
         '''
-            Return a list of all the tasks to be done
+            Return a list of all the tasks to be done between start_time and
+            end_time (unix timestamps, next 24 hours by default).
+
+            If limit or cursor are given, results are paginated:
+            {'results': [...], 'next': cursor for the next page or None}
         '''
-        if request.GET.has_key('start_time'):
-            start_time = datetime.datetime.fromtimestamp(float(request.GET['start_time']))
-        if request.GET.has_key('end_time'):
-            end_time = datetime.datetime.fromtimestamp(float(request.GET['end_time']))
-        return Task.todo(queryset = self.queryset)
+        start_time = end_time = after = limit = None
+        try:
+            if request.GET.has_key('start_time'):
+                start_time = datetime.datetime.fromtimestamp(float(request.GET['start_time']))
+            if request.GET.has_key('end_time'):
+                end_time = datetime.datetime.fromtimestamp(float(request.GET['end_time']))
+            if request.GET.has_key('cursor'):
+                after = self.parse_cursor(request.GET['cursor'])
+            if request.GET.has_key('limit'):
+                limit = int(request.GET['limit'])
+                if limit < 1:
+                    raise ValueError("limit must be positive")
+            Task._todo_window(start_time, end_time)
+        except ValueError, e:
+            raise ErrorResponse(status.HTTP_400_BAD_REQUEST, {'detail': unicode(e)})
+
+        # Clone the queryset so results are not cached between requests
+        queryset = self.queryset.all()
+        if limit is None and after is None:
+            return Task.todo(start_time, end_time, queryset = queryset)
+
+        limit = min(limit or self.page_size, self.max_page_size)
+        todo = Task.iter_todo(start_time, end_time, queryset = queryset, after = after)
+        # Ask for one more run to know if there is a next page
+        results = list(itertools.islice(todo, limit + 1))
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_cursor = self.format_cursor(*results[-1])
+        return {'results': results, 'next': next_cursor}
 
 class TaskStatusView(View):
     """
@@ -60,3 +106,130 @@ class TaskStatusView(View):
         task = cleaned_data['task']
         task.update_status(cleaned_data['task_time'], cleaned_data['status'], cleaned_data['comment'])
         return "Task status updated status: %s" % (cleaned_data['status'])
+
+
+class TaskStatusBulkView(View):
+    """
+    Reads and updates the status of many tasks in one request.
+    """
+    queryset = Task.objects.all()
+    task_time_field = forms.DateTimeField()
+    max_window = datetime.timedelta(days = 31)
+
+    def filter_queryset(self, request, queryset):
+        """
+        Hook for subclasses to select the tasks with other GET parameters.
+        """
+        return queryset
+
+    @staticmethod
+    def status_data(task_time, task_status):
+        return {
+            'task_time': task_time,
+            'status': task_status and task_status.status,
+            'check_time': task_status and task_status.check_time,
+            'comment': task_status and task_status.comment,
+        }
+
+    def get(self, request):
+        """
+        Handle GET requests.
+        Returns the last status of the tasks in "tasks" (comma separated ids,
+        every task by default). When start_time and end_time (unix
+        timestamps) are given, the status of every run in between is added
+        in "runs", with a null status for the runs not checked.
+        """
+        task_ids = start_time = end_time = None
+        try:
+            if request.GET.get('tasks'):
+                task_ids = [int(pk) for pk in request.GET['tasks'].split(',')]
+            if request.GET.has_key('start_time') or request.GET.has_key('end_time'):
+                if not (request.GET.has_key('start_time') and request.GET.has_key('end_time')):
+                    raise ValueError("start_time and end_time go together")
+                start_time = datetime.datetime.fromtimestamp(float(request.GET['start_time']))
+                end_time = datetime.datetime.fromtimestamp(float(request.GET['end_time']))
+                if not start_time <= end_time <= start_time + self.max_window:
+                    raise ValueError("end_time must be after start_time and within %d days" % self.max_window.days)
+        except ValueError, e:
+            raise ErrorResponse(status.HTTP_400_BAD_REQUEST, {'detail': unicode(e)})
+
+        queryset = self.filter_queryset(request, self.queryset.all()).select_related('last_status')
+        if task_ids is None:
+            tasks = list(queryset)
+        else:
+            tasks = []
+            for ids in in_batches(task_ids):
+                tasks += list(queryset.filter(pk__in = ids))
+
+        results = []
+        for task in tasks:
+            result = self.status_data(task.last_task_time, task.last_status)
+            result.update({'task': task.pk, 'description': task.description})
+            results.append(result)
+        if start_time is None:
+            return results
+
+        runs = Task.runs_between(tasks, start_time, end_time)
+        checks = {}
+        for ids in in_batches([task.pk for task in tasks]):
+            for tch in TaskCheck.objects.filter(task__in = ids, task_time__gte = start_time,
+                    task_time__lte = end_time).select_related('last_status'):
+                checks.setdefault(tch.task_id, {})[tch.task_time] = tch
+        for task, result in zip(tasks, results):
+            task_checks = checks.get(task.pk, {})
+            result['runs'] = []
+            # Checks out of the schedule (older cron settings) are listed too
+            for task_time in sorted(set(runs[task.pk]) | set(task_checks)):
+                tch = task_checks.get(task_time)
+                result['runs'].append(self.status_data(task_time, tch and tch.last_status))
+        return results
+
+    def parse_item(self, item):
+        """
+        Returns the (task id, task time, status, comment) tuple for a posted item.
+        """
+        if not isinstance(item, dict):
+            raise ValidationError("Item must be an object")
+        try:
+            task_id = int(item.get('task'))
+        except (TypeError, ValueError):
+            raise ValidationError("Invalid task: %s" % item.get('task'))
+        task_time = self.task_time_field.clean(item.get('task_time'))
+        task_status = item.get('status')
+        if not task_status or len(task_status) > 100:
+            raise ValidationError("Invalid status: %s" % task_status)
+        return task_id, task_time, task_status, item.get('comment') or None
+
+    def post(self, request):
+        """
+        Handle POST requests with a JSON list of {task, task_time, status, comment}.
+        Returns the result of each item, in the same order.
+        """
+        if not isinstance(self.DATA, list):
+            raise ErrorResponse(status.HTTP_400_BAD_REQUEST, {'detail': 'A list of task statuses is expected'})
+        parsed = []
+        for item in self.DATA:
+            try:
+                parsed.append(self.parse_item(item))
+            except ValidationError, e:
+                parsed.append(e)
+        task_ids = set(p[0] for p in parsed if isinstance(p, tuple))
+        existing = set()
+        for ids in in_batches(task_ids):
+            existing.update(Task.objects.filter(pk__in = ids).values_list('pk', flat = True))
+
+        results = []
+        statuses = []
+        for item, p in zip(self.DATA, parsed):
+            result = {'task': item.get('task') if isinstance(item, dict) else None, 'ok': False}
+            if isinstance(p, ValidationError):
+                result['error'] = u' '.join(p.messages)
+            elif p[0] not in existing:
+                result['error'] = u"Task %s does not exist" % p[0]
+            else:
+                result['ok'] = True
+                statuses.append(p)
+            results.append(result)
+        if statuses:
+            TaskStatus.bulk_add(statuses)
+        return results
@@ -155,6 +155,8 @@ FILE_BACKUP_CHECKERS = (
 DEFAULT_NAGIOS_HOST_PARENT = None
 DEFAULT_NAGIOS_CG = 'Sistemas'
 PROPAGATE_STATUS_TO_NAGIOS = False
+# Seconds between two sends of the queued statuses by send_nagios_status
+PROPAGATE_STATUS_INTERVAL = 30
 SEND_NSCA_BIN = '/usr/sbin/send_nsca'
 NSCA_DAEMON_HOSTNAME = 'nagios.fully.qualified.domain.name'
 SEND_NSCA_CFG = '/etc/send_nsca.cfg'
@@ -213,6 +215,12 @@ UPS_ROOM_NAMES = ('cpd',)
 
 MAX_COMPRESS_GB = 400
 
+# Disk size of every file backup checker, for the storage forecast
+FILE_BACKUP_CHECKER_CAPACITY_GB = {}
+
+# Days of raw scheduler.TaskStatus rows kept before compact_task_status archives them
+TASK_STATUS_ARCHIVE_DAYS = 90
+
 PX_FOR_UNITS=15
 
 # Network settings
@@ -5,6 +5,7 @@ from django.contrib import admin
 
 from backups.admin_views import BackupGrid
 from backups.admin_views import BackupGridList
+from backups.admin_views import BackupConcurrency
 
 admin.autodiscover()
 
@@ -16,6 +17,7 @@ urlpatterns = patterns('',
     # FIXME: This url shoud be in backup app
     url(r'^admin/backups/grid/', BackupGrid.as_view(), name='backup-grid'),
     url(r'^admin/backups/grid-list/', BackupGridList.as_view(), name='backup-grid-list'),
+    url(r'^admin/backups/concurrency/', BackupConcurrency.as_view(), name='backup-concurrency-admin'),
     url(r'^admin/hardware/', include('hardware.admin_urls')),
     url(r'^admin/inventory/', include('inventory.admin_urls')),
     # Uncomment the next line to enable the admin: